@@ -0,0 +1,257 @@
+# backend/api/asyncviews.py
+"""
+Async versions of the hottest read endpoints, mounted under /api/async/ with
+the same URLs, query parameters and JSON bodies as their sync counterparts:
+
+    /api/async/recipes/                     recipes.views.RecipeListView
+    /api/async/recipes/<pk>/                recipes.views.RecipeDetailView (GET)
+    /api/async/recipes/<id>/reviews/        reviews.views.ReviewListCreateView (GET)
+    /api/async/cart/                        cart.views.CartView (GET)
+    /api/async/payments/create-payment-intent/
+
+Under ASGI (backend.asgi) these run on the event loop, so a request waiting
+on the database or on the payment gateway doesn't hold a worker thread. The
+ORM calls still run on Django's sync thread, but only for the query itself;
+the gateway call (FakeGateway, or Stripe's async client) doesn't need a
+thread at all. Under WSGI they work too, they just don't gain anything.
+
+DRF's APIView is sync only, so AsyncAPIView is a plain Django View that
+borrows DRF's pieces: the Request wrapper, permission classes, filter
+backends, pagination, serializers (as api.plans read plans) and the renderer. Authentication is JWT
+only (CachedJWTAuthentication.aauthenticate) and reads nothing but the token
+claims, so views must only use request.user.pk. Writes stay on the sync
+views; they are transactional and don't wait on anything slow.
+
+Anonymous GETs share the response cache (api.caching) and every view with a
+validator aggregate answers conditional GETs (api.conditional).
+"""
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import exceptions, permissions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from cart.models import Cart
+from cart.serializers import CartSerializer
+from payments.gateways import PaymentGatewayError, get_gateway
+from recipes.models import Recipe
+from recipes.serializers import RecipeSerializer
+from recipes.views import RecipeListView
+from reviews.models import Review
+from reviews.serializers import ReviewSerializer
+
+from .authentication import CachedJWTAuthentication
+from .caching import _acount, aget_versions, cached_page_response, page_cache_key, page_entry
+from .conditional import compute_validators, set_validator_headers
+from .plans import plan_for
+from .renderers import FastJSONRenderer
+
+
+class AsyncAPIView(View):
+    """
+    Subclasses implement ``async def get_data(request)`` returning what goes in
+    the body, and optionally ``async def get_validator_aggregate(request)``
+    like ConditionalGetMixin. ``cache_versions`` (or get_cache_versions())
+    turns on the response cache for anonymous requests.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_class = CachedJWTAuthentication
+    permission_classes = [permissions.AllowAny]
+    renderer_class = FastJSONRenderer
+    cache_versions = ()
+    cache_timeout = None
+    last_modified_key = 'last_modified'
+    private_response = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # As DRF's APIView.as_view(): authentication is by token, not cookie,
+        # so there is nothing for CsrfViewMiddleware to protect.
+        view.csrf_exempt = True
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        return await self.run(request, self.read)
+
+    async def run(self, request, handler):
+        request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+        try:
+            await self.authenticate(request)
+            self.check_permissions(request)
+            return await handler(request)
+        except Exception as exc:
+            return self.handle_exception(request, exc)
+
+    async def read(self, request):
+        if request.user.is_authenticated or not self.get_cache_versions():
+            return await self.respond(request)
+        return await self.cached_respond(request)
+
+    async def authenticate(self, request):
+        authenticator = self.authentication_class()
+        # Set on the Django request too, so nothing (the replica router, for
+        # one) falls back to the session user, which would need a query.
+        request.user, request.auth = await authenticator.aauthenticate(request) or (AnonymousUser(), None)
+
+    def check_permissions(self, request):
+        for permission in self.permission_classes:
+            if not permission().has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def get_cache_versions(self):
+        return self.cache_versions
+
+    async def cached_respond(self, request):
+        key = page_cache_key(type(self).__name__, await aget_versions(self.get_cache_versions()), request)
+        entry = await cache.aget(key)
+        if entry is not None:
+            await _acount('hit')
+            return cached_page_response(request, entry)
+
+        await _acount('miss')
+        response = await self.respond(request)
+        if response.status_code == 200:
+            await cache.aset(key, page_entry(response), self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def respond(self, request):
+        etag, last_modified = compute_validators(
+            request, await self.get_validator_aggregate(request), self.last_modified_key,
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.render(await self.get_data(request))
+        return set_validator_headers(response, etag, last_modified, self.private_response)
+
+    async def get_validator_aggregate(self, request):
+        return None
+
+    async def get_data(self, request):
+        raise NotImplementedError('get_data() must be implemented.')
+
+    def get_serializer_context(self, request):
+        return {'request': request, 'view': self}
+
+    def render(self, data, status=200):
+        renderer = self.renderer_class()
+        return HttpResponse(renderer.render(data), status=status, content_type=renderer.media_type)
+
+    def handle_exception(self, request, exc):
+        # The same bodies and status codes DRF's exception handler gives.
+        if isinstance(exc, (Http404, ObjectDoesNotExist)):
+            exc = exceptions.NotFound()
+        if not isinstance(exc, exceptions.APIException):
+            raise exc
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authentication_class().authenticate_header(request)
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+        return response
+
+
+class AsyncRecipeListView(AsyncAPIView):
+    pagination_class = RecipeListView.pagination_class
+    filter_backends = RecipeListView.filter_backends
+    ordering_fields = RecipeListView.ordering_fields
+    ordering = RecipeListView.ordering
+    cache_versions = ('recipes',)
+
+    def filter_queryset(self, request, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self)
+        return queryset
+
+    async def get_validator_aggregate(self, request):
+        # Validating ?category= looks the category up, so filter in a thread.
+        self.queryset = await sync_to_async(self.filter_queryset)(request, Recipe.objects.all())
+        # As RecipeListView: the page's rows, not the whole filtered catalogue.
+        page = self.pagination_class().page_queryset(self.queryset, request, self)
+        return dict(await page.apage_validators(), version=(await aget_versions(self.cache_versions))[0])
+
+    async def get_data(self, request):
+        plan = plan_for(RecipeSerializer)
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(plan.values(self.queryset), request, view=self)
+        return paginator.get_paginated_response(plan.represent(page, self.get_serializer_context(request))).data
+
+
+class AsyncRecipeDetailView(AsyncAPIView):
+    cache_versions = ('recipes',)
+
+    async def get_validator_aggregate(self, request):
+        validators = await Recipe.objects.filter(pk=self.kwargs['pk']).avalidators()
+        return validators if validators['count'] else None
+
+    async def get_data(self, request):
+        recipe = await Recipe.objects.with_related().aget(pk=self.kwargs['pk'])
+        return RecipeSerializer(recipe, context=self.get_serializer_context(request)).data
+
+
+class AsyncReviewListView(AsyncAPIView):
+    def get_cache_versions(self):
+        return ('reviews:%s' % self.kwargs['recipe_id'],)
+
+    async def get_data(self, request):
+        plan = plan_for(ReviewSerializer)
+        reviews = plan.values(Review.objects.filter(
+            recipe_id=self.kwargs['recipe_id'],
+        ).order_by('-created_at', '-id'))
+        rows = [row async for row in reviews.aiterator(chunk_size=500)]
+        return plan.represent(rows, self.get_serializer_context(request))
+
+
+class AsyncCartView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    private_response = True
+
+    async def get_validator_aggregate(self, request):
+        validators = await Cart.objects.filter(user_id=request.user.pk).avalidators()
+        return validators if validators['user'] else None
+
+    async def get_data(self, request):
+        carts = Cart.objects.with_related().with_totals()
+        cart, created = await carts.aget_or_create(user_id=request.user.pk)
+        if created:
+            # A fresh row has neither the prefetched items nor the totals.
+            cart = await carts.aget(pk=cart.pk)
+        return CartSerializer(cart, context=self.get_serializer_context(request)).data
+
+
+class AsyncCreatePaymentIntentView(AsyncAPIView):
+    # POST only: the gateway round trip is where async pays off most.
+    http_method_names = ['post', 'options']
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def post(self, request, *args, **kwargs):
+        return await self.run(request, self.create_intent)
+
+    async def create_intent(self, request):
+        # As CreatePaymentIntentView.post().
+        try:
+            amount = int(request.data['amount'])  # Amount in cents
+        except (KeyError, TypeError, ValueError):
+            return self.render({'error': 'amount (in cents) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        currency = request.data.get('currency', 'usd')
+        idempotency_key = request.headers.get('Idempotency-Key') or uuid.uuid4().hex
+
+        try:
+            intent = await get_gateway().acreate_payment_intent(amount, currency, idempotency_key)
+        except PaymentGatewayError as e:
+            return self.render({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        return self.render({'clientSecret': intent.client_secret})
@@ -0,0 +1,168 @@
+# backend/api/authentication.py
+"""
+JWT authentication without a user query on every request.
+
+simplejwt's JWTAuthentication loads the User row for each request. Instead:
+
+* tokens carry the user's basic flags (is_active, is_staff, is_superuser) as
+  signed claims, added at login by ClaimsTokenObtainPairSerializer;
+* request.user is a TokenClaimsUser: pk, is_authenticated and those flags
+  come from the token, so permission checks cost nothing, and the User row
+  is only loaded when a view reads anything else (or filters by the user);
+* loaded users are kept in a per-process cache for AUTH_USER_CACHE_TTL
+  seconds, dropped when the user is saved or deleted (api.signals).
+
+The trade-off is that a flag change reaches other processes only after the
+TTL, and a deactivated user's existing access tokens keep passing
+permission checks until they expire. Tokens issued before the claims were
+added (or with CHECK_REVOKE_TOKEN on) load the user through the cache.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+FLAG_CLAIMS = ('is_active', 'is_staff', 'is_superuser')
+
+_users = {}
+_lock = threading.Lock()
+
+
+def get_cached_user(user_id):
+    entry = _users.get(user_id)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    # A new instance from the stored row for every request: a copy would share
+    # _state and its related-object cache with the requests on other threads.
+    _, model, db, values = entry
+    return model.from_db(db, [field.attname for field in model._meta.concrete_fields], values)
+
+
+def cache_user(user):
+    ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+    values = tuple(getattr(user, field.attname) for field in user._meta.concrete_fields)
+    with _lock:
+        _users[user.pk] = (time.monotonic() + ttl, type(user), user._state.db, values)
+
+
+def forget_user(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in FLAG_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class TokenClaimsUser(SimpleLazyObject):
+    """The user a token is for; reading anything beyond the claims loads the User."""
+
+    def __init__(self, load, user_id, claims):
+        super().__init__(load)
+        # Not setattr(): on a lazy object that would load the user.
+        self.__dict__['_user_id'] = user_id
+        self.__dict__['_claims'] = claims
+
+    @property
+    def pk(self):
+        return self.__dict__['_user_id']
+
+    id = pk
+
+    def __bool__(self):
+        # DRF's IsAdminUser tests `request.user and ...`
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def is_active(self):
+        return self.__dict__['_claims']['is_active']
+
+    @property
+    def is_staff(self):
+        return self.__dict__['_claims']['is_staff']
+
+    @property
+    def is_superuser(self):
+        return self.__dict__['_claims']['is_superuser']
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user = self.get_user_without_query(validated_token)
+        if user is None:
+            user = self.load_user(self.get_user_id(validated_token), validated_token)
+        return user
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; only queries when the claims don't do."""
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user_without_query(validated_token)
+        if user is None:
+            user = await sync_to_async(self.load_user)(self.get_user_id(validated_token), validated_token)
+        return user, validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+    def get_user_without_query(self, validated_token):
+        # The cached User, a TokenClaimsUser, or None if the row must be loaded.
+        user_id = self.get_user_id(validated_token)
+        user = get_cached_user(user_id)
+        if user is not None:
+            return self.check_user(user, validated_token)
+        if api_settings.CHECK_REVOKE_TOKEN or any(claim not in validated_token for claim in FLAG_CLAIMS):
+            return None
+
+        if not validated_token['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return TokenClaimsUser(
+            lambda: self.load_user(user_id, validated_token), user_id,
+            {claim: validated_token[claim] for claim in FLAG_CLAIMS},
+        )
+
+    def load_user(self, user_id, validated_token):
+        user = get_cached_user(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            cache_user(user)
+        return self.check_user(user, validated_token)
+
+    def check_user(self, user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
@@ -0,0 +1,157 @@
+# backend/api/caching.py
+"""
+Response cache for the read-mostly catalogue endpoints.
+
+Cached pages are keyed on one or more version counters ("recipes",
+"categories", "reviews:<recipe id>") that api.signals bumps whenever a
+Recipe, Category or Review is saved or deleted. Bumping a version makes every
+page built from the old one unreachable, so nothing has to be deleted and
+stale pages simply expire.
+
+Only anonymous GETs are cached: a request with an Authorization header always
+goes to the view. Cached pages keep their headers, including the ETag and
+Last-Modified set by api.conditional.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+VERSION_PREFIX = 'response-cache:version:'
+STATS_PREFIX = 'response-cache:stats:'
+
+
+def _new_version():
+    # Versions start from the clock rather than 1, so a counter evicted from the
+    # cache can never come back with a value that old pages were stored under.
+    return time.time_ns()
+
+
+def get_versions(names):
+    keys = [VERSION_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version())
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+async def aget_versions(names):
+    keys = [VERSION_PREFIX + name for name in names]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, _new_version())
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def bump_version(name):
+    key = VERSION_PREFIX + name
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def _count(outcome):
+    key = STATS_PREFIX + outcome
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+async def _acount(outcome):
+    key = STATS_PREFIX + outcome
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+def page_cache_key(view_name, versions, request):
+    versions = '.'.join(str(version) for version in versions)
+    # The Accept header picks the renderer, so it is part of the page identity.
+    identity = '%s\n%s' % (request.get_full_path(), request.META.get('HTTP_ACCEPT', ''))
+    return 'response-cache:page:%s:%s:%s' % (view_name, versions, hashlib.md5(identity.encode()).hexdigest())
+
+
+def page_entry(response):
+    return {'content': response.content, 'headers': dict(response.items())}
+
+
+def cached_page_response(request, entry):
+    response = HttpResponse(entry['content'])
+    for header, value in entry['headers'].items():
+        response[header] = value
+    # Pages from views with ConditionalGetMixin carry their validators, so a
+    # revalidating client still gets a 304 straight from the cache.
+    response = get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+        response=response,
+    )
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cache_stats():
+    stats = cache.get_many([STATS_PREFIX + 'hit', STATS_PREFIX + 'miss'])
+    hits = stats.get(STATS_PREFIX + 'hit', 0)
+    misses = stats.get(STATS_PREFIX + 'miss', 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+class CachedResponseMixin:
+    """
+    Add before the DRF view class:
+
+        class RecipeListView(CachedResponseMixin, generics.ListAPIView):
+            cache_versions = ('recipes',)
+
+    Override get_cache_versions() when the versions depend on the URL.
+    """
+    cache_versions = ()
+    cache_timeout = None
+
+    def get_cache_versions(self):
+        return self.cache_versions
+
+    def get_response_cache_key(self, request):
+        return page_cache_key(type(self).__name__, get_versions(self.get_cache_versions()), request)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or 'HTTP_AUTHORIZATION' in request.META:
+            return super().dispatch(request, *args, **kwargs)
+
+        self.args, self.kwargs = args, kwargs
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            _count('hit')
+            return self.cached_response(request, entry)
+
+        _count('miss')
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code == 200 and renderer is not None and renderer.format == 'json':
+            response.render()
+            cache.set(key, page_entry(response), self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def cached_response(self, request, entry):
+        return cached_page_response(request, entry)
@@ -0,0 +1,72 @@
+# backend/api/conditional.py
+"""
+Conditional GET (ETag / Last-Modified / 304 Not Modified) for DRF views.
+
+A view describes its current state with one cheap aggregate query, e.g. the
+latest updated_at and a row count, instead of serializing the response. When
+the client's If-None-Match / If-Modified-Since still matches, it gets a 304
+and the queryset is never evaluated.
+
+Last-Modified only has one-second precision and can't see deletions, so the
+ETag, which also covers row counts, is the validator to rely on; Django
+ignores If-Modified-Since whenever If-None-Match is sent.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def compute_validators(request, aggregate, last_modified_key='last_modified'):
+    """(ETag, Last-Modified timestamp) for a validator aggregate, or (None, None)."""
+    if aggregate is None:
+        return None, None
+    # The renderer and the query string change the body, so they are part of the tag.
+    state = [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+    state += ['%s=%s' % (key, aggregate[key]) for key in sorted(aggregate)]
+    etag = '"%s"' % hashlib.md5('\n'.join(state).encode()).hexdigest()
+    last_modified = aggregate.get(last_modified_key)
+    return etag, (int(last_modified.timestamp()) if last_modified else None)
+
+
+def set_validator_headers(response, etag, last_modified, private=False):
+    if response.status_code in (200, 304):
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        # Let browsers keep the body but revalidate on every poll.
+        if private:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Add before the DRF view class and implement get_validator_aggregate():
+
+        class CategoryViewSet(ConditionalGetMixin, generics.ListAPIView):
+            def get_validator_aggregate(self):
+                return Category.objects.aggregate(last=Max('updated_at'), count=Count('id'))
+
+    The aggregate must be a dict. Its values go into the ETag, and the
+    ``last_modified_key`` entry (a datetime) becomes Last-Modified. Returning
+    None skips the check, e.g. when the object doesn't exist yet.
+    """
+    last_modified_key = 'last_modified'
+    # Responses that differ per user must not be stored by shared caches.
+    private_response = False
+
+    def get_validator_aggregate(self):
+        raise NotImplementedError('get_validator_aggregate() must be implemented.')
+
+    def get_validators(self, request):
+        return compute_validators(request, self.get_validator_aggregate(), self.last_modified_key)
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        response = not_modified or super().get(request, *args, **kwargs)
+        return set_validator_headers(response, etag, last_modified, self.private_response)
@@ -0,0 +1,293 @@
+# backend/api/instrumentation.py
+"""
+Per-request performance numbers. PerformanceMiddleware records for every
+request:
+
+* the view (URL name, or the route when the URL has no name);
+* total latency, measured around the whole middleware stack below it;
+* database query count and time, from an execute wrapper that is added to
+  every connection when it opens (so it also sees the queries async views
+  run on Django's sync thread);
+* render time: how long the DRF Response took to turn its data into bytes
+  (the JSON encoding; the serializer's to_representation runs in the view);
+* response size in bytes.
+
+A PERF_SAMPLE_RATE share of requests also keep the SQL of their queries.
+When the same statement runs PERF_N_PLUS_ONE_THRESHOLD times or more in one
+request, that's almost always a query per row (N+1) and gets logged. Requests
+slower than PERF_SLOW_REQUEST_MS are logged with their numbers.
+
+/api/metrics/ serves everything in the Prometheus text format: counters
+per view plus latency percentiles over the last PERF_WINDOW requests of
+each view. The numbers are per process; with several workers, scrape each
+or let Prometheus sum them.
+"""
+import hmac
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework import authentication, permissions
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+_current = ContextVar('request_metrics', default=None)
+# "IN (%s, %s, %s)" and "VALUES (%s, %s), (%s, %s)" are the same statement
+# whatever the number of values.
+_REPEATED_PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+_REPEATED_ROWS = re.compile(r'\((?:%s)\)(?:\s*,\s*\((?:%s)\))+')
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'query_time', 'render_time', 'render_started', 'statements')
+
+    def __init__(self, sampled):
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.statements = Counter() if sampled else None
+
+
+def query_signature(sql):
+    sql = _REPEATED_PLACEHOLDERS.sub('%s', sql)
+    return _REPEATED_ROWS.sub('(%s)', sql)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper (connection.execute_wrappers) counting the request's queries."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.query_time += time.perf_counter() - started
+        metrics.queries += 1
+        if metrics.statements is not None:
+            metrics.statements[query_signature(sql)] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires again when a connection reconnects.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class ViewStats:
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.counters = Counter()
+        self.statuses = Counter()
+
+    def quantiles(self):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {}
+        return {q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] for q in QUANTILES}
+
+
+class Registry:
+    """Counters and latency windows per view, for the metrics endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view, status, latency, metrics, size, slow, n_plus_one):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats(getattr(settings, 'PERF_WINDOW', 1000))
+            stats.latencies.append(latency)
+            stats.statuses[status] += 1
+            counters = stats.counters
+            counters['requests'] += 1
+            counters['seconds'] += latency
+            counters['queries'] += metrics.queries
+            counters['query_seconds'] += metrics.query_time
+            counters['render_seconds'] += metrics.render_time
+            counters['response_bytes'] += size
+            counters['slow'] += slow
+            counters['n_plus_one'] += n_plus_one
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: (stats.quantiles(), dict(stats.counters), dict(stats.statuses))
+                for view, stats in self.views.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+class PerformanceMiddleware:
+    """First in MIDDLEWARE, so its latency covers all the others."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def start(self):
+        sampled = random.random() < getattr(settings, 'PERF_SAMPLE_RATE', 0.1)
+        metrics = RequestMetrics(sampled)
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF Responses render after this, in the handler.
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(self.rendered)
+        return response
+
+    def rendered(self, response):
+        metrics = _current.get()
+        if metrics is not None and metrics.render_started is not None:
+            metrics.render_time += time.perf_counter() - metrics.render_started
+
+    def finish(self, request, response, metrics, latency):
+        view = view_name(request)
+        size = response_size(response)
+
+        repeated = []
+        if metrics.statements:
+            threshold = getattr(settings, 'PERF_N_PLUS_ONE_THRESHOLD', 5)
+            repeated = [(count, sql) for sql, count in metrics.statements.most_common() if count >= threshold]
+            for count, sql in repeated:
+                logger.warning('Possible N+1 in %s: %d x %s', view, count, sql[:500])
+
+        slow = latency * 1000 >= getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        if slow:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, render %.0f ms, %d bytes, status %d',
+                request.method, request.path, view, latency * 1000, metrics.queries, metrics.query_time * 1000,
+                metrics.render_time * 1000, size, response.status_code,
+            )
+        registry.add(view, response.status_code, latency, metrics, size, slow, bool(repeated))
+
+
+# (counter, metric name, type, help)
+COUNTERS = [
+    ('requests', 'http_requests_total', 'counter', 'Requests handled.'),
+    ('queries', 'http_request_db_queries_total', 'counter', 'Database queries run by requests.'),
+    ('query_seconds', 'http_request_db_seconds_total', 'counter', 'Time requests spent in database queries.'),
+    ('render_seconds', 'http_request_render_seconds_total', 'counter', 'Time spent rendering responses.'),
+    ('response_bytes', 'http_response_bytes_total', 'counter', 'Response body bytes.'),
+    ('slow', 'http_slow_requests_total', 'counter', 'Requests over PERF_SLOW_REQUEST_MS.'),
+    ('n_plus_one', 'http_n_plus_one_requests_total', 'counter', 'Sampled requests that repeated a query.'),
+]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics(snapshot):
+    """The registry snapshot in the Prometheus text exposition format."""
+    views = sorted(snapshot)
+    lines = [
+        '# HELP http_request_duration_seconds Request latency over the last PERF_WINDOW requests.',
+        '# TYPE http_request_duration_seconds summary',
+    ]
+    for view in views:
+        quantiles, counters, _ = snapshot[view]
+        for q, value in sorted(quantiles.items()):
+            lines.append('http_request_duration_seconds{view="%s",quantile="%s"} %.6f' % (_label(view), q, value))
+        lines.append('http_request_duration_seconds_sum{view="%s"} %.6f' % (_label(view), counters['seconds']))
+        lines.append('http_request_duration_seconds_count{view="%s"} %d' % (_label(view), counters['requests']))
+
+    lines += [
+        '# HELP http_responses_total Responses by status code.',
+        '# TYPE http_responses_total counter',
+    ]
+    for view in views:
+        for status, count in sorted(snapshot[view][2].items()):
+            lines.append('http_responses_total{view="%s",status="%d"} %d' % (_label(view), status, count))
+
+    for key, name, kind, help_text in COUNTERS:
+        lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)]
+        for view in views:
+            value = snapshot[view][1][key]
+            lines.append('%s{view="%s"} %s' % (name, _label(view), ('%.6f' % value) if isinstance(value, float) else value))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_response():
+    return HttpResponse(render_metrics(registry.snapshot()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Lets a scraper in with "Authorization: Bearer <METRICS_TOKEN>", since it
+    can't log in for a JWT. Put it before the JWT authentication.
+    """
+    scraper = 'metrics-token'
+
+    def authenticate(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        header = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(header.encode(), ('Bearer %s' % token).encode()):
+            return AnonymousUser(), self.scraper
+        return None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
+
+
+class IsMetricsScraper(permissions.BasePermission):
+    # The scraper's token, or a staff user.
+    def has_permission(self, request, view):
+        return request.auth == MetricsTokenAuthentication.scraper or bool(request.user and request.user.is_staff)
@@ -0,0 +1,33 @@
+# backend/api/management/benchmarking.py
+"""
+Shared by the benchmark_* commands, which run against a copy of the
+database swapped in for the run, and count failed requests rather than have
+django.request log every one of them.
+"""
+import logging
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+def use_database(config):
+    """Point the default connection at ``config``, a DATABASES entry."""
+    # Connections are per thread; drop ours so the next query opens one
+    # with the new settings.
+    connections.close_all()
+    connections.settings['default'] = config
+    try:
+        del connections['default']
+    except AttributeError:
+        pass
+
+
+@contextmanager
+def quiet_request_log():
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        request_logger.setLevel(level)
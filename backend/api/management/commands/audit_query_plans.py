@@ -0,0 +1,155 @@
+import re
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from categories.models import Category
+from payments.events import ingest_event, process_batch
+from payments.models import Order, OrderItem, Payment
+from recipes.models import Recipe
+from reviews.models import Review
+
+# (label, url name, url kwargs, query params). {recipe}, {category} and
+# {review} in kwargs and params are replaced with the ids of sample rows.
+ENDPOINTS = [
+    ('recipe list', 'recipe-list', {}, {}),
+    ('recipe list by category', 'recipe-list', {}, {'category': '{category}'}),
+    ('recipe list by price', 'recipe-list', {}, {'ordering': 'price'}),
+    ('recipe list by category and price', 'recipe-list', {}, {'category': '{category}', 'ordering': '-price'}),
+    ('recipe list by rating', 'recipe-list', {}, {'ordering': '-rating_avg'}),
+    ('recipe list by category and rating', 'recipe-list', {}, {'category': '{category}', 'ordering': '-rating_avg'}),
+    ('recipe list by prep time', 'recipe-list', {}, {'ordering': 'prep_time'}),
+    ('recipe list by category and prep time', 'recipe-list', {}, {'category': '{category}', 'ordering': 'prep_time'}),
+    ('recipe list by cook time', 'recipe-list', {}, {'ordering': 'cook_time'}),
+    ('recipe list by category and cook time', 'recipe-list', {}, {'category': '{category}', 'ordering': '-cook_time'}),
+    ('recipe list by review count', 'recipe-list', {}, {'ordering': '-rating_count'}),
+    ('recipe list by category and review count', 'recipe-list', {}, {'category': '{category}', 'ordering': '-rating_count'}),
+    ('recipe detail', 'recipe-detail', {'pk': '{recipe}'}, {}),
+    ('recipe search', 'recipe-search', {}, {'q': 'adobo'}),
+    ('cook with', 'recipe-cook-with', {}, {'ingredients': 'chicken,vinegar'}),
+    ('categories', 'category-list', {}, {}),
+    ('recipe reviews', 'recipe-reviews', {'recipe_id': '{recipe}'}, {}),
+    ('review detail', 'review-detail', {'pk': '{review}'}, {}),
+    ('cart', 'user-cart', {}, {}),
+    ('orders', 'order-list', {}, {}),
+]
+
+# Tables where reading every row is the point.
+ALLOWED_SCANS = {
+    'categories_category': 'the category list returns every category',
+}
+
+
+def full_scans(plan, tables, limited=False):
+    """
+    Tables a query plan reads from end to end: any SCAN of a table, whether
+    of the table itself or of an index (USING [COVERING] INDEX), as only a
+    SEARCH has a constraint to narrow it. Scans of subqueries and CTEs aren't
+    tables; a virtual table (full-text search) scan is constrained when its
+    index says so ("VIRTUAL TABLE INDEX 32:M3", not "0:"). A ``limited`` statement (one with a LIMIT) may walk an index in
+    its ORDER BY, since it stops after the page; not when SQLite sorts the
+    rows itself (a temp b-tree), which means reading all of them first.
+    """
+    ordered_walk = limited and not any('USE TEMP B-TREE' in row[-1] for row in plan)
+    scans = []
+    for row in plan:
+        words = row[-1].split()
+        if words[:1] != ['SCAN'] or len(words) < 2 or words[1] not in tables:
+            continue
+        if ordered_walk and words[2:4] in (['USING', 'INDEX'], ['USING', 'COVERING']):
+            continue
+        if words[2:5] == ['VIRTUAL', 'TABLE', 'INDEX'] and words[5:] and words[5].partition(':')[2]:
+            continue
+        scans.append(words[1])
+    return scans
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN QUERY PLAN on the queries the main endpoints (and the payment webhook worker) "
+        "issue and flag full table scans. Works on sample rows inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only problems.')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if anything scans (CI).')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN is SQLite only.')
+
+        flagged = 0
+        self.tables = set(connection.introspection.table_names())
+        # Everything on the primary, where the queries are captured.
+        with override_settings(DATABASE_REPLICAS=[], ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            ids, user = self.sample_rows()
+            client = APIClient()
+            client.force_authenticate(user)
+            # Authenticated requests skip the response cache.
+            client.credentials(HTTP_AUTHORIZATION='Bearer audit')
+
+            for label, name, kwargs, params in ENDPOINTS:
+                url = reverse(name, kwargs={key: value.format(**ids) for key, value in kwargs.items()})
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url, {key: value.format(**ids) for key, value in params.items()})
+                if response.status_code != 200:
+                    self.stderr.write(f"{label}: {url} answered {response.status_code}")
+                flagged += self.audit(label, queries, options['verbose_plans'])
+
+            ingest_event({'id': 'evt_audit', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': 'pi_audit'}}})
+            with CaptureQueriesContext(connection) as queries:
+                process_batch()
+            flagged += self.audit('payment webhook batch', queries, options['verbose_plans'])
+
+            transaction.set_rollback(True)
+
+        if flagged:
+            message = f"{flagged} queries read a whole table."
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No full table scans."))
+
+    def audit(self, label, queries, verbose):
+        flagged = 0
+        statements = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].split(' ', 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+        ]
+        self.stdout.write(f"{label}: {len(statements)} queries")
+        for sql in statements:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = cursor.fetchall()
+            limited = re.search(r'\bLIMIT\s+\d+(\s+OFFSET\s+\d+)?\s*$', sql, re.IGNORECASE) is not None
+            scans = [table for table in full_scans(plan, self.tables, limited) if table not in ALLOWED_SCANS]
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f"  full scan of {', '.join(scans)}: {sql[:300]}"))
+            if scans or verbose:
+                for row in plan:
+                    self.stdout.write(f"    {row[-1]}")
+        return flagged
+
+    def sample_rows(self):
+        user = User.objects.create(username='query-plan-audit')
+        category = Category.objects.create(name='Query plan audit')
+        recipe = Recipe.objects.create(
+            title='Chicken adobo', description='Audit', instructions='Simmer.', ingredients='chicken\nvinegar',
+            prep_time=5, cook_time=30, servings=2, price=Decimal('5.00'), category=category,
+        )
+        review = Review.objects.create(recipe=recipe, user=user, rating=5, comment='Audit')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, recipe=recipe, quantity=1, price_at_time_of_addition=recipe.price)
+        order = Order.objects.create(user=user, total_amount=recipe.price)
+        OrderItem.objects.create(order=order, recipe=recipe, quantity=1, price=recipe.price)
+        Payment.objects.create(order=order, payment_id='pi_audit', amount=recipe.price, status='processing')
+        return {'recipe': recipe.pk, 'category': category.pk, 'review': review.pk}, user
@@ -0,0 +1,365 @@
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from api.authentication import ClaimsTokenObtainPairSerializer
+from api.instrumentation import registry
+from api.management.benchmarking import quiet_request_log, use_database
+
+from .generate_shop_data import DEFAULT_ID_OFFSET
+
+PASSWORD = 'Benchmark-pass-1234'
+WORDS = (
+    'chicken pork beef tofu rice noodle garlic ginger onion tomato coconut lime chili mango '
+    'vinegar soy adobo sinigang curry stew soup salad roast grilled fried braised spicy sweet'
+).split()
+ORDERINGS = ['-created_at', 'price', '-price', '-rating_avg', 'cook_time']
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+def milliseconds(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def format_ms(value):
+    # Percentiles are None when no request succeeded.
+    return 'n/a' if value is None else f"{value:.1f} ms"
+
+
+class Run:
+    """Timings and failures of one scenario, shared by its workers."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Of successful requests only: a failure (e.g. a locked database)
+        # says nothing about how fast the view is.
+        self.latencies = []
+        self.requests = 0
+        self.errors = 0
+
+    def add(self, latency, ok):
+        with self.lock:
+            self.requests += 1
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+
+# Scenarios are sequences of requests: (label, method, url name, url args, body or params, expected statuses).
+# Each one gets the worker's random generator and the seeded ids.
+
+def browse(rng, ids, user):
+    params = {'ordering': rng.choice(ORDERINGS)}
+    if rng.random() < 0.5:
+        params['category'] = rng.choice(ids['categories'])
+    return [('get', 'recipe-list', [], params, (200,))]
+
+
+def detail(rng, ids, user):
+    return [('get', 'recipe-detail', [rng.choice(ids['recipes'])], {}, (200,))]
+
+
+def reviews(rng, ids, user):
+    return [('get', 'recipe-reviews', [rng.choice(ids['recipes'])], {}, (200,))]
+
+
+def search(rng, ids, user):
+    return [('get', 'recipe-search', [], {'q': rng.choice(WORDS)}, (200,))]
+
+
+def categories(rng, ids, user):
+    return [('get', 'category-list', [], {}, (200,))]
+
+
+def cart(rng, ids, user):
+    recipe_id = rng.choice(ids['recipes'])
+    return [
+        ('post', 'add-to-cart', [], {'recipe_id': recipe_id, 'quantity': 1}, (201,)),
+        ('get', 'user-cart', [], {}, (200,)),
+        ('post', 'cart-batch', [], {'operations': [{'recipe_id': recipe_id, 'quantity': 0}]}, (200,)),
+    ]
+
+
+def register(rng, ids, user):
+    username = 'bench-%s' % uuid.uuid4().hex[:12]
+    return [('post', 'register', [], {
+        'username': username, 'email': '%s@example.com' % username,
+        'password': PASSWORD, 'password2': PASSWORD, 'first_name': 'Bench', 'last_name': 'Mark',
+    }, (201,))]
+
+
+def login(rng, ids, user):
+    return [('post', 'token_obtain_pair', [], {'username': user.username, 'password': PASSWORD}, (200,))]
+
+
+def checkout(rng, ids, user):
+    return [
+        ('post', 'cart-batch', [], {'operations': [{'recipe_id': rng.choice(ids['recipes']), 'quantity_delta': 1}]},
+         (200,)),
+        ('post', 'checkout', [], {'idempotency_key': uuid.uuid4().hex}, (200, 201)),
+    ]
+
+
+def orders(rng, ids, user):
+    return [('get', 'order-list', [], {}, (200,))]
+
+
+SCENARIOS = {
+    'browse': browse,
+    'detail': detail,
+    'reviews': reviews,
+    'search': search,
+    'categories': categories,
+    'cart': cart,
+    'register': register,
+    'login': login,
+    'checkout': checkout,
+    'orders': orders,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a copy of the database with a realistic catalogue (generate_shop_data), then drive the API "
+        "routes through the WSGI and/or ASGI handler at a given concurrency. Reports requests per second, p50/p95/p99 latency "
+        "and database queries per request for each scenario; --output stores the numbers as JSON and "
+        "--compare diffs them against an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append', help='Only run these.')
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='wsgi')
+        parser.add_argument('--concurrency', type=int, default=8, help='Threads (WSGI) or tasks (ASGI) (default: 8).')
+        parser.add_argument('--requests', type=int, default=200, help='Scenario runs per scenario (default: 200).')
+        parser.add_argument('--seed', type=int, default=1, help='Seed for the data and the request mix (default: 1).')
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--reviews-per-recipe', type=int, default=5)
+        parser.add_argument('--orders-per-user', type=int, default=3)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='JSON file of an earlier run to compare against.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Relative slowdown (throughput or p95) reported as a regression (default: 0.1).',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on a regression (CI).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        base = dict(connections.settings['default'])
+        workdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(workdir, 'benchmark.sqlite3')
+            shutil.copy(base['NAME'], path)
+            use_database(dict(base, NAME=path))
+            # Failed requests are counted, not logged one by one.
+            with quiet_request_log(), override_settings(
+                PAYMENT_GATEWAY='payments.gateways.FakeGateway',
+                PAYMENT_GATEWAY_OPTIONS={},
+                ALLOWED_HOSTS=['testserver'],
+                DATABASE_REPLICAS=[],
+                # Numbers from every request, no SQL kept.
+                PERF_SAMPLE_RATE=0,
+                PERF_SLOW_REQUEST_MS=10 ** 9,
+            ):
+                started = time.monotonic()
+                ids, users = self.seed(options)
+                self.stdout.write(f"Seeded in {time.monotonic() - started:.1f}s: " + ', '.join(
+                    f"{len(values)} {name}" for name, values in ids.items()
+                ))
+                results = {}
+                servers = ['wsgi', 'asgi'] if options['server'] == 'both' else [options['server']]
+                for server in servers:
+                    results[server] = {}
+                    for name in options['scenario'] or list(SCENARIOS):
+                        result = self.run(server, name, ids, users, options)
+                        results[server][name] = result
+                        self.stdout.write(self.summary(server, name, result))
+        finally:
+            use_database(base)
+            shutil.rmtree(workdir)
+
+        report = {
+            'commit': self.commit(),
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'options': {
+                key: options[key] for key in (
+                    'concurrency', 'requests', 'seed', 'recipes', 'categories', 'users',
+                    'reviews_per_recipe', 'orders_per_user',
+                )
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if baseline is not None:
+            self.compare(baseline, report, options)
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def seed(self, options):
+        call_command('migrate', verbosity=0)
+        call_command(
+            'generate_shop_data', verbosity=0, seed=options['seed'], prefix='benchmark', password=PASSWORD,
+            categories=options['categories'], users=options['users'], recipes=options['recipes'],
+            reviews=options['recipes'] * options['reviews_per_recipe'],
+            orders=options['users'] * options['orders_per_user'],
+        )
+        ids = {
+            name: list(range(DEFAULT_ID_OFFSET, DEFAULT_ID_OFFSET + options[name]))
+            for name in ('categories', 'recipes', 'users')
+        }
+        users = list(User.objects.filter(pk__in=ids['users']).order_by('pk'))
+        return ids, users
+
+    def headers(self, user):
+        # Every request is authenticated, so reads skip the response cache
+        # and the numbers are those of the views.
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        return {'Authorization': 'Bearer %s' % token}
+
+    def steps(self, name, rng, ids, user):
+        for method, url_name, args, data, expected in SCENARIOS[name](rng, ids, user):
+            kwargs = {'content_type': 'application/json'} if method == 'post' else {}
+            yield method, reverse(url_name, args=args), data, kwargs, expected
+
+    def run(self, server, name, ids, users, options):
+        registry.reset()
+        run = Run()
+        started = time.monotonic()
+        if server == 'wsgi':
+            self.run_wsgi(name, ids, users, run, options)
+        else:
+            asyncio.run(self.run_asgi(name, ids, users, run, options))
+        elapsed = time.monotonic() - started
+
+        stats = registry.snapshot().values()
+        served = sum(counters['requests'] for _, counters, _ in stats)
+        queries = sum(counters['queries'] for _, counters, _ in stats)
+        latencies = sorted(run.latencies)
+        return {
+            'requests': run.requests,
+            'errors': run.errors,
+            'seconds': round(elapsed, 3),
+            'rps': run.requests / elapsed,
+            'p50_ms': milliseconds(percentile(latencies, 0.5)),
+            'p95_ms': milliseconds(percentile(latencies, 0.95)),
+            'p99_ms': milliseconds(percentile(latencies, 0.99)),
+            'queries_per_request': queries / served if served else 0,
+        }
+
+    def summary(self, server, name, result):
+        return (
+            f"{server} {name}: {result['rps']:.1f} req/s, p50 {format_ms(result['p50_ms'])}, "
+            f"p95 {format_ms(result['p95_ms'])}, p99 {format_ms(result['p99_ms'])}, "
+            f"{result['queries_per_request']:.1f} queries/request, "
+            f"{result['errors']}/{result['requests']} errors"
+        )
+
+    def run_wsgi(self, name, ids, users, run, options):
+        def worker(index, count):
+            user = users[index % len(users)]
+            rng = random.Random('%s-%s-%d' % (options['seed'], name, index))
+            client, headers = Client(), self.headers(user)
+            for _ in range(count):
+                for method, url, data, kwargs, expected in self.steps(name, rng, ids, user):
+                    started = time.perf_counter()
+                    try:
+                        response = getattr(client, method)(url, data, headers=headers, **kwargs)
+                        ok = response.status_code in expected
+                    except Exception:
+                        # e.g. OperationalError: database is locked
+                        ok = False
+                    run.add(time.perf_counter() - started, ok)
+            connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(i, count))
+            for i, count in enumerate(self.split(options['requests'], options['concurrency']))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    async def run_asgi(self, name, ids, users, run, options):
+        async def worker(index, count):
+            user = users[index % len(users)]
+            rng = random.Random('%s-%s-%d' % (options['seed'], name, index))
+            client, headers = AsyncClient(), self.headers(user)
+            for _ in range(count):
+                for method, url, data, kwargs, expected in self.steps(name, rng, ids, user):
+                    started = time.perf_counter()
+                    try:
+                        response = await getattr(client, method)(url, data, headers=headers, **kwargs)
+                        ok = response.status_code in expected
+                    except Exception:
+                        ok = False
+                    run.add(time.perf_counter() - started, ok)
+
+        await asyncio.gather(*(
+            worker(i, count) for i, count in enumerate(self.split(options['requests'], options['concurrency']))
+        ))
+
+    def split(self, total, workers):
+        return [total // workers + (i < total % workers) for i in range(workers)]
+
+    def compare(self, baseline, report, options):
+        self.stdout.write(f"Compared with {baseline.get('commit') or 'the baseline'}:")
+        regressions = 0
+        for server, scenarios in report['results'].items():
+            for name, result in scenarios.items():
+                before = baseline.get('results', {}).get(server, {}).get(name)
+                if not before:
+                    continue
+                rps = result['rps'] / before['rps'] - 1 if before['rps'] else 0
+                p95 = result['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] and result['p95_ms'] is not None else 0
+                queries = result['queries_per_request'] - before['queries_per_request']
+                line = f"  {server} {name}: throughput {rps:+.1%}, p95 {p95:+.1%}, queries/request {queries:+.1f}"
+                if rps < -options['threshold'] or p95 > options['threshold'] or queries > 0.5:
+                    regressions += 1
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
+        if regressions:
+            message = f"{regressions} scenarios regressed."
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions."))
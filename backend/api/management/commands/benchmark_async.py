@@ -0,0 +1,131 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from api.authentication import ClaimsTokenObtainPairSerializer
+from api.management.benchmarking import quiet_request_log, use_database
+from recipes.models import Recipe
+
+# name -> (sync url name, async url name, method, body)
+SCENARIOS = {
+    'payment-intent': ('create-payment-intent', 'async-create-payment-intent', 'post', {'amount': 1250}),
+    'recipes': ('recipe-list', 'async-recipe-list', 'get', None),
+    'cart': ('user-cart', 'async-user-cart', 'get', None),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync endpoints, served by a fixed number of threads like WSGI workers, with "
+        "their api.asyncviews versions, served by one event loop with many requests in flight. "
+        "The payment gateway is FakeGateway with --latency seconds per call. Works on a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Sync worker threads (default: 8).')
+        parser.add_argument('--concurrency', type=int, default=64, help='Async requests in flight (default: 64).')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per run (default: 400).')
+        parser.add_argument('--latency', type=float, default=0.3, help='Gateway latency in seconds (default: 0.3).')
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append', help='Only run these.')
+
+    def handle(self, *args, **options):
+        base = dict(connections.settings['default'])
+        workdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(workdir, 'benchmark.sqlite3')
+            shutil.copy(base['NAME'], path)
+            use_database(dict(base, NAME=path))
+            # Failed requests are counted, not logged one by one.
+            with quiet_request_log(), override_settings(
+                PAYMENT_GATEWAY='payments.gateways.FakeGateway',
+                PAYMENT_GATEWAY_OPTIONS={'latency': options['latency']},
+                ALLOWED_HOSTS=['testserver'],
+                DATABASE_REPLICAS=[],
+            ):
+                headers = self.prepare()
+                for name in options['scenario'] or list(SCENARIOS):
+                    sync_rps = self.run_sync(name, headers, options)
+                    async_rps = asyncio.run(self.run_async(name, headers, options))
+                    if sync_rps:
+                        self.stdout.write(self.style.SUCCESS(f"{name}: async vs sync {async_rps / sync_rps:.2f}x"))
+        finally:
+            use_database(base)
+            shutil.rmtree(workdir)
+
+    def prepare(self):
+        call_command('migrate', verbosity=0)
+        user, _ = User.objects.get_or_create(username='benchmark-async')
+        if Recipe.objects.count() < 50:
+            Recipe.objects.bulk_create([
+                Recipe(
+                    title='Benchmark recipe %d' % i, description='Benchmark', instructions='Cook.',
+                    ingredients='flour\nwater', prep_time=5, cook_time=10, servings=2, price=Decimal('5.00'),
+                )
+                for i in range(50)
+            ])
+        # A real token: the async views only do JWT. Authenticated requests
+        # also skip the response cache on both sides.
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        return {'Authorization': 'Bearer %s' % token}
+
+    def report(self, name, kind, ok, errors, elapsed, workers):
+        rps = ok / elapsed
+        self.stdout.write(f"{name} {kind}: {rps:.1f} req/s ({ok} ok, {errors} errors in {elapsed:.2f}s, {workers})")
+        return rps
+
+    def run_sync(self, name, headers, options):
+        url_name, _, method, body = SCENARIOS[name]
+        url = reverse(url_name)
+        local = threading.local()
+
+        def call(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            if method == 'post':
+                response = local.client.post(url, body, content_type='application/json', headers=headers)
+            else:
+                response = local.client.get(url, headers=headers)
+            return response.status_code == 200
+
+        def close(_):
+            connections.close_all()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            results = list(pool.map(call, range(options['requests'])))
+            elapsed = time.monotonic() - started
+            list(pool.map(close, range(options['threads'])))
+        return self.report(name, 'sync', sum(results), len(results) - sum(results), elapsed,
+                           f"{options['threads']} threads")
+
+    async def run_async(self, name, headers, options):
+        _, url_name, method, body = SCENARIOS[name]
+        url = reverse(url_name)
+        client = AsyncClient()
+        slots = asyncio.Semaphore(options['concurrency'])
+
+        async def call():
+            async with slots:
+                if method == 'post':
+                    response = await client.post(url, body, content_type='application/json', headers=headers)
+                else:
+                    response = await client.get(url, headers=headers)
+                return response.status_code == 200
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(call() for _ in range(options['requests'])))
+        elapsed = time.monotonic() - started
+        return self.report(name, 'async', sum(results), len(results) - sum(results), elapsed,
+                           f"{options['concurrency']} in flight")
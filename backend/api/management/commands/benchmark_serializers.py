@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.management.benchmarking import use_database
+from api.plans import plan_for
+from api.renderers import FastJSONRenderer
+from api.serializers import CategorySerializer
+from cart.models import Cart
+from cart.serializers import CartSerializer
+from categories.models import Category
+from recipes.models import Recipe
+from recipes.serializers import RecipeSerializer
+from reviews.models import Review
+from reviews.serializers import ReviewSerializer
+
+# name -> (serializer, queryset as the views read it)
+CASES = {
+    'recipes': (RecipeSerializer, lambda: Recipe.objects.with_related().order_by('-created_at', '-id')),
+    'reviews': (ReviewSerializer, lambda: Review.objects.with_related().order_by('-created_at', '-id')),
+    'categories': (CategorySerializer, lambda: Category.objects.order_by('id')),
+    'carts': (CartSerializer, lambda: Cart.objects.with_related().with_totals().order_by('id')),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Serialize --rows rows of each list with its ModelSerializer and JSONRenderer, then with its "
+        "api.plans read plan, and with the plan and FastJSONRenderer; checks the bytes are the same and "
+        "reports rows per second, query included. Works on a copy of the database, topped up by "
+        "generate_shop_data when it has fewer rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per list (default: 10000).')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path, the best one counts (default: 3).')
+        parser.add_argument('--case', choices=sorted(CASES), action='append', help='Only run these.')
+
+    def handle(self, *args, **options):
+        base = dict(connections.settings['default'])
+        workdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(workdir, 'benchmark.sqlite3')
+            shutil.copy(base['NAME'], path)
+            use_database(dict(base, NAME=path))
+            self.seed(options['rows'])
+            # A request, so file and image URLs are absolute like in the views.
+            context = {'request': RequestFactory().get('/api/')}
+            for name in options['case'] or list(CASES):
+                self.compare(name, context, options)
+        finally:
+            use_database(base)
+            shutil.rmtree(workdir)
+
+    def seed(self, rows):
+        call_command('migrate', verbosity=0)
+        if min(Recipe.objects.count(), Review.objects.count(), Category.objects.count(), Cart.objects.count()) < rows:
+            # Every user gets a cart, so there are as many carts as users.
+            call_command(
+                'generate_shop_data', verbosity=0, prefix='benchmark-serializers', categories=rows,
+                users=rows, recipes=rows, reviews=rows, orders=0, cart_share=1.0,
+            )
+
+    def best(self, function, repeat):
+        timings, output = [], None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = function()
+            timings.append(time.perf_counter() - started)
+        return min(timings), output
+
+    def compare(self, name, context, options):
+        serializer_class, queryset = CASES[name]
+        plan = plan_for(serializer_class)
+        rows = options['rows']
+
+        def serializer():
+            data = serializer_class(queryset()[:rows], many=True, context=context).data
+            return JSONRenderer().render(data)
+
+        def planned(renderer_class):
+            return lambda: renderer_class().render(plan.represent(plan.values(queryset()[:rows]), context))
+
+        drf, expected = self.best(serializer, options['repeat'])
+        plain, plain_output = self.best(planned(JSONRenderer), options['repeat'])
+        fast, fast_output = self.best(planned(FastJSONRenderer), options['repeat'])
+        if not plain_output == fast_output == expected:
+            raise CommandError(f"{name}: the plan's JSON differs from the serializer's.")
+
+        count = queryset()[:rows].count()
+        self.stdout.write(
+            f"{name} ({count} rows, {len(expected)} bytes): serializer {count / drf:.0f} rows/s, "
+            f"plan {count / plain:.0f} rows/s, plan + orjson {count / fast:.0f} rows/s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{name}: {drf / fast:.1f}x, identical output"))
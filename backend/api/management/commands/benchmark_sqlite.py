@@ -0,0 +1,153 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.management.benchmarking import quiet_request_log, use_database
+from recipes.models import Recipe
+
+# name -> changes to DATABASES['default']. 'stock' is Django's plain SQLite
+# backend as this project used to run it.
+CONFIGS = {
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'tuned': {},
+}
+# name -> journal mode its copy is switched to before the run. The journal
+# mode is kept in the database file, not in the settings: a database the
+# tuned backend has opened stays in WAL mode for the stock backend too.
+JOURNAL_MODES = {'stock': 'DELETE'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second of the stock SQLite setup and the tuned one in settings "
+        "(WAL, pragmas, persistent connections, BEGIN IMMEDIATE). Each run works on its own copy "
+        "of the database: browsing recipes, editing carts and checking out from several threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per configuration (default: 10).')
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Share of requests that write: cart updates, and now and then a checkout (default: 0.2).',
+        )
+        parser.add_argument('--config', choices=sorted(CONFIGS), action='append', help='Only run these.')
+
+    def handle(self, *args, **options):
+        base = dict(connections.settings['default'])
+        results = {}
+        workdir = tempfile.mkdtemp()
+        try:
+            for name in options['config'] or list(CONFIGS):
+                path = os.path.join(workdir, '%s.sqlite3' % name)
+                shutil.copy(base['NAME'], path)
+                config = dict(base, NAME=path, **CONFIGS[name])
+                results[name] = self.run(name, config, options)
+        finally:
+            use_database(base)
+            shutil.rmtree(workdir)
+
+        if 'stock' in results and 'tuned' in results and results['stock']:
+            self.stdout.write(self.style.SUCCESS(
+                f"tuned vs stock: {results['tuned'] / results['stock']:.2f}x requests per second"
+            ))
+
+    def run(self, name, config, options):
+        use_database(config)
+        with connections['default'].cursor() as cursor:
+            if name in JOURNAL_MODES:
+                cursor.execute('PRAGMA journal_mode=%s' % JOURNAL_MODES[name])
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        users, recipe_ids = self.prepare(options['threads'])
+
+        stop = time.monotonic() + options['duration']
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            # Authenticated requests skip the response cache: measure the database.
+            client.credentials(HTTP_AUTHORIZATION='Bearer benchmark')
+            rng = random.Random(user.pk)
+            local = {'reads': 0, 'writes': 0, 'errors': 0}
+            while time.monotonic() < stop:
+                try:
+                    if rng.random() < options['write_ratio']:
+                        if rng.random() < 0.1:
+                            response = client.post(reverse('checkout'), {'idempotency_key': uuid.uuid4().hex})
+                            ok = response.status_code in (200, 201, 400)  # 400: empty cart
+                        else:
+                            response = client.post(reverse('cart-batch'), {'operations': [
+                                {'recipe_id': rng.choice(recipe_ids), 'quantity_delta': 1},
+                            ]}, format='json')
+                            ok = response.status_code == 200
+                        kind = 'writes'
+                    else:
+                        if rng.random() < 0.5:
+                            response = client.get(reverse('recipe-list'))
+                        else:
+                            response = client.get(reverse('recipe-detail', args=[rng.choice(recipe_ids)]))
+                        ok = response.status_code == 200
+                        kind = 'reads'
+                    local[kind if ok else 'errors'] += 1
+                except Exception:
+                    # e.g. OperationalError: database is locked
+                    local['errors'] += 1
+            connections.close_all()
+            with lock:
+                for key, value in local.items():
+                    counts[key] += value
+
+        # Failed requests are counted, not logged one by one.
+        with quiet_request_log(), override_settings(
+            PAYMENT_GATEWAY='payments.gateways.FakeGateway',
+            PAYMENT_GATEWAY_OPTIONS={},
+            ALLOWED_HOSTS=['testserver'],
+        ):
+            threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+            started = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started
+
+        total = counts['reads'] + counts['writes']
+        rps = total / elapsed
+        self.stdout.write(
+            f"{name}: {rps:.1f} req/s ({counts['reads']} reads, {counts['writes']} writes, "
+            f"{counts['errors']} errors in {elapsed:.1f}s, {options['threads']} threads, "
+            f"journal_mode={journal_mode})"
+        )
+        return rps
+
+    def prepare(self, threads):
+        call_command('migrate', verbosity=0)
+        users = []
+        for i in range(threads):
+            user, _ = User.objects.get_or_create(username='benchmark-%d' % i)
+            users.append(user)
+        if Recipe.objects.count() < 50:
+            Recipe.objects.bulk_create([
+                Recipe(
+                    title='Benchmark recipe %d' % i, description='Benchmark', instructions='Cook.',
+                    ingredients='flour\nwater', prep_time=5, cook_time=10, servings=2, price=Decimal('5.00'),
+                )
+                for i in range(50)
+            ])
+        return users, list(Recipe.objects.values_list('pk', flat=True))
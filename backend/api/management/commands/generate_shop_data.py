@@ -0,0 +1,364 @@
+import itertools
+import math
+import multiprocessing
+import random
+import time
+from bisect import bisect
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from api.caching import bump_version
+from cart.models import Cart, CartItem
+from categories.models import Category
+from payments.models import Order, OrderItem
+from recipes.ingredients import parse_ingredients
+from recipes.models import Recipe, RecipeIngredient
+from reviews.models import Review
+from reviews.ratings import rebuild_ratings
+
+# Rows of an entity per chunk. A chunk is generated from its own random
+# generator and written in one transaction, so the data doesn't depend on
+# --batch-size or --workers, and a chunk is either all there or not at all.
+CHUNK_SIZE = 10000
+# Cart and order items get ids from their parent's: parent index * MAX + n.
+MAX_CART_ITEMS = 10
+MAX_ORDER_ITEMS = 8
+DEFAULT_ID_OFFSET = 100000000
+PHASES = ['categories', 'users', 'recipes', 'reviews', 'carts', 'orders']
+
+CUISINES = (
+    'Filipino Thai Vietnamese Japanese Korean Chinese Indian Mexican Italian French Greek Spanish '
+    'Lebanese Moroccan Ethiopian Peruvian Brazilian American Caribbean Indonesian'
+).split()
+DISHES = 'adobo sinigang curry stew soup salad noodles rice bowl skewers pie tart roast stir-fry dumplings'.split()
+INGREDIENTS = (
+    'chicken pork beef shrimp tofu egg rice noodle garlic ginger onion shallot tomato potato carrot '
+    'cabbage spinach mushroom coconut milk lime lemon chili mango vinegar soy sauce fish sauce sugar '
+    'salt pepper butter flour cream cheese basil cilantro lemongrass peanut sesame oil'
+).split()
+UNITS = ['', 'g', 'kg', 'ml', 'cup', 'cups', 'tbsp', 'tsp', 'pc', 'cloves']
+FIRST_NAMES = 'Maria Jose Ana Juan Mei Hiro Priya Omar Lena Noah Ava Liam Sofia Ken Amara Diego'.split()
+# Stars, from 1 to 5: reviews lean positive like on real shops.
+RATING_WEIGHTS = [5, 7, 15, 33, 40]
+ORDER_STATUSES = ['paid', 'pending', 'payment_failed', 'canceled', 'refunded']
+ORDER_STATUS_WEIGHTS = [80, 10, 5, 3, 2]
+
+
+class Zipf:
+    """
+    Draws 0..n-1 with probability proportional to 1 / rank ** s. Ranks are
+    shuffled once, so the popular items are spread over the id range.
+    """
+
+    def __init__(self, n, s, rng):
+        self.cumulative = list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+        self.items = list(range(n))
+        rng.shuffle(self.items)
+
+    def __call__(self, rng):
+        index = bisect(self.cumulative, rng.random() * self.cumulative[-1])
+        return self.items[min(index, len(self.items) - 1)]
+
+
+def geometric(rng, mean, maximum):
+    """At least 1, on average about ``mean``, at most ``maximum``."""
+    if mean <= 1:
+        return 1
+    p = 1 / mean
+    return min(maximum, 1 + int(math.log(1 - rng.random()) / math.log(1 - p)))
+
+
+class Generator:
+    def __init__(self, options):
+        self.options = options
+        self.offset = options['id_offset']
+        self.seed = options['seed']
+        self.now = timezone.now()
+        self.password = None
+        self._zipf = {}
+
+    def count(self, phase):
+        # Carts are generated per user: some users get one.
+        return self.options['users'] if phase == 'carts' else self.options[phase]
+
+    def chunks(self, phase):
+        return math.ceil(self.count(phase) / CHUNK_SIZE)
+
+    def rng(self, *parts):
+        return random.Random(':'.join(str(part) for part in (self.seed,) + parts))
+
+    def zipf(self, name):
+        if name not in self._zipf:
+            n, s = {
+                'category': (self.options['categories'], 0.8),
+                'user': (self.options['users'], self.options['zipf'] * 0.8),
+                'recipe': (self.options['recipes'], self.options['zipf']),
+            }[name]
+            self._zipf[name] = Zipf(n, s, self.rng('popularity', name))
+        return self._zipf[name]
+
+    def id(self, index):
+        return self.offset + index
+
+    def span(self, phase, chunk):
+        start = chunk * CHUNK_SIZE
+        return range(start, min(start + CHUNK_SIZE, self.count(phase)))
+
+    def done(self, phase, chunk):
+        model = {
+            'categories': Category, 'users': User, 'recipes': Recipe, 'reviews': Review, 'carts': Cart, 'orders': Order,
+        }[phase]
+        span = self.span(phase, chunk)
+        return model.objects.filter(pk__range=(self.id(span.start), self.id(span.stop - 1))).exists()
+
+    def run(self, phase, chunk):
+        """Generate one chunk unless it's already there; returns the rows written."""
+        if self.done(phase, chunk):
+            return 0
+        # The rows are built first, so the (on SQLite, exclusive) write
+        # transaction only lasts for the INSERTs.
+        writes = getattr(self, 'generate_' + phase)(self.rng(phase, chunk), self.span(phase, chunk))
+        with transaction.atomic():
+            for model, rows in writes:
+                model.objects.bulk_create(rows, batch_size=self.options['batch_size'])
+        return sum(len(rows) for _, rows in writes)
+
+    def past(self, rng, days):
+        return self.now - timedelta(seconds=rng.randint(0, days * 24 * 60 * 60))
+
+    # generate_<phase>(rng, span) returns [(model, rows to insert), ...] for the
+    # indexes in span.
+
+    def generate_categories(self, rng, span):
+        return [(Category, [
+            Category(
+                id=self.id(i), name='%s %s' % (CUISINES[i % len(CUISINES)], i),
+                description='Generated category %d' % i,
+            )
+            for i in span
+        ])]
+
+    def generate_users(self, rng, span):
+        if self.password is None:
+            # Hashing is slow on purpose; everyone shares one hash.
+            self.password = make_password(self.options['password'])
+        prefix = self.options['prefix']
+        return [(User, [
+            User(
+                id=self.id(i), username='%s-%d' % (prefix, i), email='%s-%d@example.com' % (prefix, i),
+                first_name=rng.choice(FIRST_NAMES), password=self.password, date_joined=self.past(rng, 730),
+            )
+            for i in span
+        ])]
+
+    def generate_recipes(self, rng, span):
+        category = self.zipf('category')
+        recipes = []
+        for i in span:
+            cuisine, dish = rng.choice(CUISINES), rng.choice(DISHES)
+            main = rng.sample(INGREDIENTS, rng.randint(4, 12))
+            lines = [
+                ('%s %s %s' % (rng.choice([1, 2, 3, 4, 250, 500]), rng.choice(UNITS), name)).replace('  ', ' ')
+                for name in main
+            ]
+            recipes.append(Recipe(
+                id=self.id(i),
+                title='%s %s %s' % (cuisine, main[0].title(), dish),
+                description='A %s %s with %s and %s.' % (cuisine.lower(), dish, main[0], main[1]),
+                instructions='\n'.join('%d. Add the %s.' % (n, name) for n, name in enumerate(main, start=1)),
+                ingredients='\n'.join(lines),
+                prep_time=rng.randint(5, 60), cook_time=rng.choice([0, 10, 20, 30, 45, 60, 90, 180]),
+                servings=rng.randint(1, 8),
+                price=Decimal(min(20000, max(100, int(math.exp(rng.gauss(6.9, 0.6)))))) / 100,
+                category_id=self.id(category(rng)) if self.options['categories'] else None,
+            ))
+        # What recipes.ingredients.index_recipes would write; new recipes have
+        # no rows to replace.
+        ingredients = [
+            RecipeIngredient(
+                recipe_id=recipe.pk, position=position,
+                name=parsed.name, quantity=parsed.quantity, unit=parsed.unit, raw=parsed.raw,
+            )
+            for recipe in recipes
+            for position, parsed in enumerate(parse_ingredients(recipe.ingredients))
+        ]
+        return [(Recipe, recipes), (RecipeIngredient, ingredients)]
+
+    def generate_reviews(self, rng, span):
+        recipe, user = self.zipf('recipe'), self.zipf('user')
+        return [(Review, [
+            Review(
+                id=self.id(i), recipe_id=self.id(recipe(rng)), user_id=self.id(user(rng)),
+                rating=rng.choices(range(1, 6), RATING_WEIGHTS)[0], comment='Generated review %d' % i,
+            )
+            for i in span
+        ])]
+
+    def prices(self, items):
+        return dict(Recipe.objects.filter(pk__in={recipe_id for *_, recipe_id, _ in items}).values_list('pk', 'price'))
+
+    def pick_recipes(self, rng, count):
+        recipe = self.zipf('recipe')
+        picked = []
+        while len(picked) < min(count, self.options['recipes']):
+            recipe_id = self.id(recipe(rng))
+            if recipe_id not in picked:
+                picked.append(recipe_id)
+        return picked
+
+    def generate_carts(self, rng, span):
+        carts, items = [], []
+        for i in span:
+            if rng.random() >= self.options['cart_share']:
+                continue
+            carts.append(Cart(id=self.id(i), user_id=self.id(i)))
+            count = geometric(rng, self.options['cart_items'], MAX_CART_ITEMS)
+            for n, recipe_id in enumerate(self.pick_recipes(rng, count)):
+                items.append((self.id(i * MAX_CART_ITEMS + n), self.id(i), recipe_id, rng.randint(1, 3)))
+        prices = self.prices(items)
+        return [(Cart, carts), (CartItem, [
+            CartItem(id=id, cart_id=cart_id, recipe_id=recipe_id, quantity=quantity,
+                     price_at_time_of_addition=prices[recipe_id])
+            for id, cart_id, recipe_id, quantity in items
+        ])]
+
+    def generate_orders(self, rng, span):
+        user = self.zipf('user')
+        orders, items = [], []
+        for i in span:
+            orders.append(Order(
+                id=self.id(i), user_id=self.id(user(rng)), total_amount=Decimal('0.00'),
+                status=rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            ))
+            count = geometric(rng, self.options['order_items'], MAX_ORDER_ITEMS)
+            for n, recipe_id in enumerate(self.pick_recipes(rng, count)):
+                items.append((self.id(i * MAX_ORDER_ITEMS + n), self.id(i), recipe_id, rng.randint(1, 4)))
+        prices = self.prices(items)
+        totals = dict.fromkeys((order.pk for order in orders), Decimal('0.00'))
+        for _, order_id, recipe_id, quantity in items:
+            totals[order_id] += prices[recipe_id] * quantity
+        for order in orders:
+            order.total_amount = totals[order.pk]
+        return [(Order, orders), (OrderItem, [
+            OrderItem(id=id, order_id=order_id, recipe_id=recipe_id, quantity=quantity, price=prices[recipe_id])
+            for id, order_id, recipe_id, quantity in items
+        ])]
+
+
+# Worker processes build their own Generator (and its popularity tables) once.
+_generator = None
+
+
+def _init_worker(options):
+    global _generator
+    _generator = Generator(options)
+
+
+def _run_chunk(task):
+    phase, chunk = task
+    try:
+        return _generator.run(phase, chunk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large synthetic shop: categories, users, recipes (with parsed ingredients), reviews, carts "
+        "and orders, with Zipf-distributed popularity for reviews, cart adds and order lines. Rows are written "
+        "with bulk_create in transactions of one chunk each, optionally from several processes. The same "
+        "--seed gives the same data, and rerunning the command with the same options resumes an interrupted run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--reviews', type=int, default=1000000)
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--cart-share', type=float, default=0.3, help='Share of users with a cart (default: 0.3).')
+        parser.add_argument('--cart-items', type=float, default=3, help='Average items per cart (default: 3).')
+        parser.add_argument('--order-items', type=float, default=2.5, help='Average lines per order (default: 2.5).')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of recipe popularity (default: 1.1).')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT (default: 5000).')
+        parser.add_argument('--workers', type=int, default=1, help='Processes generating chunks (default: 1).')
+        parser.add_argument(
+            '--id-offset', type=int, default=DEFAULT_ID_OFFSET,
+            help='Generated rows get ids from here up, which is how a rerun finds the chunks already written '
+                 '(default: %(default)s). Use another offset for a second data set.',
+        )
+        parser.add_argument('--prefix', default='shopper', help='Username prefix (default: shopper).')
+        parser.add_argument('--password', default='shop-data-password', help='Password of every generated user.')
+        parser.add_argument('--only', choices=PHASES, action='append', help='Only generate these.')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['reviews'] or options['orders'] or options['cart_share']:
+            if not options['recipes'] or not options['users']:
+                raise CommandError('Reviews, carts and orders need --recipes and --users.')
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            self.log(
+                "SQLite takes one writer at a time: the workers share the generation work, the inserts still queue."
+            )
+
+        generator = Generator(options)
+        total = 0
+        for phase in options['only'] or PHASES:
+            chunks = generator.chunks(phase)
+            if not chunks:
+                continue
+            started = time.monotonic()
+            rows = skipped = 0
+            for done, written in enumerate(self.run_phase(generator, phase, chunks, options['workers']), start=1):
+                rows += written
+                skipped += not written
+                if self.verbosity > 1:
+                    self.log(f"{phase}: {done}/{chunks} chunks")
+            elapsed = time.monotonic() - started
+            total += rows
+            self.log(
+                f"{phase}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 0.001):.0f} rows/s), "
+                f"{chunks - skipped}/{chunks} chunks written, {skipped} already there"
+            )
+
+        if 'reviews' in (options['only'] or PHASES):
+            self.log("Rebuilding recipe ratings...")
+            rebuild_ratings()
+        self.reset_sequences()
+        # bulk_create sends no signals, so drop cached catalogue pages here.
+        bump_version('recipes')
+        bump_version('categories')
+        self.log(self.style.SUCCESS(f"Done: {total} rows."))
+
+    def log(self, message):
+        if self.verbosity:
+            self.stdout.write(message)
+
+    def run_phase(self, generator, phase, chunks, workers):
+        if workers <= 1:
+            for chunk in range(chunks):
+                yield generator.run(phase, chunk)
+            return
+        # Forked, so the workers see the same settings (and database) as we do.
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(
+            workers, initializer=_init_worker, initargs=(generator.options,),
+        ) as pool:
+            yield from pool.imap_unordered(_run_chunk, [(phase, chunk) for chunk in range(chunks)])
+
+    def reset_sequences(self):
+        # Explicit ids don't move PostgreSQL's sequences; SQLite and MySQL
+        # continue after the highest id on their own.
+        if connection.vendor != 'postgresql':
+            return
+        models = [Category, User, Recipe, Review, Cart, CartItem, Order, OrderItem]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(self.style, models):
+                cursor.execute(sql)
@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Stand-in for replication when developing with SQLite: copies the primary database "
+        "into every replica in DATABASE_REPLICAS with SQLite's online backup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep syncing every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        primary = connections.settings['default']
+        replicas = [connections.settings[alias] for alias in settings.DATABASE_REPLICAS]
+        if not replicas:
+            raise CommandError('No replicas configured; set SQLITE_REPLICAS.')
+        if any('sqlite' not in config['ENGINE'] for config in [primary] + replicas):
+            raise CommandError('Only SQLite databases can be synced this way.')
+
+        while True:
+            started = time.monotonic()
+            source = sqlite3.connect(primary['NAME'])
+            try:
+                for replica in replicas:
+                    target = sqlite3.connect(replica['NAME'], timeout=20)
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            if not options['loop']:
+                break
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
+
+        self.stdout.write(self.style.SUCCESS(f"Synced {len(replicas)} replicas."))
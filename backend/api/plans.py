@@ -0,0 +1,277 @@
+# backend/api/plans.py
+"""
+Read plans: the big read-only lists (recipes, reviews, categories, the cart)
+serialized straight from .values() rows instead of model instances.
+
+For every row, a ModelSerializer builds a model instance, then walks
+get_attribute() and to_representation() on each field, nested serializers
+included. On a long page of plain columns that's most of the request's CPU.
+A ReadPlan is compiled once per serializer class (plan_for()) into the
+values() lookups the serializer reads and, per output key, how to get the
+value out of a row:
+
+* plain columns are used as the database returns them when DRF would only
+  str() or int() them anyway;
+* other fields (decimals, datetimes, choices) go through the same DRF field's
+  to_representation(), so the output is the serializer's, byte for byte;
+* files become their storage URL, absolute when there's a request;
+* a nested serializer reads the related columns (category__name) and is null
+  when the foreign key is;
+* a nested many=True serializer (cart items) is one more values() query for
+  all the rows at once;
+* anything else (a SerializerMethodField, a property) has to be declared in
+  the serializer's Meta.plan_fields as a PlanField.
+
+PlannedListMixin puts a plan behind a ListAPIView. The data is plain dicts
+and lists, which is also what api.renderers.FastJSONRenderer encodes fastest.
+"""
+from functools import lru_cache
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import ISO_8601, fields, relations, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# to_representation() methods that give back a database value unchanged.
+RAW_REPRESENTATIONS = (fields.CharField.to_representation, fields.ReadOnlyField.to_representation)
+
+
+class PlanField:
+    """
+    Meta.plan_fields entry for a field that isn't a column: ``function(context,
+    *values)`` gets the values of ``columns`` and returns what the field would
+    read from the instance. Without a function, the one column (an annotation,
+    say) is that value. The field's to_representation() still applies, except
+    for a SerializerMethodField, where the function returns the final value.
+    """
+
+    def __init__(self, columns, function=None):
+        self.columns = (columns,) if isinstance(columns, str) else tuple(columns)
+        self.function = function
+
+
+def model_field(model, lookup):
+    """The field a values() lookup ends on, or None if it isn't a single-valued column."""
+    field = None
+    for name in lookup.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.one_to_many or field.many_to_many:
+            return None
+        model = field.related_model
+    return field
+
+
+def converter(field):
+    # None when the value goes out as it comes from the database.
+    method = type(field).to_representation
+    if method in RAW_REPRESENTATIONS:
+        return None
+    if method is relations.PrimaryKeyRelatedField.to_representation and field.pk_field is None:
+        return None  # values() already gives the key
+    if method is fields.IntegerField.to_representation:
+        return int
+    if method is fields.FloatField.to_representation:
+        return float
+    return field.to_representation
+
+
+def column_getter(column, convert):
+    if convert is None:
+        return itemgetter(column)
+
+    def get(row):
+        value = row[column]
+        return None if value is None else convert(value)
+    return get
+
+
+class ReadPlan:
+    """
+    The values() columns a serializer reads and how to turn a row of them into
+    its representation. Get one from plan_for().
+    """
+
+    def __init__(self, serializer_class, prefix=''):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        # (key, factory): factory(context, rows) returns the key's row -> value getter.
+        self.steps = []
+        plan_fields = getattr(serializer_class.Meta, 'plan_fields', {})
+
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            key = field.field_name
+            if key in plan_fields:
+                self.steps.append((key, self.computed(field, plan_fields[key], prefix)))
+            elif isinstance(field, serializers.ListSerializer):
+                if prefix:
+                    raise ImproperlyConfigured(
+                        '%s.%s: many=True serializers are only planned at the top level.'
+                        % (serializer_class.__name__, key)
+                    )
+                self.steps.append((key, self.children(field)))
+            elif isinstance(field, serializers.BaseSerializer):
+                self.steps.append((key, self.nested(field, prefix + field.source + '__')))
+            else:
+                self.steps.append((key, self.column(field, field.source.replace('.', '__'), prefix)))
+
+    def add_column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def column(self, field, lookup, prefix):
+        target = model_field(self.model, lookup)
+        if target is None or isinstance(field, serializers.SerializerMethodField):
+            raise ImproperlyConfigured(
+                "%s.%s doesn't read a column; declare it in Meta.plan_fields."
+                % (self.serializer_class.__name__, field.field_name)
+            )
+        column = self.add_column(prefix + lookup)
+
+        if isinstance(field, fields.FileField):
+            use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+            def file_url(context, rows):
+                # As FileField.to_representation() on the FieldFile.
+                request = context.get('request')
+
+                def get(row):
+                    name = row[column]
+                    if not name:
+                        return None
+                    if not use_url:
+                        return name
+                    url = target.storage.url(name)
+                    return request.build_absolute_uri(url) if request is not None else url
+                return get
+            return file_url
+
+        if type(field).to_representation is fields.DateTimeField.to_representation:
+            return self.datetimes(field, column)
+
+        get = column_getter(column, converter(field))
+        return lambda context, rows: get
+
+    def datetimes(self, field, column):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+
+        def factory(context, rows):
+            # DateTimeField.to_representation() looks the current timezone up
+            # for every value; once per call is enough.
+            tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+            if tz is None or output_format is None or output_format.lower() != ISO_8601:
+                return column_getter(column, field.to_representation)
+
+            def get(row):
+                value = row[column]
+                if value is None or value.tzinfo is None:
+                    return field.to_representation(value)
+                value = value.astimezone(tz).isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return get
+        return factory
+
+    def computed(self, field, plan_field, prefix):
+        columns = [self.add_column(prefix + column) for column in plan_field.columns]
+        function = plan_field.function
+        final = isinstance(field, serializers.SerializerMethodField)
+        convert = None if final else converter(field)
+
+        def factory(context, rows):
+            def get(row):
+                if function is None:
+                    value = row[columns[0]]
+                else:
+                    value = function(context, *[row[column] for column in columns])
+                if final or value is None or convert is None:
+                    return value
+                return convert(value)
+            return get
+        return factory
+
+    def nested(self, field, prefix):
+        plan = ReadPlan(type(field), prefix)
+        for column in plan.columns:
+            self.add_column(column)
+        # The foreign key itself: a null one serializes as null.
+        key_column = self.add_column(prefix[:-2])
+
+        def factory(context, rows):
+            represent = plan.bind(context, rows)
+            return lambda row: None if row[key_column] is None else represent(row)
+        return factory
+
+    def children(self, field):
+        relation = self.model._meta.get_field(field.source)
+        plan = plan_for(type(field.child))
+        parent_key = self.add_column(self.model._meta.pk.name)
+        foreign_key = relation.field.attname
+
+        def factory(context, rows):
+            grouped = {}
+            ids = [row[parent_key] for row in rows]
+            if ids:
+                children = relation.related_model._default_manager.filter(**{foreign_key + '__in': ids})
+                children = list(plan.values(children, foreign_key))
+                represent = plan.bind(context, children)
+                for child in children:
+                    grouped.setdefault(child[foreign_key], []).append(represent(child))
+            return lambda row: grouped.get(row[parent_key], [])
+        return factory
+
+    def values(self, queryset, *extra):
+        """The queryset as values() rows with every column the plan reads."""
+        # Prefetches are for instances; the plan reads related rows itself.
+        return queryset.prefetch_related(None).values(*self.columns, *extra)
+
+    def bind(self, context, rows):
+        getters = [(key, factory(context, rows)) for key, factory in self.steps]
+
+        def represent(row):
+            return {key: get(row) for key, get in getters}
+        return represent
+
+    def represent(self, rows, context=None):
+        """What serializer_class(many=True).data gives for these values() rows."""
+        rows = list(rows)
+        represent = self.bind(context if context is not None else {}, rows)
+        return [represent(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def plan_for(serializer_class):
+    return ReadPlan(serializer_class)
+
+
+class PlannedListMixin:
+    """
+    Add before a DRF ListAPIView whose serializer plans (see ReadPlan):
+
+        class CategoryViewSet(PlannedListMixin, generics.ListAPIView):
+            serializer_class = CategorySerializer
+
+    GET lists are read with values() and serialized by the plan, paginated or
+    not. Keyset pagination works on the rows as they are, since its ordering
+    fields are serialized columns.
+    """
+
+    def get_read_plan(self):
+        return plan_for(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_read_plan()
+        rows = plan.values(self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.represent(page, context))
+        return Response(plan.represent(rows, context))
@@ -0,0 +1,95 @@
+# backend/api/signals.py
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from recipes.models import Recipe
+from reviews.models import Review
+from .authentication import forget_user
+from .caching import bump_version
+
+
+def invalidate(*names):
+    # Bump now so this process stops serving old pages, and again after commit
+    # so a page cached from another connection before the commit is dropped too.
+    for name in names:
+        bump_version(name)
+    transaction.on_commit(lambda: _bump_after_commit(names))
+
+
+def _bump_after_commit(names):
+    for name in names:
+        bump_version(name)
+    if settings.DATABASE_REPLICAS:
+        # Replicas may serve the old rows until they catch up; drop whatever
+        # got cached from them meanwhile once they should have.
+        bump_later(names, settings.REPLICA_PIN_SECONDS)
+
+
+# name -> when its delayed bump is due (time.monotonic()); one timer per
+# process flushes them, however many saves asked.
+_delayed = {}
+_delayed_lock = threading.Lock()
+_delayed_timer = None
+
+
+def bump_later(names, delay):
+    """Bump the names' versions once ``delay`` seconds have passed."""
+    due = time.monotonic() + delay
+    with _delayed_lock:
+        # A later save moves the bump later: it has to come after this save's
+        # rows reach the replicas, and the bumps on commit covered the rest.
+        for name in names:
+            _delayed[name] = due
+        if _delayed_timer is None:
+            _start_timer(delay)
+
+
+def _start_timer(delay):
+    global _delayed_timer
+    _delayed_timer = threading.Timer(delay, _flush_delayed)
+    _delayed_timer.daemon = True
+    _delayed_timer.start()
+
+
+def _flush_delayed():
+    global _delayed_timer
+    now = time.monotonic()
+    with _delayed_lock:
+        names = [name for name, due in _delayed.items() if due <= now]
+        for name in names:
+            del _delayed[name]
+        _delayed_timer = None
+        if _delayed:
+            _start_timer(min(_delayed.values()) - now)
+    for name in names:
+        bump_version(name)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate('recipes')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Recipes embed their category.
+    invalidate('categories', 'recipes')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, **kwargs):
+    # Recipes embed their rating aggregates.
+    invalidate('reviews:%s' % instance.recipe_id, 'recipes')
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Authentication caches users per process (api.authentication).
+    forget_user(instance.pk)
@@ -0,0 +1,90 @@
+# backend/api/streaming.py
+"""
+Streamed exports: every row of a list, written out while it's read.
+
+A list view builds its whole response in memory, so a worker's memory grows
+with the number of rows. StreamingListMixin reads the rows with
+.iterator(chunk_size) through the serializer's read plan (api.plans), and
+hands each chunk to the client as soon as it is encoded, so memory stays at
+one chunk whatever the row count. The body is either
+
+* a JSON array, byte for byte the list the non-streamed view would render, or
+* NDJSON, one object per line, with ``?format=ndjson`` or
+  ``Accept: application/x-ndjson``.
+
+Under ASGI the chunks are produced on Django's sync thread one at a time, so
+the stream stays lazy there too; Django would otherwise read a synchronous
+iterator to the end before sending anything.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from .plans import PlannedListMixin
+from .renderers import FastJSONRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """One JSON document per line; lists render one line per item."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, (list, tuple)) else [data]
+        return b''.join(FastJSONRenderer().render(item) + b'\n' for item in items)
+
+
+def stream_rows(plan, rows, context, chunk_size=1000, ndjson=False):
+    """Yields the plan's representation of a values() queryset, a chunk of rows at a time."""
+    renderer = NDJSONRenderer() if ndjson else FastJSONRenderer()
+    rows = rows.iterator(chunk_size=chunk_size)
+    separator = b'' if ndjson else b'['
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        body = renderer.render(plan.represent(chunk, context))
+        # Every chunk renders as a whole array: keep what's between the brackets.
+        yield body if ndjson else separator + body[1:-1]
+        separator = b'' if ndjson else b','
+    if not ndjson:
+        yield b'[]' if separator == b'[' else b']'
+
+
+async def iterate_async(chunks):
+    # Each step runs on the thread the view's queries ran on.
+    step = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await step(chunks, None)) is not None:
+        yield chunk
+
+
+class StreamingListMixin(PlannedListMixin):
+    """
+    Add before a DRF ListAPIView whose serializer plans:
+
+        class OrderExportView(StreamingListMixin, generics.ListAPIView):
+            serializer_class = OrderSerializer
+
+    GET streams every row of the filtered queryset, unpaginated, as a JSON
+    array or NDJSON. Errors (401, 400 from a filter) are ordinary responses.
+    """
+    renderer_classes = [FastJSONRenderer, NDJSONRenderer]
+    pagination_class = None
+    stream_chunk_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_read_plan()
+        rows = plan.values(self.filter_queryset(self.get_queryset()))
+        renderer = request.accepted_renderer
+        chunks = stream_rows(
+            plan, rows, self.get_serializer_context(), self.stream_chunk_size, isinstance(renderer, NDJSONRenderer),
+        )
+        if isinstance(request._request, ASGIRequest):
+            chunks = iterate_async(chunks)
+        return StreamingHttpResponse(chunks, content_type=renderer.media_type)
@@ -0,0 +1,43 @@
+# backend/api/testing.py
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    """
+    TestCase mixin for catching N+1 queries.
+
+        self.assertQueriesDoNotScale(
+            lambda: self.client.get(url),
+            lambda n: make_reviews(recipe, n),
+        )
+
+    ``add_rows(n)`` is called with each size in ``sizes`` and should add ``n``
+    more rows to whatever the endpoint returns; ``request()`` is then run and its
+    queries counted. The test fails if the count changes between sizes, i.e. if
+    the endpoint issues queries per row instead of per request.
+    """
+
+    def assertQueriesDoNotScale(self, request, add_rows, sizes=(1, 5)):
+        counts = []
+        for size in sizes:
+            add_rows(size)
+            with CaptureQueriesContext(connection) as context:
+                response = request()
+            if hasattr(response, 'status_code'):
+                self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+            counts.append((size, context))
+
+        baseline = len(counts[0][1])
+        for size, context in counts[1:]:
+            if len(context) != baseline:
+                queries = '\n'.join(
+                    '%d. %s' % (i, query['sql'])
+                    for i, query in enumerate(context.captured_queries, start=1)
+                )
+                self.fail(
+                    'Query count grows with the number of rows: %s\nQueries for the largest run:\n%s' % (
+                        ', '.join('+%d rows: %d queries' % (s, len(c)) for s, c in counts),
+                        queries,
+                    )
+                )
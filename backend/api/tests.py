@@ -0,0 +1,364 @@
+import re
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from cart.models import Cart, CartItem
+from categories.models import Category
+from recipes.models import Recipe, RecipeIngredient
+from recipes.serializers import RecipeSerializer
+from recipes.tests import make_recipe
+from reviews.models import Review
+from reviews.serializers import ReviewSerializer
+from . import signals
+from .authentication import get_cached_user
+from .caching import get_versions
+from .instrumentation import PerformanceMiddleware, registry
+from .management.commands import benchmark_api
+from .plans import plan_for
+from .renderers import FastJSONRenderer
+from .serializers import CategorySerializer
+
+
+class JWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'secret-pass')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'cook', 'password': 'secret-pass'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sum('"auth_user"' in query['sql'] for query in queries.captured_queries)
+
+    def test_users_are_loaded_once_and_forgotten_on_save(self):
+        self.assertEqual(self.user_queries(reverse('user-cart')), 1)
+        self.assertEqual(self.user_queries(reverse('user-cart')), 0)
+        self.user.first_name = 'Lola'
+        self.user.save()
+        self.assertEqual(self.user_queries(reverse('user-cart')), 1)
+
+    def test_login_and_register_tokens_carry_the_claims(self):
+        response = self.client.post(reverse('login'), {'username': 'cook', 'password': 'secret-pass'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        self.assertEqual(self.user_queries(reverse('recipe-list')), 0)
+
+        response = self.client.post(reverse('register'), {
+            'username': 'baker', 'email': 'baker@example.com', 'first_name': 'Bea', 'last_name': 'Baker',
+            'password': 'Secret-pass-42', 'password2': 'Secret-pass-42',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        self.assertEqual(self.user_queries(reverse('recipe-list')), 0)
+
+    def test_requests_get_their_own_cached_user(self):
+        self.user_queries(reverse('user-cart'))  # caches the user and creates the cart
+        first, second = get_cached_user(self.user.pk), get_cached_user(self.user.pk)
+        self.assertIsNot(first._state, second._state)
+
+        # Reading the related cart caches it on that request's user only.
+        self.assertEqual(first.cart.user_id, self.user.pk)
+        with self.assertNumQueries(1):
+            second.cart
+        first.cart = None
+        self.assertIsNotNone(second.cart)
+        second.first_name = 'Lola'
+        self.assertEqual(first.first_name, '')
+        self.assertEqual(get_cached_user(self.user.pk)._state.fields_cache, {})
+
+    def test_permission_checks_use_the_token_claims(self):
+        # IsAuthenticated only: the user row is never needed.
+        self.user.save()
+        self.assertEqual(self.user_queries(reverse('recipe-list')), 0)
+
+        self.assertEqual(self.client.get(reverse('response-cache-stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'cook', 'password': 'secret-pass'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        self.assertEqual(self.client.get(reverse('response-cache-stats')).status_code, 200)
+
+
+class DelayedInvalidationTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=0.1)
+    def test_delayed_bumps_share_one_timer(self):
+        threads = threading.active_count()
+        for _ in range(50):
+            signals._bump_after_commit(('recipes',))
+        self.assertEqual(threading.active_count(), threads + 1)
+        version = get_versions(['recipes'])[0]
+        for _ in range(100):
+            if get_versions(['recipes'])[0] != version:
+                break
+            threading.Event().wait(0.02)
+        threading.Event().wait(0.2)
+        # One bump for all fifty saves.
+        self.assertEqual(get_versions(['recipes'])[0], version + 1)
+
+
+class AsyncReadPathTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Soups')
+        self.recipes = [make_recipe(title='Recipe %d' % i, category=self.category, price=Decimal(i)) for i in range(3)]
+        user = User.objects.create_user('taster')
+        Review.objects.create(recipe=self.recipes[0], user=user, rating=4, comment='Good')
+
+    async def test_matches_the_sync_endpoints(self):
+        pairs = [
+            ('recipe-list', 'async-recipe-list', [], {'ordering': 'price', 'category': self.category.pk}),
+            ('recipe-detail', 'async-recipe-detail', [self.recipes[0].pk], {}),
+            ('recipe-reviews', 'async-recipe-reviews', [self.recipes[0].pk], {}),
+        ]
+        for sync_name, async_name, args, params in pairs:
+            with self.subTest(async_name):
+                expected = (await self.async_client.get(reverse(sync_name, args=args), params)).json()
+                response = await self.async_client.get(reverse(async_name, args=args), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                data = response.json()
+                if 'results' in expected:
+                    # The next/previous links point at the async URL.
+                    data, expected = data['results'], expected['results']
+                self.assertEqual(data, expected)
+
+    async def test_response_cache_and_conditional_get(self):
+        url = reverse('async-recipe-detail', args=[self.recipes[0].pk])
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual((await self.async_client.get(url, headers={'If-None-Match': etag})).status_code, 304)
+
+    async def test_missing_recipe_is_a_404(self):
+        response = await self.async_client.get(reverse('async-recipe-detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Not found.'})
+
+
+class AsyncCartTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'secret-pass')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'cook', 'password': 'secret-pass'})
+        self.auth = {'headers': {'Authorization': 'Bearer ' + response.data['access']}}
+
+    async def test_cart_matches_the_sync_view_without_loading_the_user(self):
+        recipe = await Recipe.objects.acreate(
+            title='Adobo', description='-', instructions='-', ingredients='chicken',
+            prep_time=1, cook_time=1, servings=1, price=Decimal('4.50'),
+        )
+        # Created on the first read, like CartView does.
+        response = await self.async_client.get(reverse('async-user-cart'), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'], [])
+
+        cart = await Cart.objects.aget(user_id=self.user.pk)
+        await CartItem.objects.acreate(cart=cart, recipe=recipe, quantity=2, price_at_time_of_addition=recipe.price)
+        expected = (await self.async_client.get(reverse('user-cart'), **self.auth)).json()
+        response = await self.async_client.get(reverse('async-user-cart'), **self.auth)
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(response.json()['total_price'], '9.00')
+        self.assertIn('private', response['Cache-Control'])
+
+    async def test_requires_a_token(self):
+        response = await self.async_client.get(reverse('async-user-cart'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    @override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway')
+    async def test_payment_intent(self):
+        url = reverse('async-create-payment-intent')
+        response = await self.async_client.post(url, {'amount': 1250}, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['clientSecret'].endswith('_secret_1250'))
+        response = await self.async_client.post(url, {}, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway')
+    def test_token_posts_pass_csrf_checks(self):
+        client = Client(enforce_csrf_checks=True)
+        for name in ('create-payment-intent', 'async-create-payment-intent'):
+            response = client.post(reverse(name), {'amount': 1250}, content_type='application/json', **self.auth)
+            self.assertEqual(response.status_code, 200, name)
+
+    async def test_cart_etag_changes_when_a_recipe_is_deleted(self):
+        cart = await Cart.objects.acreate(user_id=self.user.pk)
+        for title in ('Adobo', 'Pancit'):
+            recipe = await Recipe.objects.acreate(
+                title=title, description='-', instructions='-', ingredients='-',
+                prep_time=1, cook_time=1, servings=1, price=Decimal('4.50'),
+            )
+            await CartItem.objects.acreate(cart=cart, recipe=recipe, quantity=1, price_at_time_of_addition=recipe.price)
+        etag = (await self.async_client.get(reverse('async-user-cart'), **self.auth))['ETag']
+        await Recipe.objects.filter(title='Adobo').adelete()
+        response = await self.async_client.get(
+            reverse('async-user-cart'), headers=dict(self.auth['headers'], **{'If-None-Match': etag}),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['items']), 1)
+
+
+class PerformanceInstrumentationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.recipe = make_recipe()
+
+    def middleware(self, get_response):
+        request = RequestFactory().get('/api/recipes/')
+        request.resolver_match = resolve('/api/recipes/')
+        return PerformanceMiddleware(get_response)(request)
+
+    def test_counts_queries_and_serves_prometheus_metrics(self):
+        self.client.get(reverse('recipe-list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+
+        staff = User.objects.create_user('ops', is_staff=True)
+        self.client.force_authenticate(staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_requests_total{view="recipe-list"} 1', body)
+        self.assertIn('http_request_duration_seconds{view="recipe-list",quantile="0.99"}', body)
+        self.assertIn('http_responses_total{view="recipe-list",status="200"} 1', body)
+        queries = re.search(r'http_request_db_queries_total\{view="recipe-list"\} (\d+)', body)
+        self.assertGreater(int(queries.group(1)), 0)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_scraper_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_repeated_queries_are_reported(self):
+        def get_response(request):
+            for _ in range(5):
+                Recipe.objects.get(pk=self.recipe.pk)
+            return HttpResponse('ok')
+
+        with self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            self.middleware(get_response)
+        self.assertIn('Possible N+1 in recipe-list: 5 x SELECT', logs.output[0])
+        self.assertEqual(registry.snapshot()['recipe-list'][1]['n_plus_one'], 1)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            self.middleware(lambda request: HttpResponse('ok'))
+        self.assertIn('Slow request GET /api/recipes/ (recipe-list)', logs.output[0])
+
+
+class ReadPlanTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Filipino', description='Ulam')
+        self.adobo = make_recipe(
+            category=category, rating_avg=4.5, rating_count=2, rating_4=1, rating_5=1,
+            image='recipe_images/adobo.jpg',
+            image_derivatives={'variants': {'webp': {'320': 'recipe_images/derivatives/a-320.webp'}}},
+        )
+        self.pancit = make_recipe(title='Pancit \u2028 canton', price=Decimal('12.50'), image_status='failed')
+        user = User.objects.create_user('taster')
+        Review.objects.create(recipe=self.adobo, user=user, rating=5, comment='Masarap!')
+
+    def test_plans_match_the_serializers(self):
+        context = {'request': RequestFactory().get('/api/recipes/')}
+        for serializer_class, queryset in [
+            (RecipeSerializer, Recipe.objects.with_related().order_by('id')),
+            (ReviewSerializer, Review.objects.with_related().order_by('id')),
+            (CategorySerializer, Category.objects.order_by('id')),
+        ]:
+            with self.subTest(serializer_class.__name__):
+                plan = plan_for(serializer_class)
+                expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+                planned = FastJSONRenderer().render(plan.represent(plan.values(queryset), context))
+                self.assertEqual(planned, expected)
+
+    def test_list_pages_are_read_by_the_plan(self):
+        response = self.client.get(reverse('recipe-list'), {'page_size': 1})
+        expected = RecipeSerializer(self.pancit, context={'request': response.wsgi_request}).data
+        self.assertEqual(response.json()['results'], [dict(expected)])
+        following = self.client.get(response.json()['next'])
+        self.assertEqual([item['id'] for item in following.json()['results']], [self.adobo.pk])
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'floats': [0.0, 4.5, 1e-07, 1e+16],
+            'text': 'line\u2028separator, caf\u00e9',
+            'lazy': gettext_lazy('Not found.'),
+            'when': timezone.now(),
+            'price': Decimal('1.50'),
+            'keys': {1: 'one'},
+            'big': 2 ** 70,
+        }
+        for item in (data, {'plain': [1, 2.5, 'x', None, True]}, []):
+            self.assertEqual(FastJSONRenderer().render(item), JSONRenderer().render(item))
+        indented = 'application/json; indent=2'
+        self.assertEqual(FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+
+class QueryPlanAuditTests(APITestCase):
+    def test_hot_paths_use_indexes(self):
+        out = StringIO()
+        call_command('audit_query_plans', fail_on_scan=True, stdout=out)
+        self.assertIn('No full table scans.', out.getvalue())
+
+
+class ShopDataGeneratorTests(APITestCase):
+    options = dict(categories=3, users=6, recipes=20, reviews=60, orders=10, workers=1, seed=7)
+
+    def generate(self):
+        out = StringIO()
+        call_command('generate_shop_data', stdout=out, **self.options)
+        return out.getvalue()
+
+    def test_generates_a_consistent_catalogue(self):
+        self.generate()
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Recipe.objects.count(), 20)
+        self.assertEqual(Review.objects.count(), 60)
+        self.assertTrue(RecipeIngredient.objects.exists())
+        recipe = Recipe.objects.filter(rating_count__gt=0).first()
+        self.assertEqual(recipe.rating_count, recipe.reviews.count())
+
+    def test_rerun_resumes_without_duplicates(self):
+        self.generate()
+        reviews = list(Review.objects.order_by('pk').values_list('pk', 'recipe_id', 'rating'))
+        output = self.generate()
+        self.assertIn('Done: 0 rows.', output)
+        self.assertEqual(list(Review.objects.order_by('pk').values_list('pk', 'recipe_id', 'rating')), reviews)
+
+
+class FailingBenchmark(benchmark_api.Command):
+    def run_wsgi(self, name, ids, users, run, options):
+        for _ in range(options['requests']):
+            run.add(0.01, False)
+
+
+class BenchmarkApiTests(SimpleTestCase):
+    def test_percentiles_cover_successful_requests(self):
+        run = benchmark_api.Run()
+        run.add(0.5, False)
+        run.add(0.02, True)
+        self.assertEqual((run.requests, run.errors, run.latencies), (2, 1, [0.02]))
+
+    def test_a_scenario_without_successes_reports_no_percentiles(self):
+        command = FailingBenchmark()
+        result = command.run('wsgi', 'browse', {}, [], {'requests': 3})
+        self.assertEqual((result['requests'], result['errors'], result['p95_ms']), (3, 3, None))
+        self.assertIn('p50 n/a, p95 n/a, p99 n/a', command.summary('wsgi', 'browse', result))
@@ -3,6 +3,10 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 # Assuming you have a views.py in your 'users' app where RegisterView is defined
 from users.views import RegisterView # <-- IMPORT YOUR REGISTER VIEW HERE
+from .asyncviews import (
+    AsyncCartView, AsyncCreatePaymentIntentView, AsyncRecipeDetailView, AsyncRecipeListView, AsyncReviewListView,
+)
+from .views import CategoryViewSet, MetricsView, ResponseCacheStatsView
 
 urlpatterns = [
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -13,8 +17,19 @@ urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
 
     path('recipes/', include('recipes.urls')),
+    path('categories/', CategoryViewSet.as_view(), name='category-list'),
     path('reviews/', include('reviews.urls')),
     path('cart/', include('cart.urls')),
+    path('payments/', include('payments.urls')),
+    path('cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    # Async (ASGI) versions of the hot read paths, see api.asyncviews.
+    path('async/recipes/', AsyncRecipeListView.as_view(), name='async-recipe-list'),
+    path('async/recipes/<int:pk>/', AsyncRecipeDetailView.as_view(), name='async-recipe-detail'),
+    path('async/recipes/<int:recipe_id>/reviews/', AsyncReviewListView.as_view(), name='async-recipe-reviews'),
+    path('async/cart/', AsyncCartView.as_view(), name='async-user-cart'),
+    path('async/payments/create-payment-intent/', AsyncCreatePaymentIntentView.as_view(),
+         name='async-create-payment-intent'),
     # If your 'users.urls' contains OTHER user-related API endpoints that are NOT auth,
     # you might still keep 'path('users/', include('users.urls'))'.
     # But for auth-related paths, it's often clearer to define them here in api/urls.py.
@@ -1,14 +1,19 @@
-from rest_framework import viewsets, generics, permissions, status
-from rest_framework.decorators import action
+from rest_framework import viewsets, generics, permissions
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from recipes.models import Recipe
 from reviews.models import Review
-from cart.models import Cart, CartItem
 from categories.models import Category
+from recipes.filters import RecipeFilterBackend, RecipeOrderingFilter
+from recipes.pagination import RecipeCursorPagination
+from django.db.models import Count, Max
+from .authentication import CachedJWTAuthentication
+from .caching import CachedResponseMixin, cache_stats
+from .instrumentation import IsMetricsScraper, MetricsTokenAuthentication, metrics_response
+from .conditional import ConditionalGetMixin
+from .plans import PlannedListMixin
 from .serializers import (
-    UserSerializer, RecipeSerializer, ReviewSerializer,
-    CartSerializer, CategorySerializer
+    UserSerializer, RecipeSerializer, ReviewSerializer, CategorySerializer
 )
 
 class UserViewSet(generics.ListAPIView):
@@ -19,71 +24,46 @@ class UserViewSet(generics.ListAPIView):
     def get_queryset(self):
         return User.objects.filter(id=self.request.user.id)
 
-class CategoryViewSet(generics.ListAPIView):
+class CategoryViewSet(CachedResponseMixin, ConditionalGetMixin, PlannedListMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_versions = ('categories',)
+
+    def get_validator_aggregate(self):
+        return Category.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+
+class ResponseCacheStatsView(generics.GenericAPIView):
+    # GET /api/cache/stats/ -- hit/miss counters for api.caching
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats())
+
+class MetricsView(generics.GenericAPIView):
+    # GET /api/metrics/ -- api.instrumentation numbers, for Prometheus
+    authentication_classes = [MetricsTokenAuthentication, CachedJWTAuthentication]
+    permission_classes = [IsMetricsScraper]
+
+    def get(self, request, *args, **kwargs):
+        return metrics_response()
 
 class RecipeViewSet(generics.ListAPIView):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.with_related()
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = RecipeCursorPagination
+    filter_backends = [RecipeFilterBackend, RecipeOrderingFilter]
+    ordering_fields = ['created_at', 'price', 'prep_time', 'cook_time', 'rating_avg', 'rating_count']
+    ordering = ('-created_at', '-id')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 class ReviewViewSet(generics.ListAPIView):
-    queryset = Review.objects.all()
+    queryset = Review.objects.with_related()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-
-class CartViewSet(generics.ListAPIView):
-    serializer_class = CartSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
-
-    @action(detail=True, methods=['post'])
-    def add_item(self, request, pk=None):
-        cart = self.get_object()
-        recipe_id = request.data.get('recipe_id')
-        quantity = request.data.get('quantity', 1)
-
-        try:
-            recipe = Recipe.objects.get(id=recipe_id)
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                recipe=recipe,
-                defaults={'quantity': quantity}
-            )
-            if not created:
-                cart_item.quantity += int(quantity)
-                cart_item.save()
-            
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
-        except Recipe.DoesNotExist:
-            return Response(
-                {'error': 'Recipe not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-    @action(detail=True, methods=['post'])
-    def remove_item(self, request, pk=None):
-        cart = self.get_object()
-        item_id = request.data.get('item_id')
-        
-        try:
-            cart_item = CartItem.objects.get(id=item_id, cart=cart)
-            cart_item.delete()
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
-        except CartItem.DoesNotExist:
-            return Response(
-                {'error': 'Cart item not found'},
-                status=status.HTTP_404_NOT_FOUND
-            ) 
\ No newline at end of file
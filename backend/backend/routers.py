@@ -0,0 +1,124 @@
+# backend/routers.py
+"""
+Sends catalogue reads (recipes, categories, reviews) made while handling a
+request to a read replica; everything else (carts, orders, payments, users,
+and all writes) goes to the primary, 'default'. Replicas are the aliases in
+settings.DATABASE_REPLICAS; without any, everything stays on the primary.
+
+Replicas lag behind, so a user who just wrote something must not read the
+old version back. After a request that wrote to the primary the user is
+pinned to it for REPLICA_PIN_SECONDS (the pin lives in the cache, so all
+workers see it when the cache is shared). Within a request, reads go to the
+primary once it has written or while a transaction is open on it.
+
+Work outside requests (commands, background jobs) always uses the primary:
+it typically reads rows that were just committed.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+REPLICA_APPS = {'recipes', 'categories', 'reviews'}
+
+_request_state = ContextVar('database_routing', default=None)
+
+
+def _pin_key(user_id):
+    return 'replica-pin:%s' % user_id
+
+
+def pin_to_primary(user_id):
+    cache.set(_pin_key(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+class RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self._pinned = None
+
+    @property
+    def pinned(self):
+        if self.wrote:
+            return True
+        if self._pinned is None:
+            # The user is only known once the view authenticated (JWT); before
+            # that there are no catalogue reads to route anyway.
+            user = getattr(self.request, 'user', None)
+            if user is None or not user.is_authenticated:
+                return False
+            self._pinned = bool(cache.get(_pin_key(user.pk)))
+        return self._pinned
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        state = _request_state.get()
+        if (
+            not replicas or state is None or model._meta.app_label not in REPLICA_APPS
+            or connections['default'].in_atomic_block or state.pinned
+        ):
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """Makes the request visible to PrimaryReplicaRouter and pins writers."""
+    # Async capable, or under ASGI every async view (api.asyncviews) would
+    # wait for this to get a thread.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            self.pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            # request.user may still be the lazy session user.
+            await sync_to_async(self.pin_writer)(request)
+        return response
+
+    def pin_writer(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
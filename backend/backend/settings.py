@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -49,12 +50,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover everything below (api/instrumentation.py)
+    'api.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,13 +86,68 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# backend.sqlite3 is Django's SQLite backend plus connection pragmas and
+# BEGIN IMMEDIATE transactions, see backend/sqlite3/base.py.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'backend.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests (seconds). Set to 0 when
+        # running under ASGI, where persistent connections aren't reused.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',  # durable with WAL except on power loss
+                'cache_size': -64000,  # KiB, i.e. 64 MB of page cache per connection
+                'mmap_size': 256 * 1024 * 1024,
+                'busy_timeout': 20000,  # ms
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
+# Read replicas for catalogue reads, see backend/routers.py. Locally,
+# SQLITE_REPLICAS=2 adds db.replica1.sqlite3 and db.replica2.sqlite3, copies of
+# the primary refreshed by `manage.py sync_sqlite_replicas --loop`.
+for number in range(1, int(os.getenv('SQLITE_REPLICAS', '0')) + 1):
+    DATABASES['replica%d' % number] = dict(
+        DATABASES['default'],
+        NAME=BASE_DIR / ('db.replica%d.sqlite3' % number),
+        OPTIONS=dict(DATABASES['default']['OPTIONS'], transaction_mode='DEFERRED'),
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['backend.routers.PrimaryReplicaRouter']
+# How long a user reads from the primary after writing (seconds); replicas
+# should lag less than this.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory is per process; set REDIS_URL in production so every worker
+# shares cached responses and their invalidation counters.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds an anonymous catalogue response stays cached (see api/caching.py)
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -132,6 +191,23 @@ MEDIA_URL = '/media/'
 # This will create a 'media' folder directly inside your 'backend' project root
 # (e.g., C:\Users\Galathiea\Downloads\eternal-dev\backend\media)
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Internal location of MEDIA_ROOT on the front proxy, e.g. '/protected-media/'.
+# When set, Django answers media requests with an X-Accel-Redirect header and
+# the proxy sends the file.
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')
+
+# Threads per background job pool (recipes/tasks.py): 'default' resizes images,
+# 'fetch' downloads remote ones. RECIPE_TASKS_EAGER runs jobs inline instead.
+RECIPE_TASK_POOLS = {
+    'default': int(os.getenv('RECIPE_TASK_WORKERS', '2')),
+    'fetch': int(os.getenv('RECIPE_FETCH_WORKERS', '8')),
+}
+RECIPE_TASKS_EAGER = False
+
+# Remote images given as image_url (recipes/fetch.py)
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+# Only for local development: allow image URLs pointing at private addresses.
+RECIPE_IMAGE_ALLOW_PRIVATE_HOSTS = False
 # ⭐⭐⭐ END MEDIA SETTINGS ⭐⭐⭐
 
 
@@ -143,17 +219,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication without a user query per request
+        'api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # JSONRenderer's output, encoded with orjson when it's installed
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Simple JWT settings
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Adds is_active/is_staff/is_superuser claims, see api/authentication.py
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
 }
+# How long each process keeps authenticated users (seconds)
+AUTH_USER_CACHE_TTL = 60
 
 CORS_ALLOW_ALL_ORIGINS = False # Ensure this is False
 
@@ -166,4 +252,23 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True # This is crucial since your frontend uses credentials: 'include'
 # Stripe settings
-STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', 'your_stripe_secret_key')
\ No newline at end of file
+STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', 'your_stripe_secret_key')
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+
+# Where checkout creates payment intents; 'payments.gateways.FakeGateway' needs no network
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'payments.gateways.StripeGateway')
+# Keyword arguments for the gateway, as JSON, e.g. '{"timeout": 10, "max_retries": 2}'
+# or for load tests '{"latency": 0.2, "failure_rate": 0.05}' (see payments/gateways.py)
+PAYMENT_GATEWAY_OPTIONS = json.loads(os.getenv('PAYMENT_GATEWAY_OPTIONS', '{}'))
+
+# Request instrumentation (api/instrumentation.py), served at /api/metrics/
+# Share of requests whose SQL is kept to look for repeated queries (N+1)
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '0.1'))
+# A statement repeated this often in one request is reported as N+1
+PERF_N_PLUS_ONE_THRESHOLD = 5
+# Requests slower than this are logged (milliseconds)
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', '500'))
+# Latency percentiles are over the last PERF_WINDOW requests of each view
+PERF_WINDOW = 1000
+# Bearer token for the Prometheus scraper; without one only staff can read the metrics
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
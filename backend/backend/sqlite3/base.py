@@ -0,0 +1,55 @@
+# backend/sqlite3/base.py
+"""
+Django's SQLite backend, tuned for serving traffic:
+
+    DATABASES['default'] = {
+        'ENGINE': 'backend.sqlite3',
+        'OPTIONS': {
+            'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', ...},
+            'transaction_mode': 'IMMEDIATE',
+        },
+        ...
+    }
+
+* ``pragmas`` are run on every new connection. WAL lets readers carry on
+  while a write is in progress; busy_timeout makes a writer wait for the
+  lock instead of failing at once.
+* ``transaction_mode`` is how atomic blocks begin. With the default
+  (DEFERRED) a transaction that reads and then writes, like a cart update or
+  checkout, only asks for the write lock at its first write; if another
+  connection is writing by then SQLite can't wait (the snapshot it read is
+  stale) and fails with "database is locked" whatever busy_timeout says.
+  BEGIN IMMEDIATE takes the write lock up front, where waiting works, so
+  writers queue up instead.
+
+Django 5.1 supports transaction_mode and init_command natively; this backend
+stands in until we upgrade.
+"""
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Ours, not sqlite3.connect()'s.
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ValueError('transaction_mode must be one of %s.' % ', '.join(TRANSACTION_MODES))
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute('PRAGMA %s = %s' % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN %s' % self.transaction_mode)
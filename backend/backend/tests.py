@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from recipes.models import Recipe
+from .routers import PrimaryReplicaRouter, ReplicaRoutingMiddleware
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.user = User(pk=42, username='cook')
+
+    def handle(self, view, method='get'):
+        request = getattr(RequestFactory(), method)('/')
+        request.user = self.user
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_catalogue_reads_in_requests_go_to_a_replica(self):
+        seen = {}
+
+        def view(request):
+            seen['recipes'] = self.router.db_for_read(Recipe)
+            seen['users'] = self.router.db_for_read(User)
+            return None
+
+        self.handle(view)
+        self.assertEqual(seen, {'recipes': 'replica1', 'users': 'default'})
+        # Outside a request (commands, background jobs): the primary.
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_writers_read_from_the_primary_for_a_while(self):
+        seen = []
+
+        def write_then_read(request):
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+            seen.append(self.router.db_for_read(Recipe))
+
+        def read(request):
+            seen.append(self.router.db_for_read(Recipe))
+
+        self.handle(write_then_read, 'post')
+        self.handle(read)
+        self.user = User(pk=43, username='other')
+        self.handle(read)
+        self.assertEqual(seen, ['default', 'default', 'replica1'])
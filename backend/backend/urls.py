@@ -1,9 +1,12 @@
 # backend/urls.py
 
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from recipes.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,7 +15,9 @@ urlpatterns = [
     path('api/', include('api.urls')),
 ]
 
-# This is for serving media files during development.
-# Keep this as is.
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media files: served from disk during development, handed to the front proxy
+# with X-Accel-Redirect when MEDIA_ACCEL_REDIRECT is set (see recipes/media.py).
+if settings.DEBUG or settings.MEDIA_ACCEL_REDIRECT:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='cartitem',
+            old_name='price',
+            new_name='price_at_time_of_addition',
+        ),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'recipe')},
+        ),
+    ]
@@ -1,21 +1,97 @@
 # cart/models.py
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from recipes.models import Recipe
 
+
+def line_total(quantity='quantity', price='price_at_time_of_addition'):
+    # quantity * unit price, computed by the database
+    return models.ExpressionWrapper(
+        models.F(quantity) * models.F(price),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def money_sum(expression):
+    # SUM() that is 0.00 rather than NULL when there are no rows
+    return Coalesce(
+        models.Sum(expression), models.Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class CartQuerySet(models.QuerySet):
+    def with_related(self):
+        # CartSerializer -> items -> recipe -> category, in one extra query,
+        # each item annotated with its line total.
+        return self.prefetch_related(
+            models.Prefetch(
+                'items',
+                queryset=CartItem.objects.select_related('recipe__category').annotate(line_total=line_total()),
+            )
+        )
+
+    def with_totals(self):
+        # subtotal and item_count, summed by the database in the cart query itself
+        return self.annotate(
+            subtotal=money_sum(line_total('items__quantity', 'items__price_at_time_of_addition')),
+            item_count=Coalesce(models.Sum('items__quantity'), 0),
+        )
+
+    def validators(self):
+        # For conditional GETs of a cart (CartView, AsyncCartView). Items embed
+        # their recipe and its category. Deleting a recipe cascades to its items
+        # without touching the cart, so the items are counted too.
+        return self.order_by().aggregate(**self._validator_aggregates())
+
+    async def avalidators(self):
+        return await self.order_by().aaggregate(**self._validator_aggregates())
+
+    def _validator_aggregates(self):
+        return {
+            'last_modified': models.Max('updated_at'),
+            'recipe_modified': models.Max('items__recipe__updated_at'),
+            'category_modified': models.Max('items__recipe__category__updated_at'),
+            'items': models.Count('items'),
+            'last_item': models.Max('items__id'),
+            'user': models.Max('user_id'),
+        }
+
+
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart of {self.user.username}"
 
-    # Add a property to calculate the total price of the cart dynamically
+    def touch(self):
+        # Item changes don't save the cart; bump updated_at so the cart's ETag changes.
+        self.updated_at = timezone.now()
+        Cart.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
+
+    def _load_totals(self):
+        # Annotated by CartQuerySet.with_totals(); otherwise one aggregate query.
+        if not hasattr(self, 'subtotal'):
+            totals = Cart.objects.filter(pk=self.pk).with_totals().values('subtotal', 'item_count').get()
+            self.subtotal, self.item_count = totals['subtotal'], totals['item_count']
+
     @property
     def total_price(self):
-        # Use .all() to ensure it's not a Manager if accessed directly from an instance
-        return sum(item.total_price for item in self.items.all())
+        self._load_totals()
+        return self.subtotal
+
+    @property
+    def total_quantity(self):
+        self._load_totals()
+        return self.item_count
 
 
 class CartItem(models.Model):
@@ -34,7 +110,18 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.recipe.title} in {self.cart.user.username}'s cart"
 
-    # Add a property to calculate the total price for a single item
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Cart(pk=self.cart_id).touch()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Cart(pk=self.cart_id).touch()
+        return result
+
     @property
     def total_price(self):
+        # Annotated as line_total by CartQuerySet.with_related()
+        if hasattr(self, 'line_total'):
+            return self.line_total
         return self.quantity * self.price_at_time_of_addition
\ No newline at end of file
@@ -1,10 +1,13 @@
 # cart/serializers.py
 from rest_framework import serializers
+from api.plans import PlanField
 from .models import Cart, CartItem
 # ⭐ IMPORT THE RECIPE MODEL ⭐
 from recipes.models import Recipe
 from recipes.serializers import RecipeSerializer # Import your RecipeSerializer
 
+MAX_QUANTITY = 999
+
 class CartItemSerializer(serializers.ModelSerializer):
     # For reading: Displays the full recipe object details
     recipe = RecipeSerializer(read_only=True)
@@ -19,14 +22,39 @@ class CartItemSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = CartItem
-        fields = ('id', 'recipe', 'recipe_id', 'quantity', 'price', 'total_price')
-        read_only_fields = ('price', 'total_price',)
+        fields = ('id', 'recipe', 'recipe_id', 'quantity', 'price_at_time_of_addition', 'total_price')
+        read_only_fields = ('price_at_time_of_addition', 'total_price',)
+        extra_kwargs = {'quantity': {'min_value': 1, 'max_value': MAX_QUANTITY}}
+        # CartItem.total_price without the line_total annotation
+        plan_fields = {
+            'total_price': PlanField(
+                ('quantity', 'price_at_time_of_addition'), lambda context, quantity, price: quantity * price,
+            ),
+        }
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    item_count = serializers.IntegerField(source='total_quantity', read_only=True)
 
     class Meta:
         model = Cart
-        fields = ('id', 'user', 'items', 'total_price', 'created_at', 'updated_at')
-        read_only_fields = ('user', 'created_at', 'updated_at', 'total_price')
\ No newline at end of file
+        fields = ('id', 'user', 'items', 'total_price', 'item_count', 'created_at', 'updated_at')
+        read_only_fields = ('user', 'created_at', 'updated_at', 'total_price')
+        # Annotated by CartQuerySet.with_totals()
+        plan_fields = {'total_price': PlanField('subtotal'), 'item_count': PlanField('item_count')}
+
+class CartOperationSerializer(serializers.Serializer):
+    # Either set the quantity (0 removes the item) or change it by a delta.
+    recipe_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_QUANTITY, required=False)
+    quantity_delta = serializers.IntegerField(min_value=-MAX_QUANTITY, max_value=MAX_QUANTITY, required=False)
+
+    def validate(self, attrs):
+        if ('quantity' in attrs) == ('quantity_delta' in attrs):
+            raise serializers.ValidationError('Send exactly one of quantity and quantity_delta.')
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
@@ -0,0 +1,73 @@
+# backend/cart/services.py
+"""
+Cart writes that are safe under concurrency.
+
+apply_cart_operations() takes a batch of {recipe_id, quantity} (set) and
+{recipe_id, quantity_delta} (increment) operations and applies them in one
+transaction with a fixed number of queries, however many operations there
+are: missing rows are inserted with ON CONFLICT DO NOTHING, every quantity is
+then changed by a single UPDATE computed in the database, and rows that end
+at zero are deleted. No quantity is ever read into Python and written back,
+so two concurrent adds can't lose an update.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import Recipe
+from .models import Cart, CartItem
+
+
+def _collapse(operations):
+    # recipe_id -> ('set', quantity) or ('add', delta), in request order.
+    actions = {}
+    for operation in operations:
+        recipe_id = operation['recipe_id']
+        if 'quantity' in operation:
+            actions[recipe_id] = ('set', operation['quantity'])
+        else:
+            kind, amount = actions.get(recipe_id, ('add', 0))
+            actions[recipe_id] = (kind, amount + operation['quantity_delta'])
+    return actions
+
+
+@transaction.atomic
+def apply_cart_operations(user, operations):
+    """
+    Apply ``operations`` to ``user``'s cart and return the cart, loaded with
+    Cart.objects.with_related().with_totals(). Raises Recipe.DoesNotExist if an operation
+    names an unknown recipe; nothing is written in that case.
+    """
+    actions = _collapse(operations)
+    prices = dict(Recipe.objects.filter(pk__in=actions).values_list('pk', 'price'))
+    missing = set(actions) - set(prices)
+    if missing:
+        raise Recipe.DoesNotExist('Unknown recipe ids: %s' % ', '.join(map(str, sorted(missing))))
+
+    # The row lock serializes concurrent batches on the same cart (a no-op on
+    # SQLite, which locks the whole database for writes anyway).
+    cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+
+    # Rows that may need to exist; price_at_time_of_addition is snapshotted here
+    # and left alone for items already in the cart.
+    CartItem.objects.bulk_create(
+        [
+            CartItem(cart=cart, recipe_id=recipe_id, quantity=0, price_at_time_of_addition=prices[recipe_id])
+            for recipe_id, (kind, amount) in actions.items() if amount > 0
+        ],
+        ignore_conflicts=True,
+    )
+    CartItem.objects.filter(cart=cart, recipe_id__in=actions).update(quantity=Greatest(
+        Case(
+            *[
+                When(recipe_id=recipe_id, then=Value(amount) if kind == 'set' else F('quantity') + amount)
+                for recipe_id, (kind, amount) in actions.items()
+            ],
+            default=F('quantity'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    ))
+    CartItem.objects.filter(cart=cart, recipe_id__in=actions, quantity=0).delete()
+    cart.touch()
+    return Cart.objects.with_related().with_totals().get(pk=cart.pk)
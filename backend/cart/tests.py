@@ -1,3 +1,153 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from api.testing import QueryCountMixin
+from categories.models import Category
+from recipes.models import Recipe
+from recipes.tests import make_recipe
+from .models import Cart, CartItem
+from .serializers import CartSerializer
+
+
+class CartQueryCountTests(QueryCountMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'secret-pass')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def add_items(self, n):
+        for _ in range(n):
+            category = Category.objects.create(name='Category %d' % Category.objects.count())
+            recipe = make_recipe(category=category)
+            CartItem.objects.create(
+                cart=self.cart, recipe=recipe, quantity=2,
+                price_at_time_of_addition=recipe.price,
+            )
+
+    def test_cart_does_not_query_per_item(self):
+        self.assertQueriesDoNotScale(lambda: self.client.get(reverse('user-cart')), self.add_items)
+
+    def test_cart_etag_follows_item_changes(self):
+        etag = self.client.get(reverse('user-cart'))['ETag']
+        response = self.client.get(reverse('user-cart'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+
+        self.add_items(1)
+        response = self.client.get(reverse('user-cart'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        CartItem.objects.get().delete()
+        self.assertEqual(self.client.get(reverse('user-cart'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cart_etag_changes_when_a_recipe_is_deleted(self):
+        self.add_items(2)
+        etag = self.client.get(reverse('user-cart'))['ETag']
+        # Cascades to its cart item without saving the cart or the other recipe.
+        CartItem.objects.order_by('id').first().recipe.delete()
+        response = self.client.get(reverse('user-cart'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['items']), 1)
+
+    def test_cart_total(self):
+        self.add_items(3)
+        response = self.client.get(reverse('user-cart'))
+        self.assertEqual(len(response.data['items']), 3)
+        self.assertEqual(response.data['total_price'], '59.94')
+        self.assertEqual(response.data['item_count'], 6)
+        self.assertEqual(response.data['items'][0]['total_price'], '19.98')
+
+    def test_totals_are_summed_in_the_database(self):
+        self.add_items(2)
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        self.assertEqual((cart.subtotal, cart.item_count), (Decimal('39.96'), 4))
+        empty = Cart.objects.with_totals().get(pk=Cart.objects.create(user=User.objects.create_user('new')).pk)
+        self.assertEqual((empty.total_price, empty.total_quantity), (Decimal('0.00'), 0))
+
+    def test_cart_is_read_by_the_plan(self):
+        self.assertEqual(self.client.get(reverse('user-cart')).json()['items'], [])
+        category = Category.objects.create(name='Filipino')
+        CartItem.objects.create(
+            cart=self.cart, recipe=make_recipe(category=category), quantity=3, price_at_time_of_addition=Decimal('4.50'),
+        )
+        CartItem.objects.create(
+            cart=self.cart, recipe=make_recipe(title='Pancit'), quantity=1, price_at_time_of_addition=Decimal('2.25'),
+        )
+        response = self.client.get(reverse('user-cart'))
+        cart = Cart.objects.with_related().with_totals().get(pk=self.cart.pk)
+        expected = CartSerializer(cart, context={'request': response.wsgi_request}).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+        self.assertEqual(response.json()['total_price'], '15.75')
+
+
+class CartBatchTests(QueryCountMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        self.client.force_authenticate(self.user)
+        self.adobo, self.pancit, self.halo = (
+            make_recipe(title=title, price=price)
+            for title, price in (('Adobo', Decimal('10.00')), ('Pancit', Decimal('7.50')), ('Halo-halo', Decimal('4.00')))
+        )
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart-batch'), {'operations': list(operations)}, format='json')
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('recipe__title', 'quantity'))
+
+    def test_adds_sets_and_removes_in_one_request(self):
+        self.batch({'recipe_id': self.adobo.pk, 'quantity_delta': 2}, {'recipe_id': self.pancit.pk, 'quantity': 1})
+        response = self.batch(
+            {'recipe_id': self.adobo.pk, 'quantity_delta': 1},
+            {'recipe_id': self.adobo.pk, 'quantity_delta': 1},
+            {'recipe_id': self.pancit.pk, 'quantity': 0},
+            {'recipe_id': self.halo.pk, 'quantity': 3},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {'Adobo': 4, 'Halo-halo': 3})
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_batch_does_not_query_per_operation(self):
+        operations = []
+
+        def add_operations(n):
+            # Per recipe: an add, a set and, for the one removed, a delete.
+            for _ in range(n):
+                recipe_id = make_recipe().pk
+                operations.append({'recipe_id': recipe_id, 'quantity_delta': 2})
+                operations.append({'recipe_id': recipe_id, 'quantity': 1})
+            operations.append({'recipe_id': self.pancit.pk, 'quantity': 0})
+
+        self.batch({'recipe_id': self.pancit.pk, 'quantity': 1})
+        self.assertQueriesDoNotScale(lambda: self.batch(*operations), add_operations)
+
+    def test_price_is_snapshotted_when_the_item_is_added(self):
+        self.batch({'recipe_id': self.adobo.pk, 'quantity_delta': 1})
+        Recipe.objects.filter(pk=self.adobo.pk).update(price=Decimal('99.00'))
+        self.batch({'recipe_id': self.adobo.pk, 'quantity_delta': 1})
+        item = CartItem.objects.get()
+        self.assertEqual((item.quantity, item.price_at_time_of_addition), (2, Decimal('10.00')))
+
+    def test_quantities_never_go_negative(self):
+        self.batch({'recipe_id': self.adobo.pk, 'quantity': 1})
+        self.batch({'recipe_id': self.adobo.pk, 'quantity_delta': -5}, {'recipe_id': self.pancit.pk, 'quantity_delta': -1})
+        self.assertEqual(self.quantities(), {})
+
+    def test_unknown_recipe_rejects_the_whole_batch(self):
+        response = self.batch({'recipe_id': self.adobo.pk, 'quantity': 1}, {'recipe_id': 9999, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        response = self.batch({'recipe_id': self.adobo.pk, 'quantity': 1, 'quantity_delta': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def test_adding_an_existing_item_increments_it(self):
+        for _ in range(2):
+            response = self.client.post(reverse('add-to-cart'), {'recipe_id': self.adobo.pk, 'quantity': 2})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 4)
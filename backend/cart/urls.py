@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import CartView, CartItemCreateView, CartItemDeleteView
+from .views import CartBatchView, CartView, CartItemCreateView, CartItemDeleteView
 
 urlpatterns = [
     path('', CartView.as_view(), name='user-cart'), # GET user's cart
     path('create/', CartItemCreateView.as_view(), name='add-to-cart'), # POST to add item
+    path('batch/', CartBatchView.as_view(), name='cart-batch'), # POST several adds/updates/removals at once
     path('delete/<int:pk>/', CartItemDeleteView.as_view(), name='update-cart-item'), # PUT/PATCH quantity
 ]
\ No newline at end of file
@@ -1,23 +1,64 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from api.conditional import ConditionalGetMixin
+from api.plans import plan_for
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from .serializers import CartBatchSerializer, CartSerializer, CartItemSerializer
+from .services import apply_cart_operations
+from recipes.models import Recipe
 
-class CartView(generics.RetrieveUpdateAPIView):
+class CartView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    private_response = True
+
+    def get_validator_aggregate(self):
+        validators = Cart.objects.filter(user=self.request.user).validators()
+        return validators if validators['user'] else None
 
     def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        cart, created = Cart.objects.with_related().with_totals().get_or_create(user=self.request.user)
         return cart
 
+    def retrieve(self, request, *args, **kwargs):
+        # GETs read the cart and its items as rows, see api.plans.
+        plan = plan_for(CartSerializer)
+        carts = plan.values(Cart.objects.with_totals().filter(user=request.user))
+        rows = list(carts)
+        if not rows:
+            self.get_object()
+            rows = list(carts.all())
+        return Response(plan.represent(rows, self.get_serializer_context())[0])
+
+class CartBatchView(generics.GenericAPIView):
+    # POST /api/cart/batch/ {"operations": [{"recipe_id": 1, "quantity_delta": 2},
+    #                                       {"recipe_id": 5, "quantity": 0}]}
+    serializer_class = CartBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            cart = apply_cart_operations(request.user, serializer.validated_data['operations'])
+        except Recipe.DoesNotExist as e:
+            return Response({'operations': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(CartSerializer(cart, context=self.get_serializer_context()).data)
+
 class CartItemCreateView(generics.CreateAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def perform_create(self, serializer):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        serializer.save(cart=cart)
+    def create(self, request, *args, **kwargs):
+        # Adding a recipe that is already in the cart increases its quantity.
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe = serializer.validated_data['recipe']
+        cart = apply_cart_operations(request.user, [
+            {'recipe_id': recipe.pk, 'quantity_delta': serializer.validated_data.get('quantity', 1)}
+        ])
+        item = next(item for item in cart.items.all() if item.recipe_id == recipe.pk)
+        return Response(self.get_serializer(item).data, status=status.HTTP_201_CREATED)
 
 class CartItemDeleteView(generics.DestroyAPIView):
     queryset = CartItem.objects.all()
@@ -0,0 +1,113 @@
+# backend/payments/checkout.py
+"""
+Turns the user's cart into a paid-for order in one call, in three steps so
+that no transaction is open while the payment gateway is called:
+
+    1. one short transaction: cart items --bulk_create--> OrderItems (at the
+       prices the cart shows), total --one UPDATE--> Order.total_amount
+    2. no transaction: gateway --> payment intent (retried with backoff)
+    3. one short transaction: intent --> Payment, cart emptied
+
+Checkout is idempotent per (user, idempotency key). Repeating a request whose
+order already has its payment returns both, with the client secret stored on
+the Payment, without calling the gateway. An order left without a payment
+(the process died between steps) is picked up where it stopped: the gateway
+gets the same key and hands back the same intent instead of charging again.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+
+from cart.models import Cart, CartItem
+from .gateways import PaymentGatewayError, get_gateway
+from .models import Order, OrderItem, Payment
+
+CheckoutResult = namedtuple('CheckoutResult', ['order', 'payment', 'client_secret', 'replayed'])
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def to_cents(amount):
+    return int((amount * 100).quantize(Decimal('1')))
+
+
+def _gateway_key(user, idempotency_key):
+    return 'checkout:%s:%s' % (user.pk, idempotency_key)
+
+
+def _existing_order(user, idempotency_key):
+    return Order.objects.with_related().filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def checkout(user, idempotency_key, currency='usd'):
+    order = _existing_order(user, idempotency_key)
+    replayed = order is not None
+    if order is None:
+        try:
+            order = _create_order(user, idempotency_key)
+        except IntegrityError:
+            # A concurrent request with the same key created the order first.
+            order = _existing_order(user, idempotency_key)
+            if order is None:
+                raise
+            replayed = True
+
+    payment = Payment.objects.filter(order=order).first()
+    if payment is not None:
+        return CheckoutResult(order, payment, payment.client_secret, replayed)
+
+    # No transaction is open here: the call can take seconds of retries. The
+    # parameters must be the same on every attempt for the gateway to return
+    # the same intent, hence no order id in the metadata.
+    try:
+        intent = get_gateway().create_payment_intent(
+            to_cents(order.total_amount), currency, _gateway_key(user, idempotency_key), {'user_id': user.pk},
+        )
+    except PaymentGatewayError:
+        if not replayed:
+            # Nothing is charged yet: drop the order so the cart can be checked out again.
+            order.delete()
+        raise
+    return CheckoutResult(order, _record_payment(order, intent), intent.client_secret, replayed)
+
+
+@transaction.atomic
+def _create_order(user, idempotency_key):
+    # Locks the cart so items can't change while they are priced.
+    cart = Cart.objects.select_for_update().filter(user=user).first()
+    items = list(
+        CartItem.objects.filter(cart=cart).values_list('recipe_id', 'quantity', 'price_at_time_of_addition')
+    ) if cart else []
+    if not items:
+        raise CheckoutError('Your cart is empty.')
+
+    order = Order.objects.create(user=user, total_amount=0, idempotency_key=idempotency_key)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, recipe_id=recipe_id, quantity=quantity, price=price)
+        for recipe_id, quantity, price in items
+    ])
+    Order.objects.filter(pk=order.pk).update_totals()
+    return Order.objects.with_related().get(pk=order.pk)
+
+
+def _record_payment(order, intent):
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                order=order, payment_id=intent.id, amount=order.total_amount, status=intent.status,
+                client_secret=intent.client_secret,
+            )
+            # Only what was ordered leaves the cart; items added since stay.
+            cart = Cart.objects.select_for_update().filter(user_id=order.user_id).first()
+            if cart is not None:
+                CartItem.objects.filter(
+                    cart=cart, recipe_id__in=[item.recipe_id for item in order.items.all()],
+                ).delete()
+                cart.touch()
+    except IntegrityError:
+        # A concurrent retry recorded the same intent first.
+        return Payment.objects.get(order=order)
+    return payment
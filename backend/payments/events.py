@@ -0,0 +1,152 @@
+# backend/payments/events.py
+"""
+Payment provider webhooks, split in two so the webhook itself stays fast:
+
+    ingest_event()          verified event -> one INSERT into the PaymentEvent
+                            queue (repeat deliveries of an event are dropped)
+    process_pending_events() a worker (manage.py process_payment_events)
+                            takes the oldest pending events in batches and
+                            moves Payment.status and Order.status forward
+
+Providers deliver at least once and in no particular order, so statuses
+only ever move forward (see STATUS_RANK): replaying an event, or receiving
+"processing" after "succeeded", changes nothing. An event can also arrive
+before checkout has recorded its Payment; it stays pending and is retried
+with backoff (UNMATCHED_RETRY_BACKOFF) until UNMATCHED_DEADLINE after it was
+received, and only then dropped.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Order, Payment, PaymentEvent
+
+# provider event type -> (payment status, order status)
+EVENT_STATUSES = {
+    'payment_intent.processing': ('processing', 'pending'),
+    'payment_intent.payment_failed': ('failed', 'payment_failed'),
+    'payment_intent.succeeded': ('succeeded', 'paid'),
+    'payment_intent.canceled': ('canceled', 'canceled'),
+    'charge.refunded': ('refunded', 'refunded'),
+}
+
+STATUS_RANK = {
+    'requires_payment_method': 0,
+    'requires_confirmation': 0,
+    'requires_action': 0,
+    'processing': 1,
+    'failed': 2,
+    'succeeded': 3,
+    'canceled': 3,
+    'refunded': 4,
+}
+
+# Events about a payment we don't have yet: first retry after the backoff,
+# doubling up to the max, given up on this long after they were received.
+UNMATCHED_RETRY_BACKOFF = timedelta(seconds=5)
+UNMATCHED_MAX_BACKOFF = timedelta(minutes=10)
+UNMATCHED_DEADLINE = timedelta(days=3)
+
+QueueMetrics = namedtuple('QueueMetrics', ['pending', 'oldest_pending_age', 'processed_last_hour', 'average_lag'])
+
+
+def _payment_id(event):
+    obj = event.get('data', {}).get('object', {})
+    if event.get('type', '').startswith('charge.'):
+        return obj.get('payment_intent') or ''
+    return obj.get('id') or ''
+
+
+def ingest_event(event):
+    """Queue a verified event: one INSERT ... ON CONFLICT DO NOTHING on event_id."""
+    PaymentEvent.objects.bulk_create([
+        PaymentEvent(
+            event_id=event['id'], type=event.get('type', ''), payment_id=_payment_id(event), payload=event,
+        )
+    ], ignore_conflicts=True)
+
+
+@transaction.atomic
+def process_batch(batch_size=100):
+    """
+    Apply up to ``batch_size`` pending events: a fixed number of queries per
+    batch, not per event. Returns the number of events taken from the queue,
+    including those put off until their payment exists.
+    """
+    now = timezone.now()
+    events = list(
+        PaymentEvent.objects.select_for_update(skip_locked=True)
+        .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now), processed_at__isnull=True)
+        .defer('payload')
+        .order_by('received_at', 'id')[:batch_size]
+    )
+    if not events:
+        return 0
+
+    # Best status each payment reaches in this batch.
+    targets = {}
+    for event in events:
+        if event.type in EVENT_STATUSES and event.payment_id:
+            status = EVENT_STATUSES[event.type]
+            current = targets.get(event.payment_id)
+            if current is None or STATUS_RANK[status[0]] > STATUS_RANK[current[0]]:
+                targets[event.payment_id] = status
+
+    payments = Payment.objects.filter(payment_id__in=targets).values_list('pk', 'order_id', 'payment_id', 'status')
+    known = set()
+    updates = {}
+    for pk, order_id, payment_id, status in payments:
+        known.add(payment_id)
+        payment_status, order_status = targets[payment_id]
+        if STATUS_RANK[payment_status] > STATUS_RANK.get(status, 0):
+            updates.setdefault((payment_status, order_status), ([], []))
+            updates[payment_status, order_status][0].append(pk)
+            updates[payment_status, order_status][1].append(order_id)
+    for (payment_status, order_status), (payment_pks, order_pks) in updates.items():
+        Payment.objects.filter(pk__in=payment_pks).update(status=payment_status)
+        Order.objects.filter(pk__in=order_pks).update(status=order_status)
+
+    for event in events:
+        if event.type not in EVENT_STATUSES:
+            event.error = 'Ignored event type.'
+        elif event.payment_id not in known:
+            if event.payment_id and now < event.received_at + UNMATCHED_DEADLINE:
+                # Checkout may not have recorded the payment yet.
+                event.retry_at = now + min(UNMATCHED_MAX_BACKOFF, UNMATCHED_RETRY_BACKOFF * 2 ** event.attempts)
+                event.attempts += 1
+                continue
+            event.error = 'No payment with this id.'
+        event.processed_at = now
+    PaymentEvent.objects.bulk_update(events, ['processed_at', 'error', 'attempts', 'retry_at'])
+    return len(events)
+
+
+def process_pending_events(batch_size=100, max_batches=None):
+    """Process batches until the queue is empty (or ``max_batches`` ran)."""
+    processed = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = process_batch(batch_size)
+        if not count:
+            break
+        processed += count
+        batches += 1
+    return processed
+
+
+def queue_metrics():
+    now = timezone.now()
+    pending = PaymentEvent.objects.filter(processed_at__isnull=True).aggregate(
+        count=Count('id'), oldest=Min('received_at'),
+    )
+    recent = PaymentEvent.objects.filter(processed_at__gte=now - timedelta(hours=1)).aggregate(
+        count=Count('id'), lag=Avg(F('processed_at') - F('received_at')),
+    )
+    return QueueMetrics(
+        pending=pending['count'],
+        oldest_pending_age=(now - pending['oldest']).total_seconds() if pending['oldest'] else 0.0,
+        processed_last_hour=recent['count'],
+        average_lag=recent['lag'].total_seconds() if recent['lag'] is not None else None,
+    )
@@ -0,0 +1,242 @@
+# backend/payments/gateways.py
+"""
+Payment providers behind one small interface, picked by
+settings.PAYMENT_GATEWAY (a dotted path) and built with the keyword arguments
+in settings.PAYMENT_GATEWAY_OPTIONS:
+
+    PAYMENT_GATEWAY = 'payments.gateways.StripeGateway'   # default
+    PAYMENT_GATEWAY_OPTIONS = {'timeout': 10, 'max_retries': 2}
+
+    PAYMENT_GATEWAY = 'payments.gateways.FakeGateway'     # offline, no network
+    PAYMENT_GATEWAY_OPTIONS = {'latency': 0.2, 'failure_rate': 0.05}
+
+A gateway implements create_payment_intent(), for ASGI callers
+acreate_payment_intent(), and parse_event() to verify webhook deliveries.
+Amounts are in the currency's smallest unit (cents), and the idempotency key
+makes retries of the same request return the same intent instead of charging
+twice. That is also what makes the automatic
+retries (exponential backoff with jitter, only for errors marked retryable)
+safe.
+
+Gateways are built once per process and reused, so HTTP connections are
+pooled across requests.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+PaymentIntent = namedtuple('PaymentIntent', ['id', 'client_secret', 'status'])
+
+
+class PaymentGatewayError(Exception):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class WebhookVerificationError(PaymentGatewayError):
+    pass
+
+
+class BaseGateway:
+    def __init__(self, max_retries=2, backoff=0.25, max_backoff=2.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def create_payment_intent(self, amount, currency, idempotency_key, metadata=None):
+        """Return a PaymentIntent for ``amount`` (in cents) or raise PaymentGatewayError."""
+        return self._retry(lambda: self._create_payment_intent(amount, currency, idempotency_key, metadata or {}))
+
+    async def acreate_payment_intent(self, amount, currency, idempotency_key, metadata=None):
+        return await self._aretry(lambda: self._acreate_payment_intent(amount, currency, idempotency_key, metadata or {}))
+
+    def parse_event(self, payload, headers):
+        """
+        Verify a webhook delivery (raw body bytes and request headers) and
+        return the event as a dict shaped like a Stripe event. Raises
+        WebhookVerificationError.
+        """
+        raise NotImplementedError('parse_event() must be implemented.')
+
+    def _create_payment_intent(self, amount, currency, idempotency_key, metadata):
+        raise NotImplementedError('_create_payment_intent() must be implemented.')
+
+    async def _acreate_payment_intent(self, amount, currency, idempotency_key, metadata):
+        # Without a native async client, run the blocking call off the event loop.
+        return await sync_to_async(self._create_payment_intent, thread_sensitive=False)(
+            amount, currency, idempotency_key, metadata
+        )
+
+    def _delays(self):
+        for attempt in range(self.max_retries):
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            yield delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry(self, call):
+        delays = self._delays()
+        while True:
+            try:
+                return call()
+            except PaymentGatewayError as e:
+                delay = next(delays, None) if e.retryable else None
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def _aretry(self, call):
+        delays = self._delays()
+        while True:
+            try:
+                return await call()
+            except PaymentGatewayError as e:
+                delay = next(delays, None) if e.retryable else None
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+
+class StripeGateway(BaseGateway):
+    """
+    One StripeClient per process on a shared requests.Session, so requests
+    reuse pooled HTTPS connections. The async variant uses Stripe's httpx
+    client when httpx is installed and falls back to a worker thread otherwise.
+    """
+
+    def __init__(self, api_key=None, webhook_secret=None, timeout=10, connect_timeout=3, pool_size=10, **kwargs):
+        super().__init__(**kwargs)
+        import requests
+        import stripe
+
+        session = requests.Session()
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        try:
+            import httpx
+        except ImportError:
+            async_client = None
+        else:
+            async_client = stripe.HTTPXClient(timeout=httpx.Timeout(timeout, connect=connect_timeout))
+
+        self.stripe = stripe
+        self.webhook_secret = webhook_secret or settings.STRIPE_WEBHOOK_SECRET
+        self.supports_async = async_client is not None
+        self.client = stripe.StripeClient(
+            api_key or settings.STRIPE_SECRET_KEY,
+            # Retries happen in BaseGateway, the same way for every gateway.
+            max_network_retries=0,
+            http_client=stripe.RequestsClient(
+                timeout=(connect_timeout, timeout), session=session, async_fallback_client=async_client,
+            ),
+        )
+
+    def _params(self, amount, currency, metadata):
+        return {
+            'amount': amount,
+            'currency': currency,
+            'automatic_payment_methods': {'enabled': True},
+            'metadata': metadata,
+        }
+
+    def _error(self, error):
+        stripe = self.stripe
+        retryable = (
+            isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError))
+            or (error.http_status or 0) >= 500
+        )
+        return PaymentGatewayError(error.user_message or str(error), retryable=retryable)
+
+    def _create_payment_intent(self, amount, currency, idempotency_key, metadata):
+        try:
+            intent = self.client.v1.payment_intents.create(
+                params=self._params(amount, currency, metadata), options={'idempotency_key': idempotency_key},
+            )
+        except self.stripe.StripeError as e:
+            raise self._error(e) from e
+        return PaymentIntent(intent.id, intent.client_secret, intent.status)
+
+    async def _acreate_payment_intent(self, amount, currency, idempotency_key, metadata):
+        if not self.supports_async:
+            return await super()._acreate_payment_intent(amount, currency, idempotency_key, metadata)
+        try:
+            intent = await self.client.v1.payment_intents.create_async(
+                params=self._params(amount, currency, metadata), options={'idempotency_key': idempotency_key},
+            )
+        except self.stripe.StripeError as e:
+            raise self._error(e) from e
+        return PaymentIntent(intent.id, intent.client_secret, intent.status)
+
+    def parse_event(self, payload, headers):
+        try:
+            self.stripe.WebhookSignature.verify_header(
+                payload.decode('utf-8'), headers.get('Stripe-Signature', ''), self.webhook_secret,
+                tolerance=self.stripe.Webhook.DEFAULT_TOLERANCE,
+            )
+            return json.loads(payload)
+        except (self.stripe.SignatureVerificationError, ValueError) as e:
+            raise WebhookVerificationError(str(e)) from e
+
+
+class FakeGateway(BaseGateway):
+    """
+    In-process stand-in for Stripe, for tests, development and load tests.
+    Intent ids are derived from the idempotency key, so retries get the same
+    intent just like they would from Stripe. ``latency`` (seconds) is added
+    to every call and ``failure_rate`` (0-1) of the calls fail with a
+    retryable error; pass ``seed`` for a repeatable failure sequence.
+    Webhooks are signed with an HMAC of the body in a Fake-Signature header,
+    see sign().
+    """
+
+    def __init__(self, latency=0, failure_rate=0, seed=None, webhook_secret='whsec_fake', **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.webhook_secret = webhook_secret
+
+    def sign(self, payload):
+        return hmac.new(self.webhook_secret.encode(), payload, hashlib.sha256).hexdigest()
+
+    def parse_event(self, payload, headers):
+        if not hmac.compare_digest(self.sign(payload), headers.get('Fake-Signature', '')):
+            raise WebhookVerificationError('Invalid signature.')
+        try:
+            return json.loads(payload)
+        except ValueError as e:
+            raise WebhookVerificationError(str(e)) from e
+
+    def _intent(self, amount, idempotency_key):
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise PaymentGatewayError('Injected gateway failure.', retryable=True)
+        digest = hashlib.sha256(idempotency_key.encode()).hexdigest()[:24]
+        return PaymentIntent('pi_fake_%s' % digest, 'pi_fake_%s_secret_%d' % (digest, amount), 'requires_payment_method')
+
+    def _create_payment_intent(self, amount, currency, idempotency_key, metadata):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._intent(amount, idempotency_key)
+
+    async def _acreate_payment_intent(self, amount, currency, idempotency_key, metadata):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._intent(amount, idempotency_key)
+
+
+_gateways = {}
+
+
+def get_gateway():
+    path = getattr(settings, 'PAYMENT_GATEWAY', 'payments.gateways.StripeGateway')
+    options = getattr(settings, 'PAYMENT_GATEWAY_OPTIONS', {})
+    key = (path, repr(sorted(options.items())))
+    if key not in _gateways:
+        _gateways[key] = import_string(path)(**options)
+    return _gateways[key]
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.events import process_pending_events, queue_metrics
+
+
+class Command(BaseCommand):
+    help = "Apply queued payment provider events (webhook deliveries) to payments and orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of events applied per transaction (default: 100).',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the queue instead of exiting once it is empty.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait between polls of an empty queue with --loop (default: 1).',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_events(batch_size=options['batch_size'])
+            if processed or not options['loop']:
+                metrics = queue_metrics()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {processed} payment events; {metrics.pending} pending."
+                ))
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
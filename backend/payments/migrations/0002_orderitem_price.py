@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+def backfill_prices(apps, schema_editor):
+    # Older lines never stored a price; the recipe's current price is the best we have.
+    OrderItem = apps.get_model('payments', 'OrderItem')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    OrderItem.objects.update(
+        price=models.Subquery(Recipe.objects.filter(pk=models.OuterRef('recipe_id')).values('price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Unit price when ordered', max_digits=8),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(help_text='Provider event id; repeats are dropped', max_length=255, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('payment_id', models.CharField(blank=True, help_text='Payment intent the event is about', max_length=255)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('payment_failed', 'Payment failed'), ('canceled', 'Canceled'), ('refunded', 'Refunded')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='paymentevent',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['received_at', 'id'], name='paymentevent_pending_idx'),
+        ),
+    ]
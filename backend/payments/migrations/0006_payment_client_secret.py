@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='client_secret',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
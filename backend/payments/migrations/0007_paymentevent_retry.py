@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_payment_client_secret'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='paymentevent',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
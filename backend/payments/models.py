@@ -1,11 +1,60 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from cart.models import line_total, money_sum
 from recipes.models import Recipe  # Assuming you're selling recipes
 
+
+class OrderQuerySet(models.QuerySet):
+    def with_related(self):
+        # OrderSerializer -> items -> recipe.title, fetched in one extra query
+        return self.prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.select_related('recipe'))
+        )
+
+    def update_totals(self):
+        # total_amount = sum of the order's lines, in a single UPDATE
+        lines = (
+            OrderItem.objects.filter(order=models.OuterRef('pk'))
+            .order_by().values('order')
+            .annotate(total=money_sum(line_total(price='price')))
+            .values('total')
+        )
+        return self.update(total_amount=Coalesce(
+            models.Subquery(lines), models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ))
+
+
 class Order(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('payment_failed', 'Payment failed'),
+        ('canceled', 'Canceled'),
+        ('refunded', 'Refunded'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Moved on by payment provider events (see payments.events)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Client-supplied key that makes checkout safe to retry (see payments.checkout)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='order_user_idempotency_key_uniq'),
+        ]
+        indexes = [
+            # A user's orders, newest first (OrderListCreateView).
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
@@ -14,6 +63,7 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=8, decimal_places=2, default=0.00, help_text="Unit price when ordered")
 
     def __str__(self):
         return f"{self.quantity} x {self.recipe.title} in Order #{self.order.id}"
@@ -24,5 +74,39 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50)  
+    # Handed back again when checkout is retried (payments.checkout)
+    client_secret = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            # Provider callbacks and webhook batches look payments up by intent id.
+            models.Index(fields=['payment_id'], name='payment_payment_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Payment for Order #{self.order.id} - {self.status}"
+
+class PaymentEvent(models.Model):
+    # A webhook delivery from the payment provider, queued for payments.events
+    event_id = models.CharField(max_length=255, unique=True, help_text="Provider event id; repeats are dropped")
+    type = models.CharField(max_length=100)
+    payment_id = models.CharField(max_length=255, blank=True, help_text="Payment intent the event is about")
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Waiting for its Payment to exist (see payments.events)
+    attempts = models.PositiveIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The queue: unprocessed events, oldest first.
+            models.Index(
+                fields=['received_at', 'id'], name='paymentevent_pending_idx',
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
     def __str__(self):
-        return f"Payment for Order #{self.order.id} - {self.status}"
\ No newline at end of file
+        return f"{self.type} ({self.event_id})"
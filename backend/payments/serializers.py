@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem, Payment
 
@@ -6,18 +7,47 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderItem
-        fields = ('id', 'recipe', 'quantity', 'recipe_title')
+        fields = ('id', 'recipe', 'quantity', 'price', 'recipe_title')
+        read_only_fields = ('price',)
+        extra_kwargs = {'quantity': {'min_value': 1}}
+
+class OrderItemCreateSerializer(OrderItemSerializer):
+    # Adds a line to one of the user's existing orders.
+    class Meta(OrderItemSerializer.Meta):
+        fields = ('id', 'order', 'recipe', 'quantity', 'price', 'recipe_title')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['order'].queryset = Order.objects.filter(user=self.context['request'].user)
+        return fields
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = OrderItemSerializer(many=True, allow_empty=False)
 
     class Meta:
         model = Order
-        fields = ('id', 'user', 'total_amount', 'items', 'created_at')
-        read_only_fields = ('user', 'created_at')
+        fields = ('id', 'user', 'total_amount', 'status', 'items', 'created_at')
+        # The total is always computed from the items (and their current prices).
+        read_only_fields = ('user', 'total_amount', 'status', 'created_at')
+
+    @transaction.atomic
+    def create(self, validated_data):
+        items = validated_data.pop('items')
+        order = Order.objects.create(total_amount=0, **validated_data)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, recipe=item['recipe'], quantity=item['quantity'], price=item['recipe'].price)
+            for item in items
+        ])
+        Order.objects.filter(pk=order.pk).update_totals()
+        return Order.objects.with_related().get(pk=order.pk)
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ('id', 'order', 'payment_id', 'amount', 'timestamp', 'status')
-        read_only_fields = ('timestamp',)
\ No newline at end of file
+        read_only_fields = ('timestamp',)
+
+class CheckoutSerializer(serializers.Serializer):
+    # The key can also be sent as an Idempotency-Key header.
+    idempotency_key = serializers.CharField(max_length=64)
+    currency = serializers.ChoiceField(choices=['usd', 'eur', 'gbp', 'php'], default='usd')
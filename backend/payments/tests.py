@@ -1,3 +1,272 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.testing import QueryCountMixin
+from cart.models import Cart, CartItem
+from recipes.tests import make_recipe
+from .checkout import _create_order, checkout
+from .events import UNMATCHED_DEADLINE, process_pending_events, queue_metrics
+from .gateways import FakeGateway, PaymentGatewayError
+from .models import Order, OrderItem, Payment, PaymentEvent
+
+
+class TransactionCheckingGateway(FakeGateway):
+    # Records how many atomic blocks are open during each gateway call.
+    calls = []
+
+    def _create_payment_intent(self, *args):
+        self.calls.append(len(connection.atomic_blocks))
+        return super()._create_payment_intent(*args)
+
+
+class OrderHistoryTests(QueryCountMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret-pass')
+        self.client.force_authenticate(self.user)
+
+    def add_orders(self, n):
+        for _ in range(n):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('19.98'))
+            OrderItem.objects.create(order=order, recipe=make_recipe(), quantity=2)
+
+    def test_history_does_not_query_per_order_item(self):
+        self.assertQueriesDoNotScale(lambda: self.client.get(reverse('order-list')), self.add_orders)
+
+    def test_history_only_lists_own_orders(self):
+        other = User.objects.create_user('other')
+        Order.objects.create(user=other, total_amount=Decimal('1.00'))
+        self.add_orders(1)
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['items'][0]['recipe_title'], 'Chicken Adobo')
+
+    def test_export_streams_the_history(self):
+        Order.objects.create(user=User.objects.create_user('other'), total_amount=Decimal('1.00'))
+        self.add_orders(3)
+        response = self.client.get(reverse('order-export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.client.get(reverse('order-list')).content)
+
+        response = self.client.get(reverse('order-export'), {'format': 'ndjson'})
+        lines = b''.join(response.streaming_content).splitlines()
+        history = self.client.get(reverse('order-list')).data
+        self.assertEqual([json.loads(line)['id'] for line in lines], [order['id'] for order in history])
+
+
+class OrderTotalTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.client.force_authenticate(self.user)
+        self.adobo = make_recipe(price=Decimal('9.99'))
+        self.pancit = make_recipe(title='Pancit', price=Decimal('4.50'))
+
+    def test_total_is_computed_from_current_prices(self):
+        response = self.client.post(reverse('order-list'), {
+            'total_amount': '0.01',
+            'items': [{'recipe': self.adobo.pk, 'quantity': 2}, {'recipe': self.pancit.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], '24.48')
+        self.assertEqual([item['price'] for item in response.data['items']], ['9.99', '4.50'])
+
+        # Later price changes don't touch placed orders.
+        self.adobo.price = Decimal('20.00')
+        self.adobo.save()
+        self.assertEqual(Order.objects.get().total_amount, Decimal('24.48'))
+
+    def test_adding_a_line_updates_the_total(self):
+        order = Order.objects.create(user=self.user, total_amount=0)
+        response = self.client.post(reverse('create-order-item'), {'order': order.pk, 'recipe': self.pancit.pk, 'quantity': 3})
+        self.assertEqual(response.status_code, 201)
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('13.50'))
+
+        other = Order.objects.create(user=User.objects.create_user('other'), total_amount=0)
+        response = self.client.post(reverse('create-order-item'), {'order': other.pk, 'recipe': self.pancit.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway')
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+        for title, price, quantity in (('Adobo', '9.99', 2), ('Pancit', '4.50', 1)):
+            recipe = make_recipe(title=title, price=Decimal(price))
+            CartItem.objects.create(cart=cart, recipe=recipe, quantity=quantity, price_at_time_of_addition=recipe.price)
+
+    def checkout(self, key='order-1'):
+        return self.client.post(reverse('checkout'), {}, HTTP_IDEMPOTENCY_KEY=key, format='json')
+
+    def test_cart_becomes_an_order_with_a_payment(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['order']['total_amount'], '24.48')
+        self.assertEqual(len(response.data['order']['items']), 2)
+        self.assertEqual(response.data['payment']['amount'], '24.48')
+        self.assertTrue(response.data['clientSecret'].endswith('_2448'))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_retries_return_the_same_order(self):
+        first = self.checkout()
+        retry = self.checkout()
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data['order']['id'], first.data['order']['id'])
+        self.assertEqual(retry.data['clientSecret'], first.data['clientSecret'])
+        self.assertEqual((Order.objects.count(), Payment.objects.count()), (1, 1))
+
+    def test_empty_cart_and_missing_key_are_rejected(self):
+        self.assertEqual(self.client.post(reverse('checkout'), {}, format='json').status_code, 400)
+        self.checkout()
+        response = self.checkout(key='order-2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(PAYMENT_GATEWAY='payments.tests.TransactionCheckingGateway')
+    def test_gateway_is_called_outside_transactions_and_not_on_replay(self):
+        TransactionCheckingGateway.calls = []
+        open_blocks = len(connection.atomic_blocks)
+        first = self.checkout()
+        self.assertEqual(TransactionCheckingGateway.calls, [open_blocks])
+        retry = self.checkout()
+        self.assertEqual(retry.data['clientSecret'], first.data['clientSecret'])
+        self.assertEqual(len(TransactionCheckingGateway.calls), 1)
+
+    def test_order_without_payment_is_resumed(self):
+        # As if the process died between creating the order and the payment.
+        order = _create_order(self.user, 'order-1')
+        result = checkout(self.user, 'order-1')
+        self.assertEqual((result.order.pk, result.replayed), (order.pk, True))
+        self.assertEqual(result.payment.client_secret, result.client_secret)
+        self.assertFalse(CartItem.objects.exists())
+
+    @override_settings(PAYMENT_GATEWAY_OPTIONS={'failure_rate': 1, 'backoff': 0})
+    def test_gateway_failure_rolls_everything_back(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+
+class FakeGatewayTests(SimpleTestCase):
+    def test_sync_and_async_calls_agree(self):
+        gateway = FakeGateway(latency=0.001)
+        intent = gateway.create_payment_intent(1250, 'usd', 'key-1')
+        self.assertEqual(async_to_sync(gateway.acreate_payment_intent)(1250, 'usd', 'key-1'), intent)
+        self.assertNotEqual(gateway.create_payment_intent(1250, 'usd', 'key-2').id, intent.id)
+
+    def test_retries_transient_failures(self):
+        # With this seed the first two calls fail and the third succeeds.
+        gateway = FakeGateway(failure_rate=0.5, seed=7, backoff=0)
+        self.assertEqual(gateway.create_payment_intent(100, 'usd', 'key').status, 'requires_payment_method')
+
+        gateway = FakeGateway(failure_rate=1, max_retries=2, backoff=0)
+        with self.assertRaises(PaymentGatewayError) as raised:
+            async_to_sync(gateway.acreate_payment_intent)(100, 'usd', 'key')
+        self.assertTrue(raised.exception.retryable)
+
+
+@override_settings(PAYMENT_GATEWAY='payments.gateways.FakeGateway')
+class PaymentWebhookTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+        self.payment = Payment.objects.create(
+            order=self.order, payment_id='pi_1', amount=Decimal('10.00'), status='requires_payment_method',
+        )
+
+    def deliver(self, event_id, event_type, payment_id='pi_1', signature=None, **fields):
+        obj = dict(fields, id=payment_id)
+        body = json.dumps({'id': event_id, 'type': event_type, 'data': {'object': obj}}).encode()
+        return self.client.generic(
+            'POST', reverse('payment-webhook'), body, content_type='application/json',
+            HTTP_FAKE_SIGNATURE=signature or FakeGateway().sign(body),
+        )
+
+    def test_events_are_queued_then_applied_in_order_of_progress(self):
+        self.assertEqual(self.deliver('evt_1', 'payment_intent.succeeded').status_code, 200)
+        self.deliver('evt_1', 'payment_intent.succeeded')  # redelivery
+        self.deliver('evt_2', 'payment_intent.processing')  # late
+        self.deliver('evt_3', 'payment_intent.succeeded', payment_id='pi_unknown')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'requires_payment_method')
+        self.assertEqual(queue_metrics().pending, 3)
+
+        # Two batches of at most 5 queries plus their savepoints, then an empty poll.
+        with self.assertNumQueries(15):
+            self.assertEqual(process_pending_events(batch_size=2), 3)
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.order.status), ('succeeded', 'paid'))
+        # pi_unknown waits for its payment.
+        self.assertEqual(queue_metrics().pending, 1)
+
+        # Charge events name their payment intent.
+        self.deliver('evt_4', 'charge.refunded', payment_id='ch_1', payment_intent='pi_1')
+        self.assertEqual(process_pending_events(), 1)
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.order.status), ('refunded', 'refunded'))
+
+    def make_due(self):
+        # As if the retry delay had passed.
+        PaymentEvent.objects.filter(processed_at__isnull=True).update(retry_at=timezone.now())
+
+    def test_event_before_its_payment_is_applied_once_the_payment_exists(self):
+        self.deliver('evt_1', 'payment_intent.succeeded', payment_id='pi_2')
+        self.assertEqual(process_pending_events(), 1)
+        event = PaymentEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.retry_at, timezone.now())
+        self.assertEqual(process_pending_events(), 0)  # not due yet
+
+        order = Order.objects.create(user=self.user, total_amount=Decimal('10.00'))
+        payment = Payment.objects.create(
+            order=order, payment_id='pi_2', amount=Decimal('10.00'), status='requires_payment_method',
+        )
+        self.make_due()
+        self.assertEqual(process_pending_events(), 1)
+        payment.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((payment.status, order.status), ('succeeded', 'paid'))
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error, '')
+        self.assertEqual(queue_metrics().pending, 0)
+
+    def test_event_without_a_payment_is_dropped_after_the_deadline(self):
+        self.deliver('evt_1', 'payment_intent.succeeded', payment_id='pi_2')
+        process_pending_events()
+        PaymentEvent.objects.update(received_at=timezone.now() - UNMATCHED_DEADLINE - timedelta(seconds=1))
+        self.make_due()
+        self.assertEqual(process_pending_events(), 1)
+        event = PaymentEvent.objects.get()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error, 'No payment with this id.')
+        self.assertEqual(queue_metrics().pending, 0)
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.deliver('evt_1', 'payment_intent.succeeded', signature='forged').status_code, 400)
+        self.assertEqual(queue_metrics().pending, 0)
+
+    def test_metrics_are_admin_only(self):
+        self.deliver('evt_1', 'payment_intent.succeeded')
+        self.client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('payment-webhook-metrics'))
+        self.assertEqual(response.data['pending'], 1)
+        self.assertGreaterEqual(response.data['oldest_pending_age'], 0)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('payment-webhook-metrics')).status_code, 403)
@@ -1,9 +1,16 @@
 from django.urls import path
-from .views import CreatePaymentIntentView, CreateOrderView, CreateOrderItemView, CreatePaymentView
+from .views import (
+    CheckoutView, CreatePaymentIntentView, OrderExportView, OrderListCreateView, CreateOrderItemView, CreatePaymentView,
+    PaymentEventMetricsView, PaymentWebhookView,
+)
 
 urlpatterns = [
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('create-payment-intent/', CreatePaymentIntentView.as_view(), name='create-payment-intent'),
-    path('orders/', CreateOrderView.as_view(), name='create-order'),
+    path('orders/', OrderListCreateView.as_view(), name='order-list'),
+    path('orders/export/', OrderExportView.as_view(), name='order-export'),
     path('order-items/', CreateOrderItemView.as_view(), name='create-order-item'),
     path('payments/', CreatePaymentView.as_view(), name='create-payment'),
+    path('webhook/', PaymentWebhookView.as_view(), name='payment-webhook'),
+    path('webhook/metrics/', PaymentEventMetricsView.as_view(), name='payment-webhook-metrics'),
 ]
\ No newline at end of file
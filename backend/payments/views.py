@@ -1,41 +1,110 @@
-import stripe
+import uuid
+
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from django.conf import settings
+from django.db import transaction
+from api.streaming import StreamingListMixin
 from .models import Order, OrderItem, Payment
-from .serializers import OrderSerializer, OrderItemSerializer, PaymentSerializer
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from .checkout import CheckoutError, checkout
+from .events import ingest_event, queue_metrics
+from .gateways import PaymentGatewayError, WebhookVerificationError, get_gateway
+from .serializers import CheckoutSerializer, OrderSerializer, OrderItemCreateSerializer, PaymentSerializer
 
 class CreatePaymentIntentView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
         try:
-            amount = request.data['amount']  # Amount in cents
-            currency = request.data.get('currency', 'usd')
+            amount = int(request.data['amount'])  # Amount in cents
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'amount (in cents) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        currency = request.data.get('currency', 'usd')
+        idempotency_key = request.headers.get('Idempotency-Key') or uuid.uuid4().hex
 
-            intent = stripe.PaymentIntent.create(
-                amount=amount,
-                currency=currency,
-                automatic_payment_methods={'enabled': True},
-            )
-
-            return Response({'clientSecret': intent.client_secret}, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            intent = get_gateway().create_payment_intent(amount, currency, idempotency_key)
+        except PaymentGatewayError as e:
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response({'clientSecret': intent.client_secret}, status=status.HTTP_200_OK)
 
-class CreateOrderView(generics.CreateAPIView):
+class OrderListCreateView(generics.ListCreateAPIView):
+    # GET: the user's order history, POST: create an order
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return Order.objects.with_related().filter(user=self.request.user).order_by('-created_at', '-id')
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+class OrderExportView(StreamingListMixin, generics.ListAPIView):
+    # GET: the user's whole order history, streamed (api.streaming)
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+
 class CreateOrderItemView(generics.CreateAPIView):
-    serializer_class = OrderItemSerializer
+    serializer_class = OrderItemCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        item = serializer.save(price=serializer.validated_data['recipe'].price)
+        Order.objects.filter(pk=item.order_id).update_totals()
+
 class CreatePaymentView(generics.CreateAPIView):
     serializer_class = PaymentSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+class CheckoutView(generics.GenericAPIView):
+    # POST /api/payments/checkout/ -- cart -> order + payment intent, in one request
+    serializer_class = CheckoutSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        data = request.data.copy()
+        if 'idempotency_key' not in data and 'Idempotency-Key' in request.headers:
+            data['idempotency_key'] = request.headers['Idempotency-Key']
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            result = checkout(request.user, **serializer.validated_data)
+        except CheckoutError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PaymentGatewayError as e:
+            # No payment was recorded; retrying with the same key is safe.
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+
+        return Response({
+            'order': OrderSerializer(result.order).data,
+            'payment': PaymentSerializer(result.payment).data,
+            'clientSecret': result.client_secret,
+        }, status=status.HTTP_200_OK if result.replayed else status.HTTP_201_CREATED)
+
+
+class PaymentWebhookView(generics.GenericAPIView):
+    # POST /api/payments/webhook/ -- provider events; verified, queued, answered right away.
+    # The process_payment_events command applies them.
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            event = get_gateway().parse_event(request.body, request.headers)
+        except WebhookVerificationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(event, dict) or not event.get('id'):
+            return Response({'error': 'Not an event.'}, status=status.HTTP_400_BAD_REQUEST)
+        ingest_event(event)
+        return Response({'received': True}, status=status.HTTP_200_OK)
+
+class PaymentEventMetricsView(generics.GenericAPIView):
+    # GET /api/payments/webhook/metrics/ -- queue depth and processing lag
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(queue_metrics()._asdict())
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Recipe
+from .models import Recipe, StoredBlob
 
 admin.site.register(Recipe)
+admin.site.register(StoredBlob)
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import install_search_index
+
+        # (Re)create the search index and its triggers after every migrate.
+        post_migrate.connect(install_search_index, sender=self)
@@ -0,0 +1,187 @@
+# backend/recipes/fetch.py
+"""
+Downloads the images of recipes created with an image_url. The API only
+records the URL and sets image_status to 'pending'; fetch_recipe_image()
+then runs on the 'fetch' pool of recipes.tasks (see recipes.signals), so the
+request returns at once and a bulk import with hundreds of URLs downloads
+them side by side, RECIPE_TASK_POOLS['fetch'] at a time.
+
+Downloads share one pooled requests.Session, are streamed to a temporary
+file in chunks, stop at RECIPE_IMAGE_MAX_BYTES and are only accepted if the
+first bytes are those of a JPEG, PNG, GIF, WebP or AVIF file: whatever
+Content-Type the server claims is ignored. URLs that resolve to private or
+loopback addresses are refused (including after a redirect), so image_url
+can't be used to probe the internal network.
+
+Jobs are idempotent; manage.py fetch_recipe_images picks up the ones lost to
+a restart and retries failures.
+"""
+import ipaddress
+import logging
+import socket
+import tempfile
+import threading
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 3
+TIMEOUT = (3, 10)  # connect, read
+
+# (offset, magic bytes, extension)
+SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'jpg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (8, b'WEBP', 'webp'),  # after b'RIFF' and the chunk size
+    (4, b'ftypavif', 'avif'),
+    (4, b'ftypavis', 'avif'),
+)
+SNIFF_BYTES = 16
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def sniff_image_type(head):
+    """Extension for the first bytes of an image file, or None."""
+    for offset, magic, extension in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if extension == 'webp' and not head.startswith(b'RIFF'):
+                continue
+            return extension
+    return None
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = getattr(settings, 'RECIPE_TASK_POOLS', {}).get('fetch', 8)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session.headers['User-Agent'] = 'eternal-recipes-image-fetcher'
+    return _session
+
+
+def check_url(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ImageFetchError('Only http and https URLs are supported.')
+    if getattr(settings, 'RECIPE_IMAGE_ALLOW_PRIVATE_HOSTS', False):
+        return
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise ImageFetchError('Cannot resolve %s.' % parts.hostname) from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split('%')[0])
+        if not ip.is_global:
+            raise ImageFetchError('%s is not a public address.' % parts.hostname)
+
+
+def _open(url):
+    # Redirects are followed by hand so every hop goes through check_url().
+    for _ in range(MAX_REDIRECTS + 1):
+        check_url(url)
+        response = get_session().get(url, stream=True, timeout=TIMEOUT, allow_redirects=False)
+        if not response.is_redirect:
+            response.raise_for_status()
+            return response
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+    raise ImageFetchError('Too many redirects.')
+
+
+def download_image(url, max_bytes=None):
+    """
+    Stream the image at ``url`` into a temporary file. Returns (file,
+    extension); the caller closes the file. Raises ImageFetchError or
+    requests.RequestException.
+    """
+    max_bytes = max_bytes or settings.RECIPE_IMAGE_MAX_BYTES
+    with _open(url) as response:
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ImageFetchError('Image is larger than %d bytes.' % max_bytes)
+
+        file = tempfile.TemporaryFile()
+        try:
+            head = b''
+            size = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageFetchError('Image is larger than %d bytes.' % max_bytes)
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                file.write(chunk)
+            extension = sniff_image_type(head)
+            if extension is None:
+                raise ImageFetchError('Not a JPEG, PNG, GIF, WebP or AVIF image.')
+        except BaseException:
+            file.close()
+            raise
+    file.seek(0)
+    return file, extension
+
+
+def _finish(recipe_id, url, **fields):
+    # Saved (not update()d) so the usual post_save work happens: derivatives
+    # get queued and the response caches invalidated. Nothing is written if
+    # the recipe was given another image meanwhile.
+    from .models import Recipe
+
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image_source_url=url, image_status=Recipe.IMAGE_PENDING,
+        ).first()
+        if recipe is None:
+            return False
+        for field, value in fields.items():
+            setattr(recipe, field, value)
+        recipe.save(update_fields=list(fields) + ['updated_at'])
+    return True
+
+
+def fetch_recipe_image(recipe_id):
+    """
+    Download a pending recipe's image_source_url into Recipe.image. Returns
+    True if the image was stored.
+    """
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id, image_status=Recipe.IMAGE_PENDING).first()
+    if recipe is None:
+        return False
+    url = recipe.image_source_url
+
+    try:
+        file, extension = download_image(url)
+    except (ImageFetchError, requests.RequestException) as e:
+        logger.warning('Could not fetch image for recipe %s from %s: %s', recipe_id, url, e)
+        _finish(recipe_id, url, image_status=Recipe.IMAGE_FAILED)
+        return False
+
+    field = Recipe._meta.get_field('image')
+    with file:
+        name = field.generate_filename(recipe, 'recipe-%d.%s' % (recipe.pk, extension))
+        name = field.storage.save(name, File(file), max_length=field.max_length)
+    if not _finish(recipe_id, url, image=name, image_status=Recipe.IMAGE_READY):
+        field.storage.delete(name)
+        return False
+    return True
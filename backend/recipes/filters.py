@@ -0,0 +1,78 @@
+# backend/recipes/filters.py
+from rest_framework import filters, serializers
+from categories.models import Category
+from .ingredients import normalize_name
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    # Validates the catalogue query string; bad values come back as a normal 400.
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    min_price = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0, required=False)
+    max_price = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0, required=False)
+    max_prep_time = serializers.IntegerField(min_value=0, required=False)
+    max_cook_time = serializers.IntegerField(min_value=0, required=False)
+    min_servings = serializers.IntegerField(min_value=0, required=False)
+    max_servings = serializers.IntegerField(min_value=0, required=False)
+
+    # query parameter -> ORM lookup
+    lookups = {
+        'category': 'category',
+        'min_price': 'price__gte',
+        'max_price': 'price__lte',
+        'max_prep_time': 'prep_time__lte',
+        'max_cook_time': 'cook_time__lte',
+        'min_servings': 'servings__gte',
+        'max_servings': 'servings__lte',
+    }
+
+
+class RecipeSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    page = serializers.IntegerField(min_value=1, max_value=50, default=1)
+    page_size = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class CookWithQuerySerializer(serializers.Serializer):
+    # ?ingredients=eggs,Tomatoes,soy sauce&min_coverage=0.5
+    ingredients = serializers.CharField(max_length=1000)
+    min_coverage = serializers.FloatField(min_value=0, max_value=1, required=False)
+
+    def validate_ingredients(self, value):
+        names = sorted({normalize_name(part) for part in value.split(',')} - {''})
+        if not names:
+            raise serializers.ValidationError('List at least one ingredient.')
+        return names
+
+
+class RecipeFilterBackend(filters.BaseFilterBackend):
+    """
+    Server-side catalogue filters, e.g. ?category=3&min_price=5&max_cook_time=30
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = {
+            name: value for name, value in request.query_params.items()
+            if name in RecipeFilterSerializer.lookups and value != ''
+        }
+        if not params:
+            return queryset
+
+        serializer = RecipeFilterSerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+        return queryset.filter(**{
+            RecipeFilterSerializer.lookups[name]: value
+            for name, value in serializer.validated_data.items()
+        })
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """
+    ?ordering=price / ?ordering=-price, always followed by the primary key so the
+    keyset cursor has a unique tie-breaker. Only the first requested field is used.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        field = ordering[0]
+        tie_breaker = '-id' if field.startswith('-') else 'id'
+        return (field, tie_breaker)
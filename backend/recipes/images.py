@@ -0,0 +1,141 @@
+# backend/recipes/images.py
+"""
+Responsive derivatives of Recipe.image: every width in DERIVATIVE_WIDTHS
+(never upscaled) in every format in DERIVATIVE_FORMATS, stored next to the
+originals as
+
+    recipe_images/derivatives/<content hash>-<width>.<format>
+
+Names come from the original's content, so re-processing the same image is a
+no-op and identical uploads share their derivatives. They are already unique
+per content, so they go to the default storage rather than the
+content-addressed one of Recipe.image (recipes.storage). What exists is recorded
+in Recipe.image_derivatives:
+
+    {'source': 'recipe_images/pie.jpg', 'hash': '3f2a...',
+     'variants': {'webp': {'320': 'recipe_images/derivatives/3f2a...-320.webp', ...}, ...}}
+
+generate_derivatives() runs on the recipes.tasks pool after a save (see
+recipes.signals) and from the generate_image_derivatives command.
+"""
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+DERIVATIVE_DIR = 'recipe_images/derivatives'
+
+# format -> (Pillow format name, save options). AVIF comes first as it is
+# usually the smaller file; it needs a Pillow built with libavif.
+DERIVATIVE_FORMATS = {
+    'avif': ('AVIF', {'quality': 55}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+if not features.check('avif'):
+    del DERIVATIVE_FORMATS['avif']
+
+HASH_LENGTH = 20
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def derivative_name(digest, width, fmt):
+    return '%s/%s-%d.%s' % (DERIVATIVE_DIR, digest, width, fmt)
+
+
+def target_widths(original_width):
+    # Every standard width below the original, and the original itself
+    # (capped at the largest standard width) so the biggest variant is never
+    # smaller than needed. Past the largest standard width that is the same
+    # width twice, hence the set.
+    widths = {width for width in DERIVATIVE_WIDTHS if width < original_width}
+    widths.add(min(original_width, DERIVATIVE_WIDTHS[-1]))
+    return sorted(widths)
+
+
+def render_derivatives(field):
+    """Write the derivatives of an ImageField's file; returns image_derivatives."""
+    storage = default_storage
+    with field.open('rb') as file:
+        digest = content_hash(file)
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            variants = {fmt: {} for fmt in DERIVATIVE_FORMATS}
+            for width in target_widths(image.width):
+                resized = None
+                for fmt, (pillow_format, options) in DERIVATIVE_FORMATS.items():
+                    name = derivative_name(digest, width, fmt)
+                    if not storage.exists(name):
+                        if resized is None:
+                            height = max(1, round(image.height * width / image.width))
+                            resized = image.resize((width, height), Image.LANCZOS)
+                        buffer = BytesIO()
+                        resized.save(buffer, pillow_format, **options)
+                        # Same content, same name: a concurrent worker may have
+                        # written it meanwhile, which is fine.
+                        if not storage.exists(name):
+                            storage.save(name, ContentFile(buffer.getvalue()))
+                    variants[fmt][str(width)] = name
+
+    return {'source': field.name, 'hash': digest, 'variants': variants}
+
+
+def generate_derivatives(recipe_id, force=False):
+    """
+    Bring a recipe's derivatives in line with its current image. Safe to run
+    any number of times. Returns True if it wrote anything.
+    """
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None:
+        return False
+    if not recipe.image:
+        if not recipe.image_derivatives:
+            return False
+        derivatives = {}
+    elif not force and recipe.image_derivatives.get('source') == recipe.image.name:
+        return False
+    else:
+        derivatives = render_derivatives(recipe.image)
+
+    # Skip the write if the image was replaced while we worked; the save that
+    # replaced it queued its own job.
+    current = Recipe.objects.filter(pk=recipe_id).values_list('image', flat=True).first()
+    if (current or '') != (recipe.image.name or ''):
+        return False
+    recipe.image_derivatives = derivatives
+    recipe.save(update_fields=['image_derivatives', 'updated_at'])
+    return True
+
+
+def derivative_urls(recipe, build_url=None):
+    """{'webp': {'320': url, ...}, ...} for a recipe, or {} without derivatives."""
+    return variant_urls(recipe.image_derivatives, build_url)
+
+
+def variant_urls(derivatives, build_url=None):
+    # derivative_urls() from the image_derivatives value alone.
+    build_url = build_url or (lambda url: url)
+    return {
+        fmt: {width: build_url(default_storage.url(name)) for width, name in widths.items()}
+        for fmt, widths in derivatives.get('variants', {}).items()
+    }
+
+
+def srcset(urls):
+    """'url 320w, url 640w' for one format of derivative_urls()."""
+    return ', '.join('%s %sw' % (url, width) for width, url in sorted(urls.items(), key=lambda item: int(item[0])))
@@ -0,0 +1,191 @@
+# backend/recipes/ingredients.py
+"""
+Turns the free-text Recipe.ingredients field into RecipeIngredient rows
+(normalized name, quantity, unit) and answers "what can I cook with these"
+queries against them.
+
+    >>> parse_ingredient('1 1/2 cups all-purpose flour, sifted')
+    ParsedIngredient(name='flour', quantity=Decimal('1.500'), unit='cup', raw='1 1/2 cups all-purpose flour, sifted')
+"""
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, FloatField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Cast
+
+ParsedIngredient = namedtuple('ParsedIngredient', ['name', 'quantity', 'unit', 'raw'])
+
+UNICODE_FRACTIONS = {
+    '¼': '1/4', '½': '1/2', '¾': '3/4', '⅓': '1/3', '⅔': '2/3',
+    '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+
+# alias -> canonical unit
+UNITS = {}
+for _unit, _aliases in {
+    'cup': ['cup', 'cups', 'c'],
+    'tbsp': ['tbsp', 'tbsps', 'tablespoon', 'tablespoons', 'tbs', 'T'],
+    'tsp': ['tsp', 'tsps', 'teaspoon', 'teaspoons', 't'],
+    'g': ['g', 'gram', 'grams', 'gr'],
+    'kg': ['kg', 'kilogram', 'kilograms', 'kilo', 'kilos'],
+    'mg': ['mg', 'milligram', 'milligrams'],
+    'ml': ['ml', 'milliliter', 'milliliters', 'millilitre', 'millilitres'],
+    'l': ['l', 'liter', 'liters', 'litre', 'litres'],
+    'oz': ['oz', 'ounce', 'ounces'],
+    'lb': ['lb', 'lbs', 'pound', 'pounds'],
+    'pinch': ['pinch', 'pinches'],
+    'dash': ['dash', 'dashes'],
+    'clove': ['clove', 'cloves'],
+    'can': ['can', 'cans'],
+    'slice': ['slice', 'slices'],
+    'piece': ['piece', 'pieces', 'pc', 'pcs'],
+    'bunch': ['bunch', 'bunches'],
+    'sprig': ['sprig', 'sprigs'],
+    'stalk': ['stalk', 'stalks'],
+    'package': ['package', 'packages', 'pack', 'packs', 'pkg'],
+}.items():
+    for _alias in _aliases:
+        UNITS[_alias] = _unit
+
+# Words describing preparation, size or grade rather than the ingredient itself,
+# so that "2 large ripe tomatoes, diced" and "tomato" land on the same name.
+DESCRIPTORS = {
+    'chopped', 'diced', 'minced', 'sliced', 'grated', 'crushed', 'shredded', 'peeled',
+    'fresh', 'freshly', 'dried', 'large', 'medium', 'small', 'finely', 'roughly',
+    'thinly', 'ground', 'whole', 'boneless', 'skinless', 'softened', 'melted',
+    'cubed', 'halved', 'quartered', 'beaten', 'optional', 'about', 'to', 'taste',
+    'all-purpose', 'extra-virgin', 'virgin', 'unsalted', 'salted', 'ripe', 'raw',
+    'cooked', 'frozen', 'canned', 'organic', 'lean', 'extra',
+    'of', 'a', 'an', 'some',
+}
+
+_QUANTITY_RE = re.compile(
+    r'^(?P<quantity>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)'  # 1 1/2, 1/2, 1.5
+    r'(?:\s*(?:-|–|to)\s*[\d./]+)?'                          # ranges: keep the low end
+    r'\s*'
+)
+_BULLET_RE = re.compile(r'^\s*(?:[-*•·]|\d+[.)](?=\s))\s*')
+_PARENTHESES_RE = re.compile(r'\([^)]*\)')
+_WORD_RE = re.compile(r"[a-z][a-z'-]*")
+
+
+def split_lines(text):
+    return [line for line in re.split(r'[\n;]+', text or '') if line.strip()]
+
+
+def _to_decimal(token):
+    try:
+        if ' ' in token:
+            whole, fraction = token.split()
+            return Decimal(whole) + _to_decimal(fraction)
+        if '/' in token:
+            numerator, denominator = token.split('/')
+            return (Decimal(numerator) / Decimal(denominator)).quantize(Decimal('0.001'))
+        return Decimal(token)
+    except (InvalidOperation, ZeroDivisionError, ValueError):
+        return None
+
+
+def singularize(word):
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('oes') or re.search(r'(ch|sh|x)es$', word):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize_name(text):
+    """'Cherry Tomatoes (chopped)' -> 'cherry tomato'. Used for rows and queries alike."""
+    text = _PARENTHESES_RE.sub(' ', text.lower()).split(',')[0]
+    words = [word for word in _WORD_RE.findall(text) if word not in DESCRIPTORS]
+    if not words:
+        return ''
+    words[-1] = singularize(words[-1])
+    return ' '.join(words)[:100]
+
+
+def parse_ingredient(line):
+    raw = line.strip()
+    text = _BULLET_RE.sub('', raw)
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        text = re.sub(r'(\d)' + symbol, r'\1 ' + fraction, text).replace(symbol, fraction)
+
+    quantity = None
+    match = _QUANTITY_RE.match(text)
+    if match:
+        quantity = _to_decimal(match.group('quantity'))
+        text = text[match.end():]
+
+    text = re.sub(r'^(?:a|an)\s+', '', text.strip(), flags=re.IGNORECASE)
+    first, _, rest = text.partition(' ')
+    token = first.rstrip('.')
+    # Single letters are case sensitive: T is a tablespoon, t a teaspoon.
+    unit = UNITS.get(token) or (UNITS.get(token.lower(), '') if len(token) > 1 else '')
+    if unit:
+        text = rest
+
+    return ParsedIngredient(normalize_name(text), quantity, unit, raw[:255])
+
+
+def parse_ingredients(text):
+    return [parsed for parsed in map(parse_ingredient, split_lines(text)) if parsed.name]
+
+
+def index_recipes(recipes):
+    """
+    Replace the RecipeIngredient rows for ``recipes``, an iterable of
+    (recipe_id, ingredients_text) pairs: one DELETE and one bulk INSERT.
+    """
+    from .models import RecipeIngredient
+
+    recipes = list(recipes)
+    rows = [
+        RecipeIngredient(
+            recipe_id=recipe_id, position=position,
+            name=parsed.name, quantity=parsed.quantity, unit=parsed.unit, raw=parsed.raw,
+        )
+        for recipe_id, text in recipes
+        for position, parsed in enumerate(parse_ingredients(text))
+    ]
+    RecipeIngredient.objects.filter(recipe_id__in=[recipe_id for recipe_id, _ in recipes]).delete()
+    RecipeIngredient.objects.bulk_create(rows)
+    return len(rows)
+
+
+def recipes_cookable_with(names):
+    """
+    Recipes using any of ``names`` (already normalized), annotated with
+    matched_ingredients, total_ingredients and coverage (matched / total),
+    best coverage first. The matching and counting happen in the database,
+    driven by the (name, recipe) index.
+    """
+    from .models import Recipe, RecipeIngredient
+
+    total = (
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .order_by().values('recipe')
+        .annotate(total=Count('name', distinct=True))
+        .values('total')
+    )
+    return (
+        Recipe.objects.with_related()
+        .filter(ingredient_rows__name__in=names)
+        .annotate(
+            matched_ingredients=Count('ingredient_rows__name', distinct=True),
+            total_ingredients=Subquery(total),
+        )
+        .annotate(
+            coverage=Cast('matched_ingredients', FloatField()) / Cast('total_ingredients', FloatField())
+        )
+        .prefetch_related(Prefetch(
+            'ingredient_rows',
+            queryset=RecipeIngredient.objects.exclude(name__in=names).order_by('position'),
+            to_attr='missing_ingredient_rows',
+        ))
+        .order_by('-coverage', '-matched_ingredients', '-id')
+    )
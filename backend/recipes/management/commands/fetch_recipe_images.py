@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.fetch import fetch_recipe_image
+from recipes.models import Recipe
+
+
+def _fetch(recipe_id):
+    try:
+        return fetch_recipe_image(recipe_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Download the images of recipes created with an image_url that are still pending, "
+        "e.g. because the server restarted before the background job ran."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Images downloaded in parallel (default: 8).',
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry downloads that failed.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(image_status=Recipe.IMAGE_PENDING)
+        if options['retry_failed']:
+            Recipe.objects.filter(image_status=Recipe.IMAGE_FAILED).update(image_status=Recipe.IMAGE_PENDING)
+        pending = list(recipes.order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(f"{len(pending)} recipe images to fetch with {options['workers']} workers.")
+
+        fetched = 0
+        if options['workers'] <= 1:
+            for pk in pending:
+                fetched += fetch_recipe_image(pk)
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                futures = [executor.submit(_fetch, pk) for pk in pending]
+                for future in as_completed(futures):
+                    fetched += future.result()
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {fetched} fetched, {len(pending) - fetched} failed."))
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.images import generate_derivatives
+from recipes.models import Recipe
+
+
+def _generate(recipe_id, force):
+    try:
+        return generate_derivatives(recipe_id, force=force)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the resized WebP/AVIF derivatives of recipe images. By default only images "
+        "whose derivatives are missing or stale are processed, so the command can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Images processed in parallel (default: 4). Pillow releases the GIL while resizing and encoding.',
+        )
+        parser.add_argument('--force', action='store_true', help='Regenerate every derivative.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        pending = [
+            pk for pk, image, derivatives in recipes.values_list('pk', 'image', 'image_derivatives').iterator()
+            if options['force'] or derivatives.get('source') != image
+        ]
+        self.stdout.write(f"{len(pending)} recipe images to process with {options['workers']} workers.")
+
+        generated = failed = 0
+        if options['workers'] <= 1:
+            for pk in pending:
+                try:
+                    generated += generate_derivatives(pk, force=options['force'])
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Recipe {pk}: {e}")
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                futures = {executor.submit(_generate, pk, options['force']): pk for pk in pending}
+                for future in as_completed(futures):
+                    try:
+                        generated += future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"Recipe {futures[future]}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {generated} recipes updated, {failed} failed."))
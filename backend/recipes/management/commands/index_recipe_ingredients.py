@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from recipes.ingredients import index_recipes
+from recipes.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        "Parse Recipe.ingredients into RecipeIngredient rows in batches. By default only "
+        "recipes without rows are indexed, so an interrupted run picks up where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Recipes per transaction (default: 500).')
+        parser.add_argument('--all', action='store_true', help='Re-parse every recipe, not only unindexed ones.')
+        parser.add_argument(
+            '--start-after', type=int, default=0, metavar='ID',
+            help='Skip recipes with an id up to ID; use the last id printed to resume an --all run.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Recipe.objects.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(~Exists(RecipeIngredient.objects.filter(recipe=OuterRef('pk'))))
+
+        last_id = options['start_after']
+        recipes = rows = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).values_list('pk', 'ingredients')[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                rows += index_recipes(batch)
+            recipes += len(batch)
+            last_id = batch[-1][0]
+            self.stdout.write(f"Indexed {recipes} recipes, up to id {last_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {recipes} recipes, {rows} ingredient rows."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Re-index every recipe in the full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to re-index.')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.install(options['database'])
+        backend.rebuild(options['database'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the {type(backend).__name__} search index."))
@@ -0,0 +1,135 @@
+# backend/recipes/media.py
+"""
+Serves MEDIA_ROOT, replacing django.conf.urls.static.static() (which reads
+whole files into memory and knows nothing about ranges):
+
+* full responses are FileResponses, which the WSGI server can send with
+  sendfile() (wsgi.file_wrapper) without copying through Python;
+* a single "Range: bytes=..." is answered with 206 Partial Content;
+* content-addressed names (recipes.storage, recipes.images) never change,
+  so they are cached for a year as immutable; other files revalidate with
+  Last-Modified.
+
+With MEDIA_ACCEL_REDIRECT set (e.g. '/protected-media/') no file is opened
+here: the response only carries an X-Accel-Redirect header telling the front
+proxy (nginx, or X-Sendfile aware servers) which internal location to serve.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MUTABLE_MAX_AGE = 60 * 60
+
+# <sha256>.<ext> from ContentAddressedStorage, <hash>-<width>.<ext> from
+# recipes.images.
+IMMUTABLE_NAME = re.compile(r'^[0-9a-f]{20,64}(-\d+)?\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_immutable(path):
+    return bool(IMMUTABLE_NAME.match(os.path.basename(path)))
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single byte range, None for no usable range."""
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # "bytes=-500": the last 500 bytes
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError('Unsatisfiable range.')
+    return start, end
+
+
+def _read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _cache_headers(response, path, mtime=None):
+    if is_immutable(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MUTABLE_MAX_AGE)
+    if mtime is not None:
+        response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    # Nothing outside MEDIA_ROOT, and nothing hidden (like the storage's
+    # .incoming directory).
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT', '')
+    if accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(path)
+        return _cache_headers(response, path)
+
+    try:
+        st = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if since is not None and int(st.st_mtime) <= since:
+        return _cache_headers(HttpResponseNotModified(), path, st.st_mtime)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (if_range is None or if_range == http_date(st.st_mtime)):
+        try:
+            byte_range = parse_range(request.headers['Range'], st.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % st.st_size
+            return _cache_headers(response, path, st.st_mtime)
+
+    if byte_range is None:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(open(fullpath, 'rb'), start, length), status=206, content_type=content_type,
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, st.st_size)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return _cache_headers(response, path, st.st_mtime)
@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    from reviews.ratings import rebuild_ratings
+
+    rebuild_ratings(apps.get_model('recipes', 'Recipe'), apps.get_model('reviews', 'Review'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_catalogue_indexes'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, help_text='Number of 1 star reviews'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, help_text='Number of 2 star reviews'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, help_text='Number of 3 star reviews'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, help_text='Number of 4 star reviews'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, help_text='Number of 5 star reviews'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-rating_avg', '-id'], name='recipe_rating_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
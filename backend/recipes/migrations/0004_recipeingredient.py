@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 11:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(help_text="Normalized name, e.g. 'tomato'", max_length=100)),
+                ('quantity', models.DecimalField(blank=True, decimal_places=3, max_digits=8, null=True)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('raw', models.CharField(help_text='The line as written in the recipe', max_length=255)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_rows', to='recipes.recipe')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['name', 'recipe'], name='ingredient_name_recipe_idx'),
+        ),
+    ]
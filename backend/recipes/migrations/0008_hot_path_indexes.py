@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', '-rating_avg', '-id'], name='recipe_category_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', 'updated_at'], name='recipe_validators_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 12:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_validators_idx',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_drop_validators_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['prep_time', 'id'], name='recipe_prep_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', 'prep_time', 'id'], name='recipe_category_prep_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cook_time', 'id'], name='recipe_cook_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', 'cook_time', 'id'], name='recipe_category_cook_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-rating_count', '-id'], name='recipe_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['category', '-rating_count', '-id'], name='recipe_category_reviews_idx'),
+        ),
+    ]
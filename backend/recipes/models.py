@@ -1,8 +1,55 @@
 # backend/recipes/models.py
 from django.db import models
 from categories.models import Category # Assuming you link to categories
+from .storage import image_storage
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        # Everything RecipeSerializer reads: the nested category.
+        return self.select_related('category')
+
+    def validators(self):
+        # What the serialized recipes depend on, for conditional GETs: an edit to
+        # a recipe or its category moves a max, an add/delete/uncategorize a count.
+        return self.order_by().aggregate(**self._validator_aggregates())
+
+    async def avalidators(self):
+        return await self.order_by().aaggregate(**self._validator_aggregates())
+
+    def page_validators(self):
+        # The same for one page of a list: only the page's own rows are read,
+        # however many recipes the filter matches.
+        return self._page_validators(list(self.values_list('id', 'updated_at', 'category__updated_at')))
+
+    async def apage_validators(self):
+        return self._page_validators([row async for row in self.values_list('id', 'updated_at', 'category__updated_at')])
+
+    def _page_validators(self, rows):
+        return {
+            'rows': ' '.join('%s:%s:%s' % row for row in rows),
+            'last_modified': max((updated_at for _, updated_at, _ in rows), default=None),
+        }
+
+    def _validator_aggregates(self):
+        return {
+            'last_modified': models.Max('updated_at'),
+            'category_modified': models.Max('category__updated_at'),
+            'count': models.Count('id'),
+            'categorized': models.Count('category'),
+        }
+
 
 class Recipe(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     title = models.CharField(max_length=255)
     description = models.TextField()
     instructions = models.TextField()
@@ -15,9 +62,80 @@ class Recipe(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     # ⭐ ADD THIS FIELD ⭐
-    image = models.ImageField(upload_to='recipe_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='recipe_images/', storage=image_storage, blank=True, null=True)
+    # Resized WebP/AVIF copies of image, written by recipes.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # Set when the image is given as a URL: recipes.fetch downloads it in the
+    # background. Empty for uploaded images.
+    image_source_url = models.URLField(max_length=500, blank=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True)
+
+    # Denormalized review aggregates, maintained by reviews.ratings
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0, help_text="Number of 1 star reviews")
+    rating_2 = models.PositiveIntegerField(default=0, help_text="Number of 2 star reviews")
+    rating_3 = models.PositiveIntegerField(default=0, help_text="Number of 3 star reviews")
+    rating_4 = models.PositiveIntegerField(default=0, help_text="Number of 4 star reviews")
+    rating_5 = models.PositiveIntegerField(default=0, help_text="Number of 5 star reviews")
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        # Composite indexes for the keyset-paginated catalogue: each one matches a
+        # (filter, sort field, id) ordering used by RecipeCursorPagination.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='recipe_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='recipe_category_created_idx'),
+            models.Index(fields=['price', 'id'], name='recipe_price_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='recipe_category_price_idx'),
+            models.Index(fields=['-rating_avg', '-id'], name='recipe_rating_idx'),
+            models.Index(fields=['category', '-rating_avg', '-id'], name='recipe_category_rating_idx'),
+            models.Index(fields=['prep_time', 'id'], name='recipe_prep_time_idx'),
+            models.Index(fields=['category', 'prep_time', 'id'], name='recipe_category_prep_time_idx'),
+            models.Index(fields=['cook_time', 'id'], name='recipe_cook_time_idx'),
+            models.Index(fields=['category', 'cook_time', 'id'], name='recipe_category_cook_time_idx'),
+            models.Index(fields=['-rating_count', '-id'], name='recipe_reviews_idx'),
+            models.Index(fields=['category', '-rating_count', '-id'], name='recipe_category_reviews_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
-    # You might also have a method to calculate average rating or similar
\ No newline at end of file
+    @property
+    def rating_histogram(self):
+        return {stars: getattr(self, 'rating_%d' % stars) for stars in range(1, 6)}
+
+
+class RecipeIngredient(models.Model):
+    # One parsed line of Recipe.ingredients; rebuilt by recipes.ingredients.index_recipes
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredient_rows')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=100, help_text="Normalized name, e.g. 'tomato'")
+    quantity = models.DecimalField(max_digits=8, decimal_places=3, null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    raw = models.CharField(max_length=255, help_text="The line as written in the recipe")
+
+    class Meta:
+        indexes = [
+            # "Which recipes use any of these ingredients", grouped per recipe,
+            # is answered from this index alone.
+            models.Index(fields=['name', 'recipe'], name='ingredient_name_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return self.raw
+
+
+class StoredBlob(models.Model):
+    # One file of recipes.storage.ContentAddressedStorage and how many
+    # references to it exist.
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,154 @@
+# backend/recipes/pagination.py
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination on a composite (sort field, primary key) keyset.
+
+    DRF's CursorPagination only keeps the first ordering field in the cursor and
+    falls back to an OFFSET for rows sharing the same value. Here the cursor holds
+    both the sort value and the primary key, so every page is a single index range
+    scan, no matter how deep it is, and rows with equal sort values never get
+    skipped or repeated.
+
+    The ordering must be a pair like ('-created_at', '-id') where both fields
+    sort in the same direction and the last one is unique.
+    """
+    position_separator = '|'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        assert len(ordering) == 2, (
+            'KeysetCursorPagination expects an ordering of exactly two fields, '
+            'a sort field followed by a unique tie-breaker, got {ordering!r}.'.format(
+                ordering=ordering
+            )
+        )
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Mirrors CursorPagination.paginate_queryset, except that the position
+        # filter uses both ordering fields instead of the first one plus an offset.
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # For async views: the same, with the page fetched by the async ORM.
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([obj async for obj in queryset])
+
+    def page_queryset(self, queryset, request, view):
+        # The queryset for the requested page plus one row, not evaluated; views
+        # also read it for their page's validators (RecipeListView).
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (reverse, current_position) = (False, None)
+        else:
+            (_, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*[self._invert(item) for item in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._position_filter(current_position, self.cursor.reverse))
+
+        self.reverse, self.current_position = reverse, current_position
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse, current_position = self.reverse, self.current_position
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _position_filter(self, position, cursor_reversed):
+        value, separator, key = position.rpartition(self.position_separator)
+        if not separator:
+            raise NotFound(self.invalid_cursor_message)
+
+        sort_field, key_field = (item.lstrip('-') for item in self.ordering)
+        # Test for: (cursor reversed) XOR (queryset reversed)
+        if cursor_reversed != self.ordering[0].startswith('-'):
+            value_lookup, key_lookup = '__lte', '__gte'
+        else:
+            value_lookup, key_lookup = '__gte', '__lte'
+
+        # Written as "value <= p AND NOT (value = p AND key >= k)" rather than an
+        # OR of two ranges, so the database can use a plain range scan on the
+        # composite index and only re-checks the key for ties.
+        return (
+            Q(**{sort_field + value_lookup: value}) &
+            ~Q(**{sort_field: value, key_field + key_lookup: key})
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        key_field = ordering[-1].lstrip('-')
+        if isinstance(instance, dict):
+            key = instance[key_field]
+        else:
+            key = getattr(instance, key_field)
+        value = super()._get_position_from_instance(instance, ordering)
+        return '{value}{separator}{key}'.format(
+            value=value, separator=self.position_separator, key=key
+        )
+
+    @staticmethod
+    def _invert(item):
+        return item[1:] if item.startswith('-') else '-' + item
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    # Newest recipes first; matches the ('-created_at', '-id') index on Recipe.
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RecipeMatchPagination(LimitOffsetPagination):
+    # Coverage-ranked results can't be keyset paginated on a stored column.
+    default_limit = 20
+    max_limit = 100
@@ -0,0 +1,185 @@
+# backend/recipes/search.py
+"""
+Full-text recipe search.
+
+The backend is picked from settings.RECIPE_SEARCH_BACKEND (a dotted path) or,
+when that is unset, from the database vendor: SQLite gets an FTS5 index, every
+other database falls back to a LIKE scan until it gets a proper backend
+(e.g. one built on django.contrib.postgres.search).
+
+A backend implements install(), rebuild() and search().
+"""
+import html
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from django.utils.text import Truncator
+
+SearchHit = namedtuple('SearchHit', ['recipe_id', 'rank', 'snippet'])
+
+# Longest query we bother tokenizing; keeps pathological queries cheap.
+MAX_QUERY_TERMS = 10
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())[:MAX_QUERY_TERMS]
+
+
+class BaseSearchBackend:
+    def install(self, using='default'):
+        """Create whatever the index needs. Must be safe to call repeatedly."""
+
+    def rebuild(self, using='default'):
+        """Re-index every recipe from scratch."""
+
+    def search(self, query, limit, offset=0):
+        """Return up to ``limit`` SearchHits, best match first."""
+        raise NotImplementedError('search() must be implemented.')
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    An external-content FTS5 table over recipes_recipe, kept in sync by
+    triggers, so saves, deletes, bulk_create and queryset.update() are all
+    indexed without any Python code running.
+
+    Django rebuilds the whole table (dropping its triggers) for many SQLite
+    schema changes, so install() runs after every migrate and recreates
+    whatever is missing.
+    """
+    table = 'recipes_recipe_fts'
+    columns = ('title', 'description', 'ingredients')
+    # bm25 weights per column: a hit in the title counts most.
+    weights = (10.0, 3.0, 1.0)
+    snippet_tokens = 12
+    # Sentinels put around matches by snippet(); swapped for <mark> after escaping.
+    _open, _close = '\x02', '\x03'
+
+    def _triggers(self):
+        columns = ', '.join(self.columns)
+        new = ', '.join('new.%s' % column for column in self.columns)
+        old = ', '.join('old.%s' % column for column in self.columns)
+        insert = f"INSERT INTO {self.table}(rowid, {columns}) VALUES (new.id, {new});"
+        delete = (
+            f"INSERT INTO {self.table}({self.table}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old});"
+        )
+        return [
+            f"CREATE TRIGGER IF NOT EXISTS {self.table}_ai AFTER INSERT ON recipes_recipe "
+            f"BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {self.table}_ad AFTER DELETE ON recipes_recipe "
+            f"BEGIN {delete} END",
+            # Only re-index when an indexed column changes, not on rating updates.
+            f"CREATE TRIGGER IF NOT EXISTS {self.table}_au AFTER UPDATE OF {columns} ON recipes_recipe "
+            f"BEGIN {delete} {insert} END",
+        ]
+
+    def install(self, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table]
+            )
+            created = cursor.fetchone() is None
+            if created:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                    f"{', '.join(self.columns)}, content='recipes_recipe', content_rowid='id', "
+                    f"tokenize='porter unicode61 remove_diacritics 2')"
+                )
+                # Make ORDER BY rank use our column weights.
+                cursor.execute(
+                    f"INSERT INTO {self.table}({self.table}, rank) VALUES ('rank', %s)",
+                    ['bm25(%s)' % ', '.join(str(weight) for weight in self.weights)],
+                )
+            for trigger in self._triggers():
+                cursor.execute(trigger)
+        if created:
+            self.rebuild(using)
+
+    def rebuild(self, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+
+    def match_expression(self, query):
+        # Every term must match; the last-typed term also matches as a prefix.
+        terms = ['"%s"' % term.replace('"', '""') for term in tokenize(query)]
+        if not terms:
+            return None
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, query, limit, offset=0):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, rank, snippet({self.table}, -1, %s, %s, %s, %s) "
+                f"FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY rank LIMIT %s OFFSET %s",
+                [self._open, self._close, '…', self.snippet_tokens, expression, limit, offset],
+            )
+            rows = cursor.fetchall()
+        # bm25 is "lower is better"; flip it so clients see a positive score.
+        return [SearchHit(rowid, -rank, self._highlight(snippet)) for rowid, rank, snippet in rows]
+
+    def _highlight(self, snippet):
+        return (
+            html.escape(snippet)
+            .replace(self._open, '<mark>')
+            .replace(self._close, '</mark>')
+        )
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Portable fallback: a LIKE scan over the same columns, newest first.
+    Fine for development databases, not for a large catalogue.
+    """
+    columns = ('title', 'description', 'ingredients')
+    snippet_words = 12
+
+    def search(self, query, limit, offset=0):
+        from .models import Recipe
+
+        terms = tokenize(query)
+        if not terms:
+            return []
+        queryset = Recipe.objects.all()
+        for term in terms:
+            match = Q()
+            for column in self.columns:
+                match |= Q(**{column + '__icontains': term})
+            queryset = queryset.filter(match)
+        rows = queryset.order_by('-created_at', '-id').values_list('id', 'description')[offset:offset + limit]
+        return [
+            SearchHit(recipe_id, 0.0, html.escape(Truncator(description).words(self.snippet_words)))
+            for recipe_id, description in rows
+        ]
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'RECIPE_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTS5Backend()
+        else:
+            _backend = DatabaseSearchBackend()
+    return _backend
+
+
+def install_search_index(sender, using='default', **kwargs):
+    """post_migrate receiver (see RecipesConfig.ready)."""
+    get_search_backend().install(using)
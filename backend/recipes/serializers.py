@@ -1,11 +1,19 @@
 # backend/recipes/serializers.py
 from rest_framework import serializers
+from api.plans import PlanField
 from .models import Recipe
 from categories.models import Category
-import requests
-from django.core.files.base import ContentFile
-import imghdr
-from rest_framework.exceptions import ValidationError
+from .images import derivative_urls, srcset, variant_urls
+
+
+def url_builder(context):
+    request = context.get('request')
+    return request.build_absolute_uri if request else None
+
+
+def srcsets(variants):
+    return {fmt: srcset(urls) for fmt, urls in variants.items()}
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,7 +21,8 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image_url = serializers.CharField(write_only=True, required=False)
+    # Downloaded in the background by recipes.fetch; see image_status.
+    image_url = serializers.URLField(write_only=True, required=False, max_length=500)
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
@@ -22,6 +31,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True
     )
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -31,9 +43,81 @@ class RecipeSerializer(serializers.ModelSerializer):
             'prep_time', 'cook_time', 'servings', 'price',
             'category', 'category_id',
             'created_at', 'updated_at',
-            'image', 'image_url'
+            'image', 'image_url', 'image_source_url', 'image_status', 'image_variants', 'image_srcset',
+            'rating_avg', 'rating_count', 'rating_histogram',
         )
         # REMOVE 'user' from here
-        read_only_fields = ('id', 'created_at', 'updated_at', 'category')
+        read_only_fields = (
+            'id', 'created_at', 'updated_at', 'category', 'image_source_url', 'image_status',
+            'rating_avg', 'rating_count',
+        )
+        # For api.plans: the same values, from the columns.
+        plan_fields = {
+            'rating_histogram': PlanField(
+                ('rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5'),
+                lambda context, *counts: dict(enumerate(counts, start=1)),
+            ),
+            'image_variants': PlanField(
+                'image_derivatives',
+                lambda context, derivatives: variant_urls(derivatives, url_builder(context)),
+            ),
+            'image_srcset': PlanField(
+                'image_derivatives',
+                lambda context, derivatives: srcsets(variant_urls(derivatives, url_builder(context))),
+            ),
+        }
+
+    def validate(self, attrs):
+        if attrs.get('image') and attrs.get('image_url'):
+            raise serializers.ValidationError('Send either an image or an image_url, not both.')
+        return attrs
+
+    def _use_image_url(self, validated_data):
+        # The download happens after the save (recipes.fetch); until then the
+        # recipe has no image and image_status is 'pending'.
+        image_url = validated_data.pop('image_url', None)
+        if image_url:
+            validated_data.update(image=None, image_source_url=image_url, image_status=Recipe.IMAGE_PENDING)
+        elif validated_data.get('image'):
+            validated_data.update(image_source_url='', image_status='')
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self._use_image_url(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self._use_image_url(validated_data))
+
+    def get_image_variants(self, recipe):
+        # {'webp': {'320': url, '640': url, ...}, 'avif': {...}}; empty until the
+        # derivatives have been generated.
+        return derivative_urls(recipe, url_builder(self.context))
+
+    def get_image_srcset(self, recipe):
+        # Ready for <source type="image/webp" srcset="...">
+        return srcsets(self.get_image_variants(recipe))
+
+
+class RecipeSearchResultSerializer(RecipeSerializer):
+    # Set on each recipe by RecipeSearchView from the search backend's hits
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    snippet = serializers.CharField(source='search_snippet', read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('rank', 'snippet')
+
+
+class RecipeMatchSerializer(RecipeSerializer):
+    # Annotated by recipes.ingredients.recipes_cookable_with
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    total_ingredients = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'matched_ingredients', 'total_ingredients', 'coverage', 'missing_ingredients',
+        )
 
-    # ... create and update methods remain the same ...
\ No newline at end of file
+    def get_missing_ingredients(self, recipe):
+        return list(dict.fromkeys(row.name for row in recipe.missing_ingredient_rows))
@@ -0,0 +1,66 @@
+# backend/recipes/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .fetch import fetch_recipe_image
+from .images import generate_derivatives
+from .ingredients import index_recipes
+from .models import Recipe
+from .tasks import enqueue
+
+
+@receiver(post_save, sender=Recipe)
+def reindex_ingredients(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Fixture loading (raw) and saves that leave ingredients alone skip the re-parse.
+    if raw or (update_fields is not None and 'ingredients' not in update_fields):
+        return
+    index_recipes([(instance.pk, instance.ingredients)])
+
+
+@receiver(post_save, sender=Recipe)
+def queue_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    if (instance.image.name or '') != instance.image_derivatives.get('source', ''):
+        enqueue(generate_derivatives, instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def queue_image_fetch(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'image_source_url' not in update_fields):
+        return
+    if instance.image_status == Recipe.IMAGE_PENDING:
+        enqueue(fetch_recipe_image, instance.pk, pool='fetch')
+
+
+# Recipe.image is reference counted (recipes.storage): release the old file
+# once a save that replaced it, or the recipe's deletion, is committed. An
+# upload of the same bytes keeps the name but still took a reference of its
+# own, so the old one goes all the same.
+
+@receiver(pre_save, sender=Recipe)
+def remember_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or (update_fields is not None and 'image' not in update_fields):
+        instance._previous_image = None
+        return
+    # Not committed yet: the field's pre_save is about to store a new upload.
+    instance._image_uploaded = bool(instance.image) and not instance.image._committed
+    instance._previous_image = Recipe.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+
+
+def _release(storage, name):
+    transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if previous and (previous != instance.image.name or instance._image_uploaded):
+        _release(instance.image.storage, previous)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        _release(instance.image.storage, instance.image.name)
@@ -0,0 +1,100 @@
+# backend/recipes/storage.py
+"""
+Content-addressed storage for Recipe.image. An upload is hashed (SHA-256)
+while it streams to a temporary file, then stored under its hash:
+
+    recipe_images/pie.jpg  ->  recipe_images/3f/3f2a...c9.jpg
+
+so the same image uploaded twice is stored once. Every save of a blob adds a
+reference (a StoredBlob row counts them) and delete() drops one; the file
+goes when the last reference does. recipes.signals releases the reference of
+an image that is replaced or whose recipe is deleted.
+
+Names never change content, which is what lets recipes.media serve them with
+immutable cache headers.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the content hash in _save(); no need to
+        # look for a free one.
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        directory = os.path.join(self.location, '.incoming')
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+            except BaseException:
+                temp.close()
+                os.remove(temp.name)
+                raise
+
+        digest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+
+        # Take the reference before writing the file: a concurrent delete()
+        # of the last reference either finished already (and we write the
+        # file again) or waits for us.
+        with transaction.atomic():
+            if not StoredBlob.objects.filter(name=name).update(refs=F('refs') + 1):
+                try:
+                    with transaction.atomic():
+                        StoredBlob.objects.create(name=name, sha256=digest, size=size, refs=1)
+                except IntegrityError:
+                    StoredBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp.name)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                file_move_safe(temp.name, path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        """Drop one reference; the file is removed with the last one."""
+        from .models import StoredBlob
+
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Not stored by us (e.g. uploaded before this storage was used).
+                return super().delete(name)
+            if blob.refs > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refs=F('refs') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+
+image_storage = ContentAddressedStorage()
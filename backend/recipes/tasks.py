@@ -0,0 +1,63 @@
+# backend/recipes/tasks.py
+"""
+Small in-process worker pools for work that shouldn't run inside the
+request, like image processing.
+
+    enqueue(generate_derivatives, recipe.pk)
+    enqueue(fetch_recipe_image, recipe.pk, pool='fetch')
+
+queues the call once the current transaction commits, so the worker sees the
+committed row. Each pool has its own thread count (RECIPE_TASK_POOLS): CPU
+bound jobs stay on a small 'default' pool while network bound ones get more
+threads. Jobs live in memory: a restart drops whatever is still
+queued, so every job must be idempotent and have a management command that
+can redo it (e.g. generate_image_derivatives).
+
+Set RECIPE_TASKS_EAGER = True to run jobs inline instead (tests, scripts).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(pool='default'):
+    with _lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RECIPE_TASK_POOLS', {}).get(pool, 2),
+                thread_name_prefix='recipe-tasks-%s' % pool,
+            )
+    return _executors[pool]
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Background task %s%r failed', func.__name__, args)
+        raise
+    finally:
+        # Worker threads are long lived; don't leave a connection open per thread.
+        connections.close_all()
+
+
+def submit(func, *args, pool='default'):
+    """Run ``func(*args)`` on a pool now. Returns a Future (None when eager)."""
+    if getattr(settings, 'RECIPE_TASKS_EAGER', False):
+        func(*args)
+        return None
+    return get_executor(pool).submit(_run, func, args)
+
+
+def enqueue(func, *args, pool='default'):
+    """submit() once the current transaction (if any) commits."""
+    transaction.on_commit(lambda: submit(func, *args, pool=pool))
@@ -1,3 +1,660 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from PIL import Image
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from api.plans import plan_for
+from api.streaming import stream_rows
+from api.testing import QueryCountMixin
+from categories.models import Category
+from .fetch import ImageFetchError, check_url, sniff_image_type
+from .images import DERIVATIVE_FORMATS, target_widths
+from .ingredients import parse_ingredient
+from .media import serve_media
+from .models import Recipe, RecipeIngredient, StoredBlob
+from .serializers import RecipeSerializer
+
+
+def make_recipe(**kwargs):
+    defaults = {
+        'title': 'Chicken Adobo',
+        'description': 'Braised chicken',
+        'instructions': 'Simmer everything.',
+        'ingredients': 'chicken\nsoy sauce\nvinegar',
+        'prep_time': 10,
+        'cook_time': 40,
+        'servings': 4,
+        'price': Decimal('9.99'),
+    }
+    defaults.update(kwargs)
+    return Recipe.objects.create(**defaults)
+
+
+class RecipeListPaginationTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('recipe-list')
+
+    def collect(self, params=None):
+        # Follow "next" links until the end and return the ids in order.
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_recipe_once_newest_first(self):
+        recipes = [make_recipe(title='Recipe %d' % i) for i in range(7)]
+        # Identical timestamps must still page correctly thanks to the id tie-breaker.
+        Recipe.objects.filter(pk__in=[r.pk for r in recipes[2:6]]).update(
+            created_at=recipes[2].created_at
+        )
+
+        ids = self.collect({'page_size': 2})
+
+        expected = list(
+            Recipe.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_the_same_page(self):
+        for i in range(5):
+            make_recipe(title='Recipe %d' % i)
+        first = self.client.get(self.url, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']],
+        )
+
+    def test_filters_by_category_price_time_and_servings(self):
+        mains = Category.objects.create(name='Main Dishes')
+        match = make_recipe(category=mains, price=Decimal('12.00'), cook_time=20, servings=4)
+        make_recipe(category=mains, price=Decimal('30.00'), cook_time=20, servings=4)
+        make_recipe(category=mains, price=Decimal('12.00'), cook_time=90, servings=4)
+        make_recipe(category=mains, price=Decimal('12.00'), cook_time=20, servings=1)
+        make_recipe(price=Decimal('12.00'), cook_time=20, servings=4)
+
+        ids = self.collect({
+            'category': mains.pk,
+            'min_price': '10',
+            'max_price': '15',
+            'max_cook_time': 30,
+            'min_servings': 2,
+        })
+
+        self.assertEqual(ids, [match.pk])
+
+    def test_ordering_by_price_pages_through_ties(self):
+        for price in ['5.00', '3.00', '5.00', '5.00', '1.00']:
+            make_recipe(price=Decimal(price))
+
+        ids = self.collect({'ordering': 'price', 'page_size': 2})
+
+        expected = list(Recipe.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_filter_value_is_a_bad_request(self):
+        response = self.client.get(self.url, {'max_price': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_price', response.data)
+
+
+class RecipeQueryCountTests(QueryCountMixin, APITestCase):
+    def test_list_does_not_query_per_category(self):
+        def add_recipes(n):
+            for _ in range(n):
+                category = Category.objects.create(name='Category %d' % Category.objects.count())
+                make_recipe(category=category)
+
+        self.assertQueriesDoNotScale(
+            lambda: self.client.get(reverse('recipe-list'), {'page_size': 50}),
+            add_recipes,
+        )
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Soups')
+        self.recipe = make_recipe(title='Sinigang', category=self.category)
+
+    def test_second_anonymous_request_is_served_from_cache(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['title'], 'Sinigang')
+
+    def test_saves_and_deletes_invalidate_the_list(self):
+        url = reverse('recipe-list')
+        self.client.get(url)
+        self.recipe.title = 'Sinigang na Baboy'
+        self.recipe.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['title'], 'Sinigang na Baboy')
+
+        self.recipe.delete()
+        self.assertEqual(self.client.get(url).json()['results'], [])
+
+    def test_category_changes_invalidate_recipes(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.client.get(url)
+        self.category.name = 'Stews'
+        self.category.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['category']['name'], 'Stews')
+
+    def test_requests_with_credentials_bypass_the_cache(self):
+        url = reverse('recipe-list')
+        self.client.get(url)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer token')
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_stats_are_admin_only(self):
+        url = reverse('recipe-list')
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+        self.client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+        stats = self.client.get(reverse('response-cache-stats')).json()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+        self.client.force_authenticate(User.objects.create_user('cook'))
+        self.assertEqual(self.client.get(reverse('response-cache-stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipe = make_recipe()
+        self.url = reverse('recipe-detail', args=[self.recipe.pk])
+
+    def test_matching_etag_is_not_modified_without_serializing(self):
+        etag = self.client.get(self.url)['ETag']
+        cache.clear()
+        # Only the validator aggregate runs.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_cached_pages_answer_conditional_requests(self):
+        response = self.client.get(reverse('recipe-list'))
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(reverse('recipe-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_etag_changes_with_the_recipe_and_the_list(self):
+        detail_etag = self.client.get(self.url)['ETag']
+        list_etag = self.client.get(reverse('recipe-list'))['ETag']
+        self.recipe.price = Decimal('12.50')
+        self.recipe.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], detail_etag)
+
+        make_recipe(title='Pancit')
+        response = self.client.get(reverse('recipe-list'), {'page_size': 1}, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_list_validators_only_read_the_page(self):
+        for i in range(3):
+            make_recipe(title='Recipe %d' % i)
+        params = {'page_size': 2}
+        etag = self.client.get(reverse('recipe-list'), params)['ETag']
+        # The page query (two rows and the next one), not the whole catalogue.
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(reverse('recipe-list'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('LIMIT 3', queries.captured_queries[0]['sql'])
+
+        # A recipe further down the list is covered by the catalogue's version.
+        self.recipe.title = 'Renamed'
+        self.recipe.save()
+        response = self.client.get(reverse('recipe-list'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_recipe_is_still_a_404(self):
+        response = self.client.get(reverse('recipe-detail', args=[self.recipe.pk + 1]), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeSearchTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('recipe-search')
+
+    def search(self, q, **params):
+        response = self.client.get(self.url, dict(params, q=q))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response
+
+    def test_title_matches_rank_above_ingredient_matches(self):
+        make_recipe(title='Garlic Fried Rice', ingredients='rice\ngarlic')
+        make_recipe(title='Pork Sinigang', ingredients='pork\ntamarind\ngarlic')
+        results = self.search('garlic').data['results']
+        self.assertEqual([item['title'] for item in results], ['Garlic Fried Rice', 'Pork Sinigang'])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_snippets_highlight_matches_and_escape_html(self):
+        make_recipe(title='Leche Flan', description='A <b>silky</b> caramel custard dessert')
+        snippet = self.search('custard').data['results'][0]['snippet']
+        self.assertIn('<mark>custard</mark>', snippet)
+        self.assertIn('&lt;b&gt;silky&lt;/b&gt;', snippet)
+
+    def test_index_follows_saves_and_deletes(self):
+        recipe = make_recipe(title='Pancit Canton')
+        self.assertEqual(len(self.search('pancit').data['results']), 1)
+
+        recipe.title = 'Pancit Bihon'
+        recipe.save()
+        self.assertEqual(len(self.search('canton').data['results']), 0)
+        self.assertEqual(len(self.search('bihon').data['results']), 1)
+
+        recipe.delete()
+        self.assertEqual(len(self.search('bihon').data['results']), 0)
+
+    def test_prefix_match_and_pagination(self):
+        for i in range(3):
+            make_recipe(title='Lumpia %d' % i)
+        first = self.search('lump', page_size=2)
+        self.assertEqual(len(first.data['results']), 2)
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertIsNone(second.data['next'])
+
+    def test_query_is_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fts_syntax_in_the_query_is_treated_as_text(self):
+        make_recipe(title='Halo-halo')
+        self.assertEqual(len(self.search('halo" OR "x').data['results']), 0)
+        self.assertEqual(len(self.search('halo-halo').data['results']), 1)
+
+
+class IngredientParserTests(SimpleTestCase):
+    def test_parses_quantity_unit_and_name(self):
+        cases = {
+            '1 1/2 cups all-purpose flour, sifted': ('flour', Decimal('1.5'), 'cup'),
+            '½ tsp black pepper': ('black pepper', Decimal('0.5'), 'tsp'),
+            '1 T soy sauce (optional)': ('soy sauce', Decimal('1'), 'tbsp'),
+            '200g pork belly': ('pork belly', Decimal('200'), 'g'),
+            '- 2-3 large eggs': ('egg', Decimal('2'), ''),
+            'a pinch of salt': ('salt', None, 'pinch'),
+            '3 cloves garlic, minced': ('garlic', Decimal('3'), 'clove'),
+        }
+        for line, expected in cases.items():
+            with self.subTest(line=line):
+                parsed = parse_ingredient(line)
+                self.assertEqual((parsed.name, parsed.quantity, parsed.unit), expected)
+
+
+class CookWithTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('recipe-cook-with')
+        self.omelette = make_recipe(title='Omelette', ingredients='3 eggs\n1 tbsp butter\nsalt')
+        self.fried_rice = make_recipe(
+            title='Fried Rice', ingredients='2 cups rice\n2 eggs\n3 cloves garlic\n1 tbsp soy sauce'
+        )
+        make_recipe(title='Adobo', ingredients='1 kg chicken\n1/2 cup vinegar')
+
+    def test_ranks_by_coverage(self):
+        response = self.client.get(self.url, {'ingredients': 'Eggs, butter, rice'})
+        results = response.data['results']
+        self.assertEqual([item['title'] for item in results], ['Omelette', 'Fried Rice'])
+        self.assertEqual(results[0]['matched_ingredients'], 2)
+        self.assertEqual(results[0]['total_ingredients'], 3)
+        self.assertEqual(results[0]['missing_ingredients'], ['salt'])
+        self.assertAlmostEqual(results[1]['coverage'], 0.5)
+
+    def test_min_coverage(self):
+        response = self.client.get(self.url, {'ingredients': 'egg,rice', 'min_coverage': '0.6'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_rows_follow_recipe_edits(self):
+        self.omelette.ingredients = '3 eggs\ncheese'
+        self.omelette.save()
+        self.assertEqual(
+            sorted(self.omelette.ingredient_rows.values_list('name', flat=True)), ['cheese', 'egg']
+        )
+
+    def test_backfill_command_only_indexes_missing_recipes(self):
+        RecipeIngredient.objects.filter(recipe=self.omelette).delete()
+        out = StringIO()
+        call_command('index_recipe_ingredients', batch_size=1, stdout=out)
+        self.assertIn('Done: 1 recipes, 3 ingredient rows.', out.getvalue())
+        self.assertEqual(self.omelette.ingredient_rows.count(), 3)
+
+
+
+def make_image(width, height, color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name='photo.jpg')
+
+
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, RECIPE_TASKS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def save_image(self, recipe, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image = image
+            recipe.save()
+        recipe.refresh_from_db()
+
+    def test_widths_and_formats_are_generated_after_commit(self):
+        recipe = make_recipe()
+        self.save_image(recipe, make_image(800, 600))
+        variants = recipe.image_derivatives['variants']
+        self.assertEqual(set(variants), set(DERIVATIVE_FORMATS))
+        # Every standard width below the original, plus the original width.
+        self.assertEqual(set(variants['webp']), {'320', '640', '800'})
+        with recipe.image.storage.open(variants['webp']['320']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 240)))
+
+        data = self.client.get(reverse('recipe-detail', args=[recipe.pk])).json()
+        self.assertTrue(data['image_variants']['webp']['640'].startswith('http://testserver/media/recipe_images/derivatives/'))
+        self.assertTrue(data['image_srcset']['webp'].endswith(' 800w'))
+
+    def test_widths_are_not_repeated_above_the_largest(self):
+        self.assertEqual(target_widths(1280), [320, 640, 1280])
+        self.assertEqual(target_widths(2000), [320, 640, 1280])
+        recipe = make_recipe()
+        self.save_image(recipe, make_image(2000, 1000))
+        data = self.client.get(reverse('recipe-detail', args=[recipe.pk])).json()
+        entries = data['image_srcset']['webp'].split(', ')
+        self.assertEqual([entry.split(' ')[1] for entry in entries], ['320w', '640w', '1280w'])
+
+    def test_identical_images_share_derivatives(self):
+        first, second = make_recipe(), make_recipe(title='Pancit')
+        self.save_image(first, make_image(400, 300))
+        self.save_image(second, make_image(400, 300))
+        self.assertEqual(first.image_derivatives['variants'], second.image_derivatives['variants'])
+
+    def test_backfill_command(self):
+        recipe = make_recipe()
+        recipe.image = make_image(200, 100)
+        recipe.save()  # outside captureOnCommitCallbacks: the queued job never runs
+        self.assertEqual(Recipe.objects.get().image_derivatives, {})
+
+        out = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=out)
+        self.assertIn('1 recipes updated', out.getvalue())
+        self.assertEqual(set(Recipe.objects.get().image_derivatives['variants']['webp']), {'200'})
+
+
+class ImageServer(ThreadingHTTPServer):
+    # Serves self.files ({path: bytes}) on a random local port.
+    def __init__(self, files):
+        self.files = files
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                body = files.get(handler.path)
+                if body is None:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'image/png')  # whatever the body is
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], path)
+
+
+class RemoteImageTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(
+            MEDIA_ROOT=media_root, RECIPE_TASKS_EAGER=True, RECIPE_IMAGE_ALLOW_PRIVATE_HOSTS=True,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+        self.server = ImageServer({'/pie.jpg': make_image(400, 300).read(), '/page.html': b'<html></html>'})
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client.force_authenticate(User.objects.create_user('cook', password='pw'))
+
+    def payload(self, **kwargs):
+        data = {
+            'title': 'Pie', 'description': 'd', 'instructions': 'i', 'ingredients': 'apple',
+            'prep_time': 5, 'cook_time': 30, 'servings': 6, 'price': '4.50',
+        }
+        data.update(kwargs)
+        return data
+
+    def create(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('recipe-create'), data, format='json')
+
+    def test_recipe_is_created_pending_and_the_image_fetched_after(self):
+        response = self.create(self.payload(image_url=self.server.url('/pie.jpg')))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['image_status'], response.data['image']), ('pending', None))
+
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        # The download counts as a new image: derivatives follow.
+        self.assertEqual(set(recipe.image_derivatives['variants']['webp']), {'320', '400'})
+
+    def test_content_is_sniffed_and_size_capped(self):
+        with self.assertLogs('recipes.fetch', 'WARNING') as logs:
+            self.create(self.payload(image_url=self.server.url('/page.html')))
+        self.assertEqual(Recipe.objects.get().image_status, Recipe.IMAGE_FAILED)
+        self.assertIn('Not a JPEG', logs.output[0])
+
+        with override_settings(RECIPE_IMAGE_MAX_BYTES=100), self.assertLogs('recipes.fetch', 'WARNING'):
+            self.create(self.payload(image_url=self.server.url('/pie.jpg')))
+        recipe = Recipe.objects.latest('pk')
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(recipe.image)
+
+    def test_bulk_import_and_retry_command(self):
+        with self.assertLogs('recipes.fetch', 'WARNING'):
+            response = self.create([
+                self.payload(title='Good', image_url=self.server.url('/pie.jpg')),
+                self.payload(title='Missing', image_url=self.server.url('/gone.jpg')),
+                self.payload(title='No image'),
+            ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            dict(Recipe.objects.values_list('title', 'image_status')),
+            {'Good': 'ready', 'Missing': 'failed', 'No image': ''},
+        )
+
+        self.server.files['/gone.jpg'] = self.server.files['/pie.jpg']
+        out = StringIO()
+        call_command('fetch_recipe_images', retry_failed=True, workers=1, stdout=out)
+        self.assertIn('1 fetched, 0 failed', out.getvalue())
+        self.assertEqual(Recipe.objects.get(title='Missing').image_status, Recipe.IMAGE_READY)
+
+
+class ImageFetchCheckTests(SimpleTestCase):
+    def test_sniffs_magic_bytes(self):
+        self.assertEqual(sniff_image_type(b'\x89PNG\r\n\x1a\n' + b'\0' * 8), 'png')
+        self.assertEqual(sniff_image_type(b'RIFF\x10\0\0\0WEBPVP8 '), 'webp')
+        self.assertEqual(sniff_image_type(b'\0\0\0\x1cftypavif\0\0\0\0'), 'avif')
+        self.assertIsNone(sniff_image_type(b'<!doctype html>'))
+
+    def test_private_and_non_http_urls_are_refused(self):
+        for url in ('http://127.0.0.1/pie.jpg', 'http://[::1]/pie.jpg', 'http://10.0.0.5/x', 'file:///etc/passwd'):
+            with self.assertRaises(ImageFetchError):
+                check_url(url)
+
+
+class ContentAddressedStorageTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, RECIPE_TASKS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_identical_uploads_are_stored_once_and_counted(self):
+        first = make_recipe(image=make_image(40, 30))
+        second = make_recipe(image=ContentFile(make_image(40, 30).read(), name='other-name.JPG'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^recipe_images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(StoredBlob.objects.get().refs, 2)
+
+        storage = first.image.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(StoredBlob.objects.get().refs, 1)
+        self.assertTrue(storage.exists(second.image.name))
+
+        # Replacing the last reference removes the file.
+        name = second.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = make_image(40, 30, color='blue')
+            second.save()
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(list(StoredBlob.objects.values_list('name', 'refs')), [(second.image.name, 1)])
+
+    def test_uploading_the_same_image_again_keeps_one_reference(self):
+        recipe = make_recipe(image=make_image(40, 30))
+        name = recipe.image.name
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.image = make_image(40, 30)
+                recipe.save()
+        self.assertEqual(recipe.image.name, name)
+        self.assertEqual(list(StoredBlob.objects.values_list('name', 'refs')), [(name, 1)])
+        self.assertTrue(recipe.image.storage.exists(name))
+
+        # Saves that leave the image alone take no reference.
+        recipe.title = 'Renamed'
+        recipe.save()
+        self.assertEqual(StoredBlob.objects.get().refs, 1)
+
+
+class MediaServingTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, MEDIA_ACCEL_REDIRECT='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.name = 'recipe_images/ab/' + 'ab' * 32 + '.txt'
+        os.makedirs(os.path.join(media_root, 'recipe_images/ab'))
+        with open(os.path.join(media_root, self.name), 'wb') as file:
+            file.write(b'0123456789')
+        with open(os.path.join(media_root, 'recipe_images/pie.txt'), 'wb') as file:
+            file.write(b'pie')
+
+    def get(self, path, **headers):
+        return serve_media(RequestFactory().get('/media/' + path, headers=headers), path)
+
+    def test_full_file_with_immutable_cache_headers(self):
+        response = self.get(self.name)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable', self.get('recipe_images/pie.txt')['Cache-Control'])
+
+    def test_ranges(self):
+        response = self.get(self.name, Range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.get(self.name, Range='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.get(self.name, Range='bytes=20-').status_code, 416)
+
+    def test_accel_redirect_mode(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/'):
+            response = self.get(self.name)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_or_hidden_are_not_found(self):
+        for path in ('../settings.py', '.incoming/tmp123', 'recipe_images', 'missing.jpg'):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+
+class StreamingExportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Filipino')
+        for i in range(5):
+            make_recipe(title='Recipe %d' % i, category=self.category if i % 2 else None)
+
+    def expected(self, request):
+        recipes = Recipe.objects.with_related().order_by('-created_at', '-id')
+        return JSONRenderer().render(RecipeSerializer(recipes, many=True, context={'request': request}).data)
+
+    def test_export_is_the_whole_list(self):
+        response = self.client.get(reverse('recipe-export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.expected(response.wsgi_request))
+
+    def test_rows_are_encoded_chunk_by_chunk(self):
+        plan = plan_for(RecipeSerializer)
+        rows = plan.values(Recipe.objects.order_by('-created_at', '-id'))
+        context = {'request': RequestFactory().get('/api/recipes/export/')}
+        chunks = list(stream_rows(plan, rows, context, chunk_size=2))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b''.join(chunks), self.expected(context['request']))
+
+        lines = b''.join(stream_rows(plan, rows, context, chunk_size=2, ndjson=True)).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(self.expected(context['request'])))
+        self.assertEqual(b''.join(stream_rows(plan, rows.none(), context)), b'[]')
+
+    def test_ndjson_with_filters(self):
+        response = self.client.get(reverse('recipe-export'), {'format': 'ndjson', 'category': self.category.pk})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        response = self.client.get(reverse('recipe-export'), {'category': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_streams_under_asgi(self):
+        response = await self.async_client.get(reverse('recipe-export'))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(body)), 5)
@@ -1,9 +1,14 @@
 # C:\Users\Galathiea\Downloads\KITCHEN WEB\eternal-dev\backend\recipes\urls.py
 from django.urls import path
-from .views import RecipeCreateView, RecipeListView, RecipeDetailView
+from .views import (
+    RecipeCookWithView, RecipeCreateView, RecipeExportView, RecipeListView, RecipeDetailView, RecipeSearchView,
+)
 
 urlpatterns = [
     path('', RecipeListView.as_view(), name='recipe-list'),
     path('create/', RecipeCreateView.as_view(), name='recipe-create'),
+    path('export/', RecipeExportView.as_view(), name='recipe-export'),
+    path('search/', RecipeSearchView.as_view(), name='recipe-search'),
+    path('cook-with/', RecipeCookWithView.as_view(), name='recipe-cook-with'),
     path('<int:pk>/', RecipeDetailView.as_view(), name='recipe-detail'),
 ]
\ No newline at end of file
@@ -1,21 +1,122 @@
+from collections import OrderedDict
+
 from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from api.caching import CachedResponseMixin, get_versions
+from api.conditional import ConditionalGetMixin
+from api.plans import PlannedListMixin
+from api.streaming import StreamingListMixin
+from .filters import (
+    CookWithQuerySerializer, RecipeFilterBackend, RecipeOrderingFilter, RecipeSearchQuerySerializer,
+)
+from .ingredients import recipes_cookable_with
 from .models import Recipe
-from .serializers import RecipeSerializer
+from .pagination import RecipeCursorPagination, RecipeMatchPagination
+from .search import get_search_backend
+from .serializers import RecipeMatchSerializer, RecipeSearchResultSerializer, RecipeSerializer
 
 class RecipeCreateView(generics.CreateAPIView):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.with_related()
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # POSTing a list of recipes imports them in one request; their image_urls
+    # are then fetched in parallel on the background pool.
+    max_import_size = 500
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user) 
-        
-class RecipeListView(generics.ListAPIView):
-    queryset = Recipe.objects.all()
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs.update(many=True, max_length=self.max_import_size)
+        return super().get_serializer(*args, **kwargs)
+
+class RecipeListView(CachedResponseMixin, ConditionalGetMixin, PlannedListMixin, generics.ListAPIView):
+    queryset = Recipe.objects.with_related()
     serializer_class = RecipeSerializer
-    permission_classes = [permissions.AllowAny] 
+    permission_classes = [permissions.AllowAny]
+    pagination_class = RecipeCursorPagination
+    filter_backends = [RecipeFilterBackend, RecipeOrderingFilter]
+    ordering_fields = ['created_at', 'price', 'prep_time', 'cook_time', 'rating_avg', 'rating_count']
+    ordering = ('-created_at', '-id')
+    cache_versions = ('recipes',)
+
+    def get_validator_aggregate(self):
+        # The page's own rows plus the catalogue's version, which also moves with
+        # ratings and deletions; an aggregate over every filtered recipe would
+        # read the whole catalogue on each request.
+        page = self.pagination_class().page_queryset(self.filter_queryset(self.get_queryset()), self.request, self)
+        return dict(page.page_validators(), version=get_versions(self.cache_versions)[0])
 
-class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RecipeExportView(StreamingListMixin, generics.ListAPIView):
+    # GET /api/recipes/export/?category=3 -- every matching recipe, streamed (api.streaming)
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly] 
\ No newline at end of file
+    permission_classes = [permissions.AllowAny]
+    filter_backends = RecipeListView.filter_backends
+    ordering_fields = RecipeListView.ordering_fields
+    ordering = RecipeListView.ordering
+
+class RecipeDetailView(CachedResponseMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Recipe.objects.with_related()
+    serializer_class = RecipeSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cache_versions = ('recipes',)
+
+    def get_validator_aggregate(self):
+        validators = self.get_queryset().filter(pk=self.kwargs['pk']).validators()
+        return validators if validators['count'] else None
+
+class RecipeSearchView(generics.GenericAPIView):
+    # GET /api/recipes/search/?q=adobo&page=2 -- ranked full-text search
+    serializer_class = RecipeSearchResultSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        params = RecipeSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query, page, page_size = (params.validated_data[key] for key in ('q', 'page', 'page_size'))
+
+        # Ask for one extra hit to know whether there is a next page.
+        hits = get_search_backend().search(query, limit=page_size + 1, offset=(page - 1) * page_size)
+        has_next = len(hits) > page_size
+        hits = hits[:page_size]
+
+        recipes = Recipe.objects.with_related().in_bulk([hit.recipe_id for hit in hits])
+        results = []
+        for hit in hits:
+            recipe = recipes.get(hit.recipe_id)
+            if recipe is None:
+                continue
+            recipe.search_rank = hit.rank
+            recipe.search_snippet = hit.snippet
+            results.append(recipe)
+
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, 'page', page + 1) if has_next else None
+        if page == 1:
+            previous_url = None
+        elif page == 2:
+            previous_url = remove_query_param(url, 'page')
+        else:
+            previous_url = replace_query_param(url, 'page', page - 1)
+
+        return Response(OrderedDict([
+            ('next', next_url),
+            ('previous', previous_url),
+            ('results', self.get_serializer(results, many=True).data),
+        ]))
+
+
+class RecipeCookWithView(generics.ListAPIView):
+    # GET /api/recipes/cook-with/?ingredients=egg,rice,garlic -- best ingredient coverage first
+    serializer_class = RecipeMatchSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = RecipeMatchPagination
+
+    def get_queryset(self):
+        params = CookWithQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = recipes_cookable_with(params.validated_data['ingredients'])
+        if 'min_coverage' in params.validated_data:
+            queryset = queryset.filter(coverage__gte=params.validated_data['min_coverage'])
+        return queryset
+
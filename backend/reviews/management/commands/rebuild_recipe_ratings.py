@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute every recipe's rating average, count and star histogram from its reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes written per bulk_update (default: 1000).',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} reviewed recipes."))
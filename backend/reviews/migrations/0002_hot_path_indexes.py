@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['recipe', '-created_at', '-id'], name='review_recipe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['recipe', 'rating'], name='review_recipe_rating_idx'),
+        ),
+    ]
@@ -2,6 +2,13 @@ from django.db import models
 from django.contrib.auth.models import User
 from recipes.models import Recipe  # Import Recipe from recipes app
 
+
+class ReviewQuerySet(models.QuerySet):
+    def with_related(self):
+        # ReviewSerializer shows user.username
+        return self.select_related('user')
+
+
 class Review(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -9,5 +16,15 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ReviewQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A recipe's reviews, newest first (ReviewListCreateView).
+            models.Index(fields=['recipe', '-created_at', '-id'], name='review_recipe_created_idx'),
+            # Covers the per-recipe rating GROUP BY of reviews.ratings.rebuild_ratings.
+            models.Index(fields=['recipe', 'rating'], name='review_recipe_rating_idx'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user.username} for {self.recipe.title}"
\ No newline at end of file
@@ -0,0 +1,96 @@
+# backend/reviews/ratings.py
+"""
+Keeps the denormalized rating columns on recipes.Recipe (rating_avg,
+rating_count, rating_sum and the rating_1..rating_5 histogram) in step with
+reviews.Review.
+
+The views call add_rating/remove_rating/change_rating inside the same
+transaction as the review write. Each call is a single UPDATE with F()
+expressions, so concurrent reviews on one recipe never lose a count.
+rebuild_ratings() recomputes everything from the reviews table.
+"""
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+STAR_FIELDS = {stars: 'rating_%d' % stars for stars in range(1, 6)}
+RATING_FIELDS = ['rating_avg', 'rating_count', 'rating_sum'] + list(STAR_FIELDS.values())
+
+
+def _apply(recipe_id, rating, sign):
+    new_count = F('rating_count') + sign
+    new_sum = F('rating_sum') + sign * rating
+    star_field = STAR_FIELDS[rating]
+    Recipe.objects.filter(pk=recipe_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        # The right hand side sees the old row, so the average is computed from
+        # the new sum and count directly. NullIf avoids dividing by zero when the
+        # last review goes away.
+        rating_avg=Coalesce(Cast(new_sum, FloatField()) / NullIf(new_count, 0), 0.0),
+        **{star_field: F(star_field) + sign},
+        # The aggregates are part of the recipe's representation (and ETag).
+        updated_at=timezone.now(),
+    )
+
+
+def add_rating(recipe_id, rating):
+    _apply(recipe_id, rating, 1)
+
+
+def remove_rating(recipe_id, rating):
+    _apply(recipe_id, rating, -1)
+
+
+def change_rating(old_recipe_id, old_rating, new_recipe_id, new_rating):
+    if (old_recipe_id, old_rating) == (new_recipe_id, new_rating):
+        return
+    remove_rating(old_recipe_id, old_rating)
+    add_rating(new_recipe_id, new_rating)
+
+
+def rebuild_ratings(recipe_model=Recipe, review_model=None, batch_size=1000):
+    """
+    Recompute every recipe's aggregates with one GROUP BY over the reviews and
+    write them back with bulk_update. Takes the models as arguments so data
+    migrations can pass their historical versions. Returns the number of
+    recipes that have reviews.
+    """
+    if review_model is None:
+        from .models import Review as review_model
+
+    # Recipes whose reviews have all gone away.
+    recipe_model.objects.filter(rating_count__gt=0).exclude(
+        pk__in=review_model.objects.values('recipe_id')
+    ).update(**{field: 0 for field in RATING_FIELDS})
+
+    aggregates = (
+        review_model.objects.order_by()
+        .values('recipe_id')
+        .annotate(
+            count=Count('id'),
+            total=Sum('rating'),
+            **{field: Count('id', filter=Q(rating=stars)) for stars, field in STAR_FIELDS.items()}
+        )
+    )
+
+    updated = 0
+    batch = []
+    for row in aggregates.iterator():
+        batch.append(recipe_model(
+            pk=row['recipe_id'],
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            rating_avg=row['total'] / row['count'],
+            **{field: row[field] for field in STAR_FIELDS.values()}
+        ))
+        if len(batch) >= batch_size:
+            recipe_model.objects.bulk_update(batch, RATING_FIELDS)
+            updated += len(batch)
+            batch = []
+    if batch:
+        recipe_model.objects.bulk_update(batch, RATING_FIELDS)
+        updated += len(batch)
+    return updated
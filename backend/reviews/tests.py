@@ -1,3 +1,104 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api.testing import QueryCountMixin
+from recipes.models import Recipe
+from recipes.tests import make_recipe
+from .models import Review
+
+
+class ReviewQueryCountTests(QueryCountMixin, APITestCase):
+    def test_list_does_not_query_per_reviewer(self):
+        recipe = make_recipe()
+
+        def add_reviews(n):
+            for _ in range(n):
+                user = User.objects.create_user('reviewer%d' % User.objects.count())
+                Review.objects.create(recipe=recipe, user=user, rating=5, comment='Great')
+
+        self.assertQueriesDoNotScale(
+            lambda: self.client.get(reverse('recipe-reviews', args=[recipe.pk])),
+            add_reviews,
+        )
+
+
+class RatingAggregateTests(APITestCase):
+    def setUp(self):
+        self.recipe = make_recipe()
+        self.user = User.objects.create_user('critic')
+        self.client.force_authenticate(self.user)
+
+    def post_review(self, rating, recipe=None):
+        recipe = recipe or self.recipe
+        response = self.client.post(
+            reverse('recipe-reviews', args=[recipe.pk]),
+            {'recipe': recipe.pk, 'rating': rating, 'comment': 'Tasty'},
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def assertAggregates(self, recipe, avg, count, histogram):
+        recipe.refresh_from_db()
+        self.assertAlmostEqual(recipe.rating_avg, avg)
+        self.assertEqual(recipe.rating_count, count)
+        self.assertEqual(recipe.rating_histogram, histogram)
+
+    def test_create_edit_and_delete_keep_aggregates_in_step(self):
+        self.post_review(5)
+        review_id = self.post_review(2)
+        self.assertAggregates(self.recipe, 3.5, 2, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+        self.client.patch(reverse('review-detail', args=[review_id]), {'rating': 4})
+        self.assertAggregates(self.recipe, 4.5, 2, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+
+        self.client.delete(reverse('review-detail', args=[review_id]))
+        self.assertAggregates(self.recipe, 5.0, 1, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1})
+
+    def test_moving_a_review_to_another_recipe(self):
+        other = make_recipe(title='Sinigang')
+        review_id = self.post_review(3)
+        self.client.patch(reverse('review-detail', args=[review_id]), {'recipe': other.pk})
+        self.assertAggregates(self.recipe, 0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+        self.assertAggregates(other, 3.0, 1, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0})
+
+    def test_rebuild_command_matches_incremental_updates(self):
+        other = make_recipe(title='Sinigang')
+        for rating in (1, 4, 4):
+            self.post_review(rating)
+        self.post_review(5, recipe=other)
+        Review.objects.filter(recipe=other).delete()  # bypasses the views
+        Recipe.objects.filter(pk=self.recipe.pk).update(rating_count=0, rating_avg=0)
+
+        call_command('rebuild_recipe_ratings', stdout=StringIO())
+
+        self.assertAggregates(self.recipe, 3.0, 3, {1: 1, 2: 0, 3: 0, 4: 2, 5: 0})
+        self.assertAggregates(other, 0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+    def test_recipe_list_sorts_by_rating(self):
+        low, high = make_recipe(title='Low'), make_recipe(title='High')
+        self.post_review(2, recipe=low)
+        self.post_review(5, recipe=high)
+        response = self.client.get(reverse('recipe-list'), {'ordering': '-rating_avg'})
+        titles = [item['title'] for item in response.data['results']]
+        self.assertEqual(titles, ['High', 'Low', 'Chicken Adobo'])
+        self.assertEqual(response.data['results'][0]['rating_histogram']['5'], 1)
+
+
+class ReviewCacheTests(APITestCase):
+    def test_new_review_only_invalidates_its_recipe(self):
+        cache.clear()
+        recipe, other = make_recipe(), make_recipe(title='Pancit')
+        urls = [reverse('recipe-reviews', args=[pk]) for pk in (recipe.pk, other.pk)]
+        for url in urls:
+            self.client.get(url)
+
+        Review.objects.create(recipe=recipe, user=User.objects.create_user('critic'), rating=4, comment='Good')
+        response = self.client.get(urls[0])
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(self.client.get(urls[1])['X-Cache'], 'HIT')
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import ReviewListCreateView, ReviewDetailView
+from .views import ReviewExportView, ReviewListCreateView, ReviewDetailView
 
 urlpatterns = [
     path('<int:recipe_id>/reviews/', ReviewListCreateView.as_view(), name='recipe-reviews'),
+    path('<int:recipe_id>/reviews/export/', ReviewExportView.as_view(), name='recipe-reviews-export'),
     path('<int:pk>/', ReviewDetailView.as_view(), name='review-detail'),
 ]
\ No newline at end of file
@@ -1,22 +1,51 @@
+from django.db import transaction
 from rest_framework import generics, permissions
+from api.caching import CachedResponseMixin
+from api.plans import PlannedListMixin
+from api.streaming import StreamingListMixin
 from .models import Review
+from .ratings import add_rating, change_rating, remove_rating
 from .serializers import ReviewSerializer
 from recipes.models import Recipe  # Import Recipe from recipes app
 
-class ReviewListCreateView(generics.ListCreateAPIView):
+class ReviewListCreateView(CachedResponseMixin, PlannedListMixin, generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_cache_versions(self):
+        return ('reviews:%s' % self.kwargs['recipe_id'],)
+
     def get_queryset(self):
         recipe_id = self.kwargs['recipe_id']
-        return Review.objects.filter(recipe_id=recipe_id)
+        return Review.objects.with_related().filter(recipe_id=recipe_id).order_by('-created_at', '-id')
 
+    @transaction.atomic
     def perform_create(self, serializer):
         recipe_id = self.kwargs['recipe_id']
         recipe = Recipe.objects.get(pk=recipe_id)
-        serializer.save(user=self.request.user, recipe=recipe)
+        review = serializer.save(user=self.request.user, recipe=recipe)
+        add_rating(review.recipe_id, review.rating)
+
+class ReviewExportView(StreamingListMixin, generics.ListAPIView):
+    # GET /api/reviews/<recipe_id>/reviews/export/ -- all of a recipe's reviews, streamed
+    serializer_class = ReviewSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        return Review.objects.filter(recipe_id=self.kwargs['recipe_id']).order_by('-created_at', '-id')
 
 class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Review.objects.all()
+    queryset = Review.objects.with_related()
     serializer_class = ReviewSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly] # or IsOwnerOrReadOnly (if you create it)
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly] # or IsOwnerOrReadOnly (if you create it)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_recipe_id, old_rating = serializer.instance.recipe_id, serializer.instance.rating
+        review = serializer.save()
+        change_rating(old_recipe_id, old_rating, review.recipe_id, review.rating)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        remove_rating(instance.recipe_id, instance.rating)
+        instance.delete()
@@ -4,8 +4,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth.models import User # Ensure User model is imported
 from .serializers import UserSerializer # Ensure your UserSerializer is imported
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from api.authentication import ClaimsTokenObtainPairSerializer
 
 # RegisterView for creating new users
 class RegisterView(generics.CreateAPIView):
@@ -25,7 +24,8 @@ class RegisterView(generics.CreateAPIView):
             
             # Get JWT tokens for the newly created user
             user = User.objects.get(username=serializer.data['username'])
-            refresh = RefreshToken.for_user(user)
+            # With the user's flags as claims, like the login tokens (api.authentication)
+            refresh = ClaimsTokenObtainPairSerializer.get_token(user)
             
             return Response({
                 'access': str(refresh.access_token),
@@ -50,7 +50,7 @@ class LoginView(TokenObtainPairView):
     # This view inherits from SimpleJWT's TokenObtainPairView,
     # which is specifically designed to handle POST requests
     # to exchange username/password for access and refresh tokens.
-    serializer_class = TokenObtainPairSerializer
+    serializer_class = ClaimsTokenObtainPairSerializer
     # FIX: permission_classes must be an iterable (e.g., a tuple)
     permission_classes = (AllowAny,)  # Allow anyone to log in
 
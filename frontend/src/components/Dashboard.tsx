@@ -42,8 +42,9 @@ export default function Dashboard() {
 
   const fetchRecipes = async () => {
     try {
+      // The catalogue is cursor-paginated and filtered server-side.
       const response = await api.get(endpoints.recipes);
-      setRecipes(response.data);
+      setRecipes(response.data.results);
     } catch (error) {
       console.error('Error fetching recipes:', error);
     }
@@ -27,9 +27,35 @@ export interface Recipe {
   price: number;
 }
 
+export interface RecipeFilters {
+  category?: number;
+  min_price?: number;
+  max_price?: number;
+  max_prep_time?: number;
+  max_cook_time?: number;
+  min_servings?: number;
+  max_servings?: number;
+  ordering?: 'created_at' | '-created_at' | 'price' | '-price' | 'prep_time' | '-prep_time' | 'cook_time' | '-cook_time';
+  page_size?: number;
+}
+
+export interface RecipePage {
+  next: string | null;
+  previous: string | null;
+  results: Recipe[];
+}
+
 export const recipeService = {
   getRecipe: async (id: number): Promise<Recipe> => {
     const response = await api.get(`/api/recipes/${id}/`);
     return response.data;
   },
+
+  // Pass the `next`/`previous` URL from a previous page to keep paging.
+  listRecipes: async (filters: RecipeFilters = {}, pageUrl?: string): Promise<RecipePage> => {
+    const response = pageUrl
+      ? await api.get(pageUrl)
+      : await api.get('/api/recipes/', { params: filters });
+    return response.data;
+  },
 };